@@ -0,0 +1,586 @@
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SCHEDULE_COLUMNS = ("Period", "Balance", "Interest", "Principal", "Extra", "Total Payment", "New Balance",
+                    "Accumulated Interest", "Accumulated Principal Payment")
+# one packed record per period instead of a dict per row
+SCHEDULE_DTYPE = np.dtype([("Period", np.int32)] + [(name, np.float64) for name in SCHEDULE_COLUMNS[1:]])
+# fixed point schedules keep every amount as int64 cents
+CENTS_SCHEDULE_DTYPE = np.dtype([("Period", np.int32)] + [(name, np.int64) for name in SCHEDULE_COLUMNS[1:]])
+# annual rates in fixed point are integer millionths, 5.25% is 52500
+RATE_SCALE = 1_000_000
+
+# calendar unit and its length in units for each payment frequency, keyed by periods per year
+PERIOD_UNITS = {52: ("D", 7), 26: ("D", 14), 12: ("M", 1), 4: ("M", 3)}
+
+
+def period_offsets(dates, start_date: datetime, periods_per_year: int) -> np.ndarray:
+    # index of the period each date falls into, counted in calendar months or in elapsed days
+    unit, length = PERIOD_UNITS[periods_per_year]
+    dates = np.asarray(dates, dtype="datetime64[D]").astype(f"datetime64[{unit}]")
+    start = np.datetime64(start_date, "D").astype(f"datetime64[{unit}]")
+    return (dates - start).astype(np.int64) // length
+
+
+def period_dates(start_date: datetime, periods, periods_per_year: int) -> np.ndarray:
+    # the other direction, the date a period starts on; monthly and quarterly dates keep the start day
+    # of the month, clipped to the last day of shorter months
+    unit, length = PERIOD_UNITS[periods_per_year]
+    start = np.datetime64(start_date, "D")
+    steps = np.asarray(periods, dtype=np.int64) * length
+    if unit == "D":
+        return start + steps
+    start_month = start.astype("datetime64[M]")
+    months = start_month + steps
+    month_ends = (months + 1).astype("datetime64[D]") - 1
+    return np.minimum(months.astype("datetime64[D]") + (start - start_month.astype("datetime64[D]")), month_ends)
+
+
+class RateTimeline:
+    # rate changes sorted once and resolved into constant-rate segments per frequency
+    def __init__(self, annual_rate: float, start_date: datetime, interest_rate_changes: List[Dict]):
+        changes = sorted(interest_rate_changes, key=lambda change: change["effective_date"])
+        self.annual_rate = annual_rate
+        self.start_date = start_date
+        self.effective_dates = np.array([change["effective_date"] for change in changes], dtype="datetime64[D]")
+        self.annual_rates = np.array([change["new_interest_rate"] / 100 for change in changes], dtype=float)
+        self._segments: Dict[tuple, tuple] = {}
+
+    def __len__(self):
+        return len(self.annual_rates)
+
+    def segments(self, periods_per_year: int, horizon: int):
+        # first period and period rate of every segment; a change applies from its period onward,
+        # and when several land on one period each later change is pushed to the following period
+        key = (periods_per_year, horizon)
+        if key not in self._segments:
+            offsets = period_offsets(self.effective_dates, self.start_date, periods_per_year)
+            index = np.arange(len(offsets))
+            starts = index + np.maximum.accumulate(np.maximum(offsets - index, 0)) if len(offsets) else index
+            within = starts < horizon
+            starts = np.concatenate([[0], starts[within]])
+            rates = np.concatenate([[self.annual_rate], self.annual_rates[within]]) / periods_per_year
+            if len(starts) > 1 and starts[1] == 0:
+                starts, rates = starts[1:], rates[1:]
+            self._segments[key] = (starts, rates)
+        return self._segments[key]
+
+    def period_rates(self, periods_per_year: int, horizon: int) -> np.ndarray:
+        starts, rates = self.segments(periods_per_year, horizon)
+        return np.repeat(rates, np.diff(np.append(starts, horizon)))
+
+    def rate_at(self, periods, periods_per_year: int, horizon: int):
+        starts, rates = self.segments(periods_per_year, horizon)
+        return rates[np.searchsorted(starts, periods, side="right") - 1]
+
+
+def lump_sums(term: int, periods_per_year: int, start_date: datetime, lump_sum_payments: List[Dict]) -> np.ndarray:
+    lumps = np.zeros(term * periods_per_year)
+    offsets = np.maximum(period_offsets([payment["payment_date"] for payment in lump_sum_payments],
+                                        start_date, periods_per_year), 0)
+    within = offsets < len(lumps)
+    amounts = np.array([payment["amount"] for payment in lump_sum_payments], dtype=float)
+    np.add.at(lumps, offsets[within], amounts[within])
+    return lumps
+
+
+def amortize(balance, period_rates, scheduled_payment, extra_payment, periods=None,
+             lump_sums=None) -> Dict[str, np.ndarray]:
+    # every argument broadcasts over leading axes, the last axis of period_rates is the period axis;
+    # periods optionally caps the horizon of each row when rows of different terms share one padded array,
+    # lump_sums are one-off payments per period on top of the regular extra payment
+    rates = np.asarray(period_rates, dtype=float)
+    opening_balance = np.asarray(balance, dtype=float)[..., np.newaxis]
+    scheduled = np.asarray(scheduled_payment, dtype=float)[..., np.newaxis]
+    extra = np.asarray(extra_payment, dtype=float)[..., np.newaxis]
+    if lump_sums is not None:
+        extra = extra + np.asarray(lump_sums, dtype=float)
+
+    # closed form of new_balance[k] = balance[k] * (1 + rate[k]) - payment[k] for every period at once
+    growth = np.cumprod(1 + rates, axis=-1)
+    new_balance = growth * (opening_balance - np.cumsum((scheduled + extra) / growth, axis=-1))
+    shape = new_balance.shape
+    balance = np.concatenate([np.broadcast_to(opening_balance, shape[:-1] + (1,)), new_balance[..., :-1]], axis=-1)
+
+    horizon = shape[-1]
+    paid_off = new_balance <= 0
+    if horizon:
+        lengths = np.where(paid_off.any(axis=-1), paid_off.argmax(axis=-1) + 1, horizon)
+    else:
+        lengths = np.zeros(shape[:-1], dtype=int)
+    if periods is not None:
+        lengths = np.minimum(lengths, periods)
+    active = np.arange(horizon) < lengths[..., np.newaxis]
+    live = active & (balance > 0)
+
+    interest = np.where(live, balance * rates, 0.0)
+    principal = np.where(live, scheduled - interest, 0.0)
+    extra = np.where(live, extra, 0.0)
+    total_payment = interest + principal + extra
+
+    return {
+        "Period": np.broadcast_to(np.arange(1, horizon + 1), shape),
+        "Balance": np.where(active, balance, 0.0),
+        "Interest": interest,
+        "Principal": principal,
+        "Extra": extra,
+        "Total Payment": total_payment,
+        "New Balance": np.where(live, new_balance, 0.0),
+        "Accumulated Interest": np.cumsum(interest, axis=-1),
+        "Accumulated Principal Payment": np.cumsum(principal + extra, axis=-1),
+        "lengths": lengths
+    }
+
+
+def amortize_summary(balance, period_rates, payments, checkpoints=None) -> Dict[str, np.ndarray]:
+    # payoff period, totals and the balance left at the horizon without building the schedule columns;
+    # payments broadcast against period_rates and may vary per period, checkpoints pick balances to report
+    rates = np.asarray(period_rates, dtype=float)
+    opening_balance = np.asarray(balance, dtype=float)[..., np.newaxis]
+    growth = np.cumprod(1 + rates, axis=-1)
+    payments = np.broadcast_to(np.asarray(payments, dtype=float), growth.shape)
+    new_balance = growth * (opening_balance - np.cumsum(payments / growth, axis=-1))
+
+    horizon = rates.shape[-1]
+    paid_off = new_balance <= 0
+    periods = np.where(paid_off.any(axis=-1), paid_off.argmax(axis=-1) + 1, horizon)
+    last = (periods - 1)[..., np.newaxis]
+    final_balance = np.take_along_axis(new_balance, last, axis=-1)[..., 0]
+    total_repayment = np.take_along_axis(np.cumsum(payments, axis=-1), last, axis=-1)[..., 0]
+    summary = {
+        "periods": periods,
+        "total_interest": total_repayment - opening_balance[..., 0] + final_balance,
+        "total_repayment": total_repayment,
+        "remaining_balance": np.maximum(final_balance, 0)
+    }
+    if checkpoints is not None:
+        checkpoints = np.asarray(checkpoints)
+        summary["balances"] = np.where(checkpoints < periods[..., np.newaxis],
+                                       np.maximum(new_balance[..., checkpoints], 0), 0)
+    return summary
+
+
+def truncate(columns: Dict[str, np.ndarray], index=(), dtype: np.dtype = SCHEDULE_DTYPE) -> np.ndarray:
+    # packs one row of kernel output into schedule records, so the full horizon is not kept alive
+    length = int(columns["lengths"][index])
+    rows = np.empty(length, dtype=dtype)
+    for name in SCHEDULE_COLUMNS:
+        rows[name] = columns[name][index][:length]
+    return rows
+
+
+def _shift(columns: Dict[str, np.ndarray], start: int, accumulated_interest: float, accumulated_principal: float):
+    columns["Period"] = columns["Period"] + start
+    columns["Accumulated Interest"] += accumulated_interest
+    columns["Accumulated Principal Payment"] += accumulated_principal
+    return truncate(columns)
+
+
+def recompute_from(rows: np.ndarray, start: int, period_rates: np.ndarray, scheduled_payment: float,
+                   extra_payment: float, lump_sums=None) -> np.ndarray:
+    # keeps the rows before start and re-runs the kernel from the opening balance of row start
+    if start >= len(rows):
+        return rows
+    suffix = amortize(rows["Balance"][start], period_rates[start:], scheduled_payment, extra_payment,
+                      lump_sums=None if lump_sums is None else lump_sums[start:])
+    suffix = _shift(suffix, start, rows["Accumulated Interest"][start - 1] if start else 0.0,
+                    rows["Accumulated Principal Payment"][start - 1] if start else 0.0)
+    return np.concatenate([rows[:start], suffix])
+
+
+def to_cents(amounts) -> np.ndarray:
+    # rounds half up to whole cents; the inner round drops binary noise such as 1.005 * 100 == 100.49999
+    return np.floor(np.round(np.asarray(amounts, dtype=float) * 100, 6) + 0.5).astype(np.int64)
+
+
+def to_rate_units(annual_rates) -> np.ndarray:
+    return np.floor(np.round(np.asarray(annual_rates, dtype=float) * RATE_SCALE, 6) + 0.5).astype(np.int64)
+
+
+def from_cents(rows: np.ndarray) -> np.ndarray:
+    amounts = np.empty(len(rows), dtype=SCHEDULE_DTYPE)
+    amounts["Period"] = rows["Period"]
+    for name in SCHEDULE_COLUMNS[1:]:
+        amounts[name] = rows[name] / 100
+    return amounts
+
+
+def amortize_cents(balance: int, annual_rates, periods_per_year: int, scheduled_payment: int,
+                        extra_payment: int, periods: Optional[int] = None, lump_sums=None) -> np.ndarray:
+    # exact fixed point version of amortize: amounts are int cents, annual_rates are RATE_SCALE units and each
+    # period's interest is rounded half up to the cent. Rounding makes every period depend on the rounded one
+    # before it, so the periods are walked on plain ints; numpy calls per period on one schedule cost more
+    # than the arithmetic. Returns CENTS_SCHEDULE_DTYPE records.
+    rates = np.asarray(annual_rates, dtype=np.int64).tolist()
+    horizon = len(rates) if periods is None else min(int(periods), len(rates))
+    extras = [int(extra_payment)] * horizon
+    if lump_sums is not None:
+        extras = [extra + int(lump) for extra, lump in zip(extras, np.asarray(lump_sums, dtype=np.int64).tolist())]
+    balance, scheduled = int(balance), int(scheduled_payment)
+    denominator = RATE_SCALE * int(periods_per_year)
+    if balance > np.iinfo(np.int64).max // max(max(rates, default=0), 1):
+        raise ValueError("Balance is too large for the fixed point engine")
+
+    values = []
+    for k in range(horizon):
+        if balance <= 0:
+            break
+        interest = (balance * rates[k] + denominator // 2) // denominator
+        principal = scheduled - interest
+        new_balance = balance - principal - extras[k]
+        values.append((k + 1, balance, interest, principal, extras[k], interest + principal + extras[k],
+                       new_balance))
+        balance = new_balance
+
+    rows = np.zeros(len(values), dtype=CENTS_SCHEDULE_DTYPE)
+    if values:
+        table = np.array(values, dtype=np.int64)
+        for i, name in enumerate(SCHEDULE_COLUMNS[:7]):
+            rows[name] = table[:, i]
+        rows["Accumulated Interest"] = np.cumsum(rows["Interest"])
+        rows["Accumulated Principal Payment"] = np.cumsum(rows["Principal"] + rows["Extra"])
+    return rows
+
+
+class ScheduleRow(Mapping):
+    # read-only view of one schedule record, reads like the old row dict but is not one: anything handing
+    # rows out of the process (jsonify, isinstance(row, dict) checks) takes to_dict()
+    __slots__ = ("_record", "_scale")
+
+    def __init__(self, record: np.void, scale: int = 1):
+        self._record = record
+        self._scale = scale
+
+    def __getitem__(self, name: str):
+        if name not in SCHEDULE_DTYPE.fields:
+            raise KeyError(name)
+        value = self._record[name].item()
+        return value if name == "Period" or self._scale == 1 else value / self._scale
+
+    def __iter__(self):
+        return iter(SCHEDULE_COLUMNS)
+
+    def __len__(self):
+        return len(SCHEDULE_COLUMNS)
+
+    def to_dict(self) -> Dict[str, float]:
+        return dict(self)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class Schedule(Sequence):
+    # schedule backed by a structured array, columns by name and rows as read-only views;
+    # fixed point rows stay in cents and only read as amounts
+    __slots__ = ("rows", "scale")
+
+    def __init__(self, rows: np.ndarray):
+        self.rows = rows
+        self.scale = 100 if rows.dtype == CENTS_SCHEDULE_DTYPE else 1
+
+    @property
+    def columns(self) -> np.ndarray:
+        return self.rows if self.scale == 1 else from_cents(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("schedule index out of range")
+        return self._row(index)
+
+    def __iter__(self):
+        for record in self.rows:
+            yield ScheduleRow(record, self.scale)
+
+    def to_dicts(self) -> List[Dict[str, float]]:
+        return [row.to_dict() for row in self]
+
+    def _row(self, index: int) -> ScheduleRow:
+        return ScheduleRow(self.rows[index], self.scale)
+
+
+def balance_after(balance, period_rate, payment, periods):
+    # balance left after a number of level payments, the closed form of the period recurrence
+    balance, rate, payment, periods = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in
+                                                            (balance, period_rate, payment, periods)))
+    growth_minus_one = np.expm1(periods * np.log1p(rate))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        accumulated = np.where(rate != 0, growth_minus_one / rate, periods)
+    return balance * (1 + growth_minus_one) - payment * accumulated
+
+
+def payoff_summary(balance, period_rate, payment) -> Dict[str, np.ndarray]:
+    balance, rate, payment = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in
+                                                   (balance, period_rate, payment)))
+    # a payment that does not cover the first period's interest never repays the loan
+    amortizing = (balance <= 0) | (payment > balance * rate)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        exact = np.where(rate != 0, -np.log1p(-balance * rate / payment) / np.log1p(rate), balance / payment)
+    periods = np.ceil(np.where(amortizing & (balance > 0), exact, 0))
+    # the logarithm can land a hair above a whole number of periods
+    periods = np.where((periods > 1) & (balance_after(balance, rate, payment, periods - 1) <= 0),
+                       periods - 1, periods)
+
+    remaining = balance_after(balance, rate, payment, periods)
+    total_repayment = payment * periods
+    total_interest = total_repayment - balance + remaining
+    return {
+        "periods": np.where(amortizing, periods, np.inf),
+        "total_interest": np.where(amortizing, total_interest, np.inf),
+        "total_repayment": np.where(amortizing, total_repayment, np.inf),
+        "amortizing": amortizing
+    }
+
+
+class BalanceCurve:
+    # the balance recurrence solved in closed form per constant-rate piece, pieces split at rate changes and
+    # after each dated lump sum, so a query searches the pieces instead of walking every period
+    __slots__ = ("borrowed", "payment", "horizon", "starts", "rates", "opening", "lump_ends", "lump_paid",
+                 "payoff_period")
+
+    def __init__(self, balance: float, starts: np.ndarray, period_rates: np.ndarray, payment: float, horizon: int,
+                 lump_periods=(), lump_amounts=()):
+        lump_periods = np.maximum(np.asarray(lump_periods, dtype=np.int64), 0)
+        within = lump_periods < horizon
+        # a lump paid in period p lowers the balance from period p + 1 on
+        self.lump_ends, inverse = np.unique(lump_periods[within] + 1, return_inverse=True)
+        lump_totals = np.bincount(inverse, weights=np.asarray(lump_amounts, dtype=float)[within],
+                                  minlength=len(self.lump_ends))
+        self.lump_paid = np.concatenate([[0.0], np.cumsum(lump_totals)])
+        self.borrowed = balance
+        self.payment = payment
+        self.horizon = horizon
+
+        self.starts = np.union1d(starts, self.lump_ends)
+        self.rates = np.asarray(period_rates)[np.searchsorted(starts, self.starts, side="right") - 1]
+        ends = np.append(self.starts[1:], horizon)
+        lump_at = dict(zip(self.lump_ends.tolist(), lump_totals.tolist()))
+        self.opening = np.empty(len(self.starts))
+        self.payoff_period = horizon
+        opening = balance
+        for j, (start, end, rate) in enumerate(zip(self.starts.tolist(), ends.tolist(), self.rates.tolist())):
+            opening -= lump_at.get(start, 0.0)
+            self.opening[j] = opening
+            if self.payoff_period < horizon:
+                continue
+            if opening <= 0:
+                self.payoff_period = start
+                continue
+            periods = payoff_summary(opening, rate, payment)["periods"].item()
+            if periods <= end - start:
+                self.payoff_period = start + int(periods)
+            opening = balance_after(opening, rate, payment, end - start).item()
+
+    def _elapsed(self, periods) -> np.ndarray:
+        # periods past the payoff or the horizon leave the balance where the schedule stopped
+        return np.clip(np.asarray(periods), 0, self.payoff_period)
+
+    def _unclipped(self, elapsed: np.ndarray) -> np.ndarray:
+        piece = np.searchsorted(self.starts, elapsed, side="right") - 1
+        return balance_after(self.opening[piece], self.rates[piece], self.payment, elapsed - self.starts[piece])
+
+    def balance(self, periods) -> np.ndarray:
+        return np.maximum(self._unclipped(self._elapsed(periods)), 0)
+
+    def accumulated_interest(self, periods) -> np.ndarray:
+        # interest is what the payments made did not take off the balance
+        elapsed = self._elapsed(periods)
+        lumps = self.lump_paid[np.searchsorted(self.lump_ends, elapsed, side="right")]
+        return self._unclipped(elapsed) - self.borrowed + elapsed * self.payment + lumps
+
+    def periods_remaining(self, periods) -> np.ndarray:
+        return self.payoff_period - self._elapsed(periods)
+
+
+def payment_factor(annual_rate, term, periods_per_year):
+    # level payment per unit of principal, broadcast over rates, terms and frequencies
+    rate = np.asarray(annual_rate, dtype=float) / periods_per_year
+    payments = np.asarray(term) * periods_per_year
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(rate != 0, rate / -np.expm1(-payments * np.log1p(rate)), 1 / payments)
+
+
+# first and second order partials in the annual rate, the principal and the term in years
+SENSITIVITY_KEYS = ("rate", "principal", "term", "rate_rate", "rate_principal", "rate_term", "principal_principal",
+                    "principal_term", "term_term")
+# below this rate times period count the closed forms cancel badly and the series limits are closer
+SERIES_THRESHOLD = 1e-5
+
+
+def _factor_partials(rate, periods):
+    # f = r / (1 - (1 + r)^-n) and its partials in the period rate r and the period count n, written through
+    # g = 1 / (1 - (1 + r)^-n) so f = r g; rates near zero take the limits of the series in r
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        log_growth = np.log1p(rate)
+        g = -1 / np.expm1(-periods * log_growth)
+        g_r = -periods * g * (g - 1) / (1 + rate)
+        g_rr = g_r * (periods - 1 - 2 * periods * g) / (1 + rate)
+        g_n = -log_growth * g * (g - 1)
+        g_nn = -g_n * log_growth * (2 * g - 1)
+        g_rn = g_r * (1 / periods + log_growth * (1 - 2 * g))
+        partials = (rate * g, g + rate * g_r, rate * g_n, 2 * g_r + rate * g_rr, g_n + rate * g_rn, rate * g_nn)
+    limits = (1 / periods, (periods + 1) / (2 * periods), -1 / periods ** 2, (periods ** 2 - 1) / (6 * periods),
+              -1 / (2 * periods ** 2), 2 / periods ** 3)
+    closed = np.abs(rate * periods) > SERIES_THRESHOLD
+    return tuple(np.where(closed, partial, limit) for partial, limit in zip(partials, limits))
+
+
+def _balance_times(balance, value, d_r, d_n, d_rr, d_rn, d_nn, rate_scale, term_scale, offset=0.0):
+    # partials of balance * (value - offset) once the factor partials are in hand
+    return dict(zip(SENSITIVITY_KEYS, (
+        balance * d_r * rate_scale, value - offset, balance * d_n * term_scale,
+        balance * d_rr * rate_scale ** 2, d_r * rate_scale, balance * d_rn * rate_scale * term_scale,
+        np.zeros_like(value), d_n * term_scale, balance * d_nn * term_scale ** 2
+    )))
+
+
+def sensitivities(balance, annual_rate, term, periods_per_year, payment=None,
+                  rate_unit: float = 1.0) -> Dict[str, Dict[str, np.ndarray]]:
+    # closed form first and second order sensitivities of the level payment, the full term interest and the
+    # payoff period count, broadcast over mortgages and frequencies. The payoff holds payment (the level
+    # payment where it is None or nan) fixed, so it does not move with the term; rate_unit is the step of
+    # annual rate the rate partials are per, 0.01 for percentage points
+    balance, annual_rate, term, payment = np.broadcast_arrays(*(
+        np.asarray(v, dtype=float) for v in (balance, annual_rate, term, np.nan if payment is None else payment)))
+    rate = annual_rate / periods_per_year
+    periods = term * periods_per_year
+    rate_scale = rate_unit / periods_per_year
+    f, f_r, f_n, f_rr, f_rn, f_nn = _factor_partials(rate, periods)
+
+    level_payment = balance * f
+    total = (periods * f, periods * f_r, f + periods * f_n, periods * f_rr, f_r + periods * f_rn,
+             2 * f_n + periods * f_nn)
+    result = {
+        "payment": _balance_times(balance, f, f_r, f_n, f_rr, f_rn, f_nn, rate_scale, periods_per_year),
+        "total_interest": _balance_times(balance, *total, rate_scale, periods_per_year, offset=1.0)
+    }
+
+    payment = np.where(np.isnan(payment), level_payment, payment)
+    share = balance / payment
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # payoff periods N = u w with u = -ln(1 - B r / A) and w = 1 / ln(1 + r)
+        remaining = 1 - share * rate
+        amortizing = remaining > 0
+        log_growth = np.log1p(rate)
+        u = -np.log(remaining)
+        w = 1 / log_growth
+        u_r, u_b = share / remaining, rate / payment / remaining
+        u_rb = 1 / payment / remaining ** 2
+        w_r = -w ** 2 / (1 + rate)
+        w_rr = (1 + 2 * w) * w ** 2 / (1 + rate) ** 2
+        payoff = (u_r * w + u * w_r, u_b * w, u_r ** 2 * w + 2 * u_r * w_r + u * w_rr, u_rb * w + u_b * w_r,
+                  u_b ** 2 * w)
+    limits = (share * (1 + share) / 2, 1 / payment, -share / 6 + share ** 2 / 2 + 2 * share ** 3 / 3,
+              (1 + 2 * share) / (2 * payment), np.zeros_like(share))
+    # the payoff's second rate partial cancels one order harder than the payment's
+    closed = np.abs(share * rate) > 10 * SERIES_THRESHOLD
+    d_r, d_b, d_rr, d_rb, d_bb = (np.where(amortizing, np.where(closed, partial, limit), np.nan)
+                                  for partial, limit in zip(payoff, limits))
+    zeros = np.where(amortizing, 0.0, np.nan)
+    result["payoff_periods"] = dict(zip(SENSITIVITY_KEYS, (
+        d_r * rate_scale, d_b, zeros, d_rr * rate_scale ** 2, d_rb * rate_scale, zeros, d_bb, zeros, zeros
+    )))
+    return result
+
+
+def _payoff_interest(balance, rate, payment, log_growth):
+    # payoff_summary's total interest for positive rates, without its validation, for the solver's inner loop
+    periods = np.ceil(-np.log1p(-balance * rate / payment) / log_growth)
+    before = periods - 1
+    remaining_before = balance * np.exp(before * log_growth) - payment * np.expm1(before * log_growth) / rate
+    periods = np.where((periods > 1) & (remaining_before <= 0), periods - 1, periods)
+    remaining = balance * np.exp(periods * log_growth) - payment * np.expm1(periods * log_growth) / rate
+    return payment * periods - balance + remaining
+
+
+def payment_for_interest(balance, period_rate, total_interest, tolerance: float = 1e-7, max_iterations: int = 60):
+    # payment whose payoff accrues total_interest, nan where even a one period payoff accrues more.
+    # Total interest falls monotonically as the payment rises, so Newton steps use the slope of the continuous
+    # payoff time and fall back to bisection whenever a step would leave the bracket
+    balance, rate, target = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in
+                                                  (balance, period_rate, total_interest)))
+    low = balance * rate
+    high = balance * (1 + rate)
+    reachable = (rate > 0) & (target >= low)
+    log_growth = np.log1p(rate)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # start from the level payment over the payoff time simple interest would suggest, I ~ B * r * n / 2
+        guess = balance * payment_factor(rate, np.maximum(2 * target / low, 1), 1)
+        payment = np.where(reachable & (guess > low) & (guess < high), guess, high)
+        for _ in range(max_iterations):
+            error = _payoff_interest(balance, rate, payment, log_growth) - target
+            done = ~reachable | (np.abs(error) <= tolerance * np.maximum(target, 1))
+            if done.all():
+                break
+            low = np.where(error > 0, payment, low)
+            high = np.where(error < 0, payment, high)
+            periods = -np.log1p(-balance * rate / payment) / log_growth
+            step = payment - error / (periods - balance * rate / (log_growth * (payment - balance * rate)))
+            payment = np.where(done, payment, np.where((step > low) & (step < high), step, (low + high) / 2))
+    return np.where(reachable, payment, np.nan)
+
+
+def repayment_breakdown(borrowed, annual_rate, term, periods_per_year, override_payment) -> Dict[str, np.ndarray]:
+    # first period split of the repayment, broadcast over mortgages and a trailing frequency axis;
+    # override_payment is nan wherever no override applies
+    estimated_repayment = borrowed * payment_factor(annual_rate, term, periods_per_year)
+    initial_interest = borrowed * (annual_rate / periods_per_year)
+    initial_principal = estimated_repayment - initial_interest
+    initial_extra = np.where(np.isnan(override_payment), 0, override_payment - estimated_repayment)
+    return {
+        "estimated_repayment": estimated_repayment,
+        "initial_interest": initial_interest,
+        "initial_principal": initial_principal,
+        "initial_extra": initial_extra,
+        "total_repayment": initial_interest + initial_principal + initial_extra
+    }
+
+
+def maturity_summary(borrowed, annual_rate, term, periods_per_year, estimated_repayment,
+                     override_payment) -> Dict[str, np.ndarray]:
+    # full term figures and the payoff of the override, broadcast like repayment_breakdown
+    full_term_payments = np.asarray(term) * periods_per_year
+    interest_over_full_term = estimated_repayment * full_term_payments - borrowed
+    applies = ~np.isnan(override_payment)
+    payoff = payoff_summary(borrowed, annual_rate / periods_per_year,
+                            np.where(applies, override_payment, estimated_repayment))
+    total_interest_paid = np.where(applies, payoff["total_interest"], 0)
+    return {
+        "full_term_payments": full_term_payments,
+        "interest_over_full_term": interest_over_full_term,
+        "principal_plus_interest_full_term": interest_over_full_term + borrowed,
+        "total_interest_paid": total_interest_paid,
+        "total_repayment": np.where(applies, payoff["total_repayment"], 0),
+        "total_interest_saved": np.where(applies, interest_over_full_term - total_interest_paid, 0),
+        "periods_to_repay": np.where(applies & payoff["amortizing"], payoff["periods"], 0).astype(int),
+        "amortizing": payoff["amortizing"] | ~applies
+    }
+
+
+def iter_schedule(balance: float, period_rates: np.ndarray, scheduled_payment: float, extra_payment: float,
+                  lump_sums=None, chunk_size: int = 120):
+    # evaluates the kernel one chunk of periods at a time, so a consumer that stops early never pays for the rest
+    accumulated_interest = 0.0
+    accumulated_principal = 0.0
+    for start in range(0, len(period_rates), chunk_size):
+        columns = amortize(balance, period_rates[start:start + chunk_size], scheduled_payment, extra_payment,
+                           lump_sums=None if lump_sums is None else lump_sums[start:start + chunk_size])
+        chunk = _shift(columns, start, accumulated_interest, accumulated_principal)
+        yield from Schedule(chunk)
+
+        balance = chunk["New Balance"][-1]
+        if balance <= 0:
+            return
+        accumulated_interest = chunk["Accumulated Interest"][-1]
+        accumulated_principal = chunk["Accumulated Principal Payment"][-1]
@@ -1,21 +1,27 @@
 from flask import (Flask, render_template, request, redirect, url_for, session,
                    jsonify, flash, send_file)
-import psycopg2
 from user import UserManager
-from mortgage import Mortgage
+from mortgage import Mortgage, MortgageBatch, schedule_cache
+from instrumentation import instrumentation
 import logging
+from logging_config import configure_logging
 import pandas as pd
 from io import BytesIO
 import database
-from graphing import create_amortization_charts
+import schedule_store
+from database import connect_to_database
+from graphing import create_amortization_charts, export_schedules
 from datetime import datetime
+from decimal import Decimal
+from typing import List
 import time
 
 
 user_manager = UserManager()
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "secret key"
-logging.basicConfig(level=logging.DEBUG)
+configure_logging()
+logger = logging.getLogger(__name__)
 
 
 @app.route("/", methods=["GET", "POST"])
@@ -25,37 +31,17 @@ def root():
 
 def initialize_database():
     if not database.check_database_connection():
-        print("database not initialized. Creating database...")
+        logger.info("database not initialized. Creating database...")
         database.create_database()
         time.sleep(5)
         if not database.check_database_connection():
-            print("database creation failed.")
+            logger.error("database creation failed.")
             return False
         else:
-            print("database created successfully.")
-            return True
+            logger.info("database created successfully.")
     else:
-        print("database already initialized.")
-        return True
-
-
-def connect_to_database():
-    try:
-        conn = psycopg2.connect(
-            dbname="mortgage_calculator",
-            user="postgres",
-            password="admin123",
-            host="localhost",
-            port="5432"
-        )
-        conn.autocommit = True
-
-        logging.debug("Database connection established.")
-
-        return conn
-    except Exception as e:
-        logging.error(f"Failed to connect to the database: {str(e)}")
-        raise
+        logger.info("database already initialized.")
+    return database.migrate_database()
 
 
 @app.route("/login", methods=["GET", "POST"])
@@ -80,7 +66,7 @@ def login():
                 return render_template('login.html', error="Invalid username or password")
 
         except Exception as e:
-            logging.error(f"Login error: {str(e)}")
+            logger.error(f"Login error: {str(e)}")
             return f"An error occurred: {str(e)}"
 
     return render_template('login.html')
@@ -107,7 +93,7 @@ def signup():
             return redirect(url_for("login"))
 
         except Exception as e:
-            logging.error(f"Signup error: {str(e)}")
+            logger.error(f"Signup error: {str(e)}")
             return f"An error occurred: {str(e)}"
 
     return render_template("signup.html")
@@ -122,68 +108,70 @@ def index():
     mortgage_details = []
     error_message = None
 
+    conn = cursor = None
     try:
         conn = connect_to_database()
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT mortgage_id, mortgage_name, principal, interest, term, extra_costs, deposit, 
-                   payment_override_enabled, monthly_payment_override, fortnightly_payment_override,
-                   start_date, comments, created_at
-            FROM mortgages 
-            WHERE user_id = (SELECT user_id FROM users WHERE username = %s)
-        """, (username,))
-        mortgages = cursor.fetchall()
-
-        for mortgage in mortgages:
-            (mortgage_id, mortgage_name, principal, interest, term, extra_costs, deposit,
-             payment_override_enabled, monthly_payment_override, fortnightly_payment_override,
-             start_date, comments, created_at) = mortgage
-
-            mortgage_obj = Mortgage(mortgage_name, float(interest), term, float(principal), float(deposit),
-                                    float(extra_costs))
-            mortgage_obj.gather_inputs(float(principal), float(interest), term, float(extra_costs), float(deposit),
-                                       payment_override_enabled,
-                                       float(monthly_payment_override) if monthly_payment_override else None,
-                                       float(fortnightly_payment_override) if fortnightly_payment_override else None)
-            mortgage_obj.calculate_initial_payment_breakdown()
-            mortgage_obj.calculate_mortgage_maturity()
-            amortization_schedule = mortgage_obj.amortization_table()
-            graph_html_monthly, graph_html_fortnightly = create_amortization_charts(amortization_schedule)
+        # mortgages and their rate change histories in one query rather than one more per mortgage
+        mortgages = database.fetch_portfolio(cursor, username)
+
+        # one array pass over the whole portfolio instead of a Mortgage per row
+        batch = MortgageBatch(
+            principal=[row['principal'] for row in mortgages],
+            interest=[row['interest'] for row in mortgages],
+            term=[row['term'] for row in mortgages],
+            extra_costs=[row['extra_costs'] for row in mortgages],
+            deposit=[row['deposit'] for row in mortgages],
+            payment_override_enabled=[row['payment_override_enabled'] for row in mortgages],
+            monthly_payment_override=[row['monthly_payment_override'] or None for row in mortgages],
+            fortnightly_payment_override=[row['fortnightly_payment_override'] or None for row in mortgages],
+            start_dates=[row['start_date'] or datetime.now() for row in mortgages],
+            interest_rate_changes=[row['interest_rate_changes'] for row in mortgages]
+        )
+        batch.calculate_initial_payment_breakdown()
+        batch.calculate_mortgage_maturity()
+        batch.amortization_table(frequencies=("monthly", "fortnightly"))
 
-            cursor.execute("""
-                SELECT new_interest_rate, effective_date
-                FROM interest_rate_changes
-                WHERE mortgage_id = %s
-                ORDER BY effective_date DESC
-                LIMIT 1
-            """, (mortgage_id,))
-            interest_rate_change = cursor.fetchone()
+        for index, mortgage in enumerate(mortgages):
+            amortization_schedule = batch.get_amortization_schedules(index)
+            graph_html_monthly, graph_html_fortnightly = create_amortization_charts(amortization_schedule)
 
-            latest_interest_rate = float(interest_rate_change[0]) if interest_rate_change else float(interest)
-            latest_effective_date = interest_rate_change[1] if interest_rate_change else datetime.now()
+            interest_rate_changes = mortgage['interest_rate_changes']
+            latest_interest_rate = interest_rate_changes[-1]['new_interest_rate'] if interest_rate_changes \
+                else float(mortgage['interest'])
+            latest_effective_date = interest_rate_changes[-1]['effective_date'] if interest_rate_changes \
+                else datetime.now()
+            start_date, created_at = mortgage['start_date'], mortgage['created_at']
+            mortgage_maturity = batch.get_mortgage_maturity(index)
+            # a stored override that no longer amortizes is flagged on its own mortgage only
+            non_amortizing = [frequency for frequency in ('monthly', 'fortnightly')
+                              if not mortgage_maturity[frequency]['amortizing']]
 
             mortgage_details.append({
-                'mortgage_id': mortgage_id,
-                'mortgage_name': mortgage_name,
-                'initial_principal': float(principal),
-                'initial_interest': float(interest),
-                'initial_term': term,
-                'extra_costs': float(extra_costs),
-                'deposit': float(deposit),
-                'initial_payment_breakdown': mortgage_obj.get_initial_payment_breakdown(),
-                'mortgage_maturity': mortgage_obj.mortgage_maturity,
+                'mortgage_id': mortgage['mortgage_id'],
+                'mortgage_name': mortgage['mortgage_name'],
+                'initial_principal': float(mortgage['principal']),
+                'initial_interest': float(mortgage['interest']),
+                'initial_term': mortgage['term'],
+                'extra_costs': float(mortgage['extra_costs']),
+                'deposit': float(mortgage['deposit']),
+                'initial_payment_breakdown': batch.get_initial_payment_breakdown(index),
+                'mortgage_maturity': mortgage_maturity,
+                'override_warning': (f"The {' and '.join(non_amortizing)} payment override does not cover the interest "
+                                     f"charged per period.") if non_amortizing else None,
                 'amortization_schedule': amortization_schedule,
                 'graph_html_monthly': graph_html_monthly,
                 'graph_html_fortnightly': graph_html_fortnightly,
                 'latest_interest_rate': latest_interest_rate,
                 'latest_effective_date': latest_effective_date,
+                'interest_rate_changes': interest_rate_changes,
                 'start_date': start_date.strftime("%d-%m-%Y") if start_date else "N/A",
-                'comments': comments,
+                'comments': mortgage['comments'],
                 'created_at': created_at.strftime("%d-%m-%Y %H:%M:%S") if created_at else "N/A",
             })
 
     except Exception as e:
-        logging.error(f"Error fetching mortgage details: {str(e)}")
+        logger.error(f"Error fetching mortgage details: {str(e)}")
         error_message = f"An error occurred: {str(e)}"
     finally:
         if cursor:
@@ -195,6 +183,29 @@ def index():
                            error_message=error_message)
 
 
+def mortgage_from_row(cursor, mortgage_data) -> Mortgage:
+    # a SELECT * FROM mortgages row and its rate history as a Mortgage; saving, updating and refreshing stored
+    # schedules all rebuild the mortgage here so the stored rows follow exactly what the row holds
+    mortgage_id = mortgage_data[0]
+    mortgage = Mortgage(
+        mortgage_name=mortgage_data[2],
+        initial_interest=float(mortgage_data[4]),
+        initial_term=int(mortgage_data[5]),
+        initial_principal=float(mortgage_data[3]),
+        deposit=float(mortgage_data[7] or 0),
+        extra_costs=float(mortgage_data[6] or 0),
+        comments=mortgage_data[12],
+        payment_override_enabled=bool(mortgage_data[8]),
+        monthly_payment_override=float(mortgage_data[9]) if mortgage_data[9] is not None else None,
+        fortnightly_payment_override=float(mortgage_data[10]) if mortgage_data[10] is not None else None,
+        start_date=mortgage_data[11],
+        created_at=mortgage_data[13]
+    )
+    mortgage._mortgage_id = mortgage_id
+    mortgage.interest_rate_changes = database.fetch_interest_rate_changes(cursor, mortgage_id)
+    return mortgage
+
+
 @app.route("/new_mortgage", methods=["GET", "POST"])
 def new_mortgage():
     if 'username' not in session:
@@ -213,7 +224,7 @@ def new_mortgage():
         mortgage_name = request.form.get("mortgage_name", "")
         start_date_str = request.form.get("start_date")
 
-        logging.info(f"Raw start_date received: {start_date_str}")
+        logger.debug("Raw start_date received: %s", start_date_str)
 
         try:
             principal = float(request.form.get("principal", "0"))
@@ -246,12 +257,10 @@ def new_mortgage():
             number_of_interest_rate_increments = int(number_of_interest_rate_increments) if number_of_interest_rate_increments else 0
             increment_results['number_of_interest_rate_increments'] = number_of_interest_rate_increments
 
-            logging.info(f"Received form data: mortgage_name={mortgage_name}, principal={principal}, interest={interest}, term={term}, "
-                         f"extra_costs={extra_costs}, deposit={deposit}, payment_override_enabled={payment_override_enabled}, "
-                         f"monthly_payment_override={monthly_payment_override}, fortnightly_payment_override={fortnightly_payment_override}, "
-                         f"start_date_str={start_date_str}, start_date={start_date}, comments={comments}, created_at={created_at}, "
-                         f"principal_increment_value={principal_increment_value}, number_of_principal_increments={number_of_principal_increments}, "
-                         f"interest_rate_increment_value={interest_rate_increment_value}, number_of_interest_rate_increments={number_of_interest_rate_increments}")
+            # amounts only, names and comments stay out of the logs
+            logger.debug("Mortgage form: action=%s principal=%s interest=%s term=%s override=%s increments=%sx%s",
+                         action, principal, interest, term, payment_override_enabled,
+                         number_of_principal_increments, number_of_interest_rate_increments)
 
         except ValueError as e:
             flash(f"An error occurred: {str(e)}", 'danger')
@@ -262,13 +271,17 @@ def new_mortgage():
                 mortgage_name, interest, term, principal, deposit, extra_costs, comments,
                 payment_override_enabled, monthly_payment_override, fortnightly_payment_override, start_date
             )
-            mortgage.calculate_initial_payment_breakdown()
-            mortgage.calculate_mortgage_maturity()
-
-            planning_scenarios = mortgage.generate_planning_scenarios(
-                principal_increment_value, number_of_principal_increments,
-                interest_rate_increment_value, number_of_interest_rate_increments
-            )
+            try:
+                mortgage.calculate_initial_payment_breakdown()
+                mortgage.calculate_mortgage_maturity()
+
+                planning_scenarios = mortgage.generate_planning_scenarios(
+                    principal_increment_value, number_of_principal_increments,
+                    interest_rate_increment_value, number_of_interest_rate_increments
+                )
+            except ValueError as e:
+                flash(f"An error occurred: {str(e)}", 'danger')
+                return render_template('new_mortgage.html', results=results)
 
             formatted_results = {
                 'initial_payment_breakdown': {key: f"{value:,.2f}" for key, value in mortgage.initial_payment_breakdown.items()},
@@ -300,32 +313,35 @@ def new_mortgage():
                 conn = connect_to_database()
                 cursor = conn.cursor()
                 try:
-                    logging.info("Fetching user_id for username: %s", username)
+                    logger.info("Fetching user_id for username: %s", username)
                     cursor.execute("SELECT user_id FROM users WHERE username = %s", (username,))
                     user_id = cursor.fetchone()[0]
 
-                    logging.info("Inserting new mortgage for user_id: %d", user_id)
-                    logging.info(f"Inserting mortgage with start_date: {start_date}")
-                    cursor.execute("""
-                        INSERT INTO mortgages (user_id, mortgage_name, principal, interest, term, extra_costs, deposit, 
-                        payment_override_enabled, monthly_payment_override, fortnightly_payment_override, start_date, comments, 
-                        created_at, principal_increment_value, number_of_principal_increments, interest_rate_increment_value, 
-                        number_of_interest_rate_increments)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING mortgage_id
-                    """, (
-                        user_id, mortgage_name, principal, interest, term, extra_costs, deposit,
-                        payment_override_enabled, monthly_payment_override, fortnightly_payment_override, start_date,
-                        comments, created_at, principal_increment_value, number_of_principal_increments,
-                        interest_rate_increment_value, number_of_interest_rate_increments
-                    ))
-
-                    mortgage_id = cursor.fetchone()[0]
-                    logging.info("Mortgage saved with id: %d", mortgage_id)
-
-                    conn.commit()
+                    logger.info("Inserting new mortgage for user_id: %d", user_id)
+                    logger.info(f"Inserting mortgage with start_date: {start_date}")
+                    # the mortgage and its stored schedules are committed together
+                    with database.atomic(conn):
+                        cursor.execute("""
+                            INSERT INTO mortgages (user_id, mortgage_name, principal, interest, term, extra_costs, deposit, 
+                            payment_override_enabled, monthly_payment_override, fortnightly_payment_override, start_date, comments, 
+                            created_at, principal_increment_value, number_of_principal_increments, interest_rate_increment_value, 
+                            number_of_interest_rate_increments)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING *
+                        """, (
+                            user_id, mortgage_name, principal, interest, term, extra_costs, deposit,
+                            payment_override_enabled, monthly_payment_override, fortnightly_payment_override, start_date,
+                            comments, created_at, principal_increment_value, number_of_principal_increments,
+                            interest_rate_increment_value, number_of_interest_rate_increments
+                        ))
+
+                        mortgage = mortgage_from_row(cursor, cursor.fetchone())
+                        mortgage_id = mortgage._mortgage_id
+                        schedule_store.store_schedules(cursor, mortgage_id, mortgage)
+                    logger.info("Mortgage saved with id: %d", mortgage_id)
+
                     flash('Mortgage saved successfully!', 'success')
                 except Exception as e:
-                    logging.error("Error occurred: %s", str(e))
+                    logger.error("Error occurred: %s", str(e))
                     conn.rollback()
                     flash(f"An error occurred: {str(e)}", 'danger')
                 finally:
@@ -351,19 +367,7 @@ def update_mortgage(mortgage_id):
         flash("Mortgage not found.", "danger")
         return redirect(url_for('index'))
 
-    mortgage = Mortgage(
-        mortgage_name=mortgage_data[2],
-        initial_interest=float(mortgage_data[4]),
-        initial_term=int(mortgage_data[5]),
-        initial_principal=float(mortgage_data[3]),
-        deposit=float(mortgage_data[7]),
-        extra_costs=float(mortgage_data[6]),
-        monthly_payment_override=float(mortgage_data[9]) if mortgage_data[9] is not None else None,
-        fortnightly_payment_override=float(mortgage_data[10]) if mortgage_data[10] is not None else None,
-        start_date=mortgage_data[11]
-    )
-
-    mortgage._mortgage_id = mortgage_id
+    mortgage = mortgage_from_row(cursor, mortgage_data)
 
     if request.method == 'POST':
         monthly_payment_override = request.form.get("monthly_payment_override", type=float)
@@ -372,7 +376,8 @@ def update_mortgage(mortgage_id):
         new_comments = request.form.get("comments", "")
 
         try:
-            logging.debug(f"Updating mortgage {mortgage_id} with: monthly_payment_override={monthly_payment_override}, extra_costs={extra_costs}, balloon_payment={balloon_payment}, comments={new_comments}")
+            logger.debug("Updating mortgage %s: monthly_payment_override=%s, extra_costs=%s, balloon_payment=%s",
+                         mortgage_id, monthly_payment_override, extra_costs, balloon_payment)
             mortgage.update_mortgage(
                 monthly_payment_override=monthly_payment_override,
                 extra_costs=extra_costs,
@@ -380,35 +385,30 @@ def update_mortgage(mortgage_id):
                 comments=new_comments
             )
 
-            cursor.execute("""
-                UPDATE mortgages
-                SET principal = %s, extra_costs = %s, monthly_payment_override = %s, fortnightly_payment_override = %s, comments = %s
-                WHERE mortgage_id = %s
-            """, (
-                float(mortgage._initial_principal), float(mortgage._extra_costs),
-                mortgage.monthly_payment_override, mortgage.fortnightly_payment_override,
-                mortgage._comments, mortgage_id
-            ))
-
-            for transaction in mortgage.transaction_logs:
+            # the mortgage row, its log rows and its stored schedules land together or not at all
+            with database.atomic(conn):
                 cursor.execute("""
-                    INSERT INTO transactions (mortgage_id, transaction_date, transaction_type, amount, current_principal, new_monthly_payment, new_fortnightly_payment, extra_payment, description)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    UPDATE mortgages
+                    SET principal = %s, extra_costs = %s, monthly_payment_override = %s, fortnightly_payment_override = %s, comments = %s
+                    WHERE mortgage_id = %s
                 """, (
-                    mortgage_id, transaction["transaction_date"], transaction["transaction_type"], transaction["amount"],
-                    transaction["current_principal"], transaction["new_monthly_payment"], transaction["new_fortnightly_payment"],
-                    transaction["extra_payment"], transaction["description"]
+                    float(mortgage._initial_principal), float(mortgage._extra_costs),
+                    mortgage.monthly_payment_override, mortgage.fortnightly_payment_override,
+                    mortgage._comments, mortgage_id
                 ))
-
-            conn.commit()
+                database.insert_transaction_logs(cursor, mortgage_id, mortgage.transaction_logs)
+                schedule_store.store_schedules(cursor, mortgage_id, mortgage)
 
             flash("Mortgage updated successfully.", "success")
             return redirect(url_for('view_mortgage', mortgage_id=mortgage_id))
 
         except Exception as e:
-            logging.error(f"Error updating mortgage: {e}")
+            logger.error(f"Error updating mortgage: {e}")
             flash(str(e), "danger")
             return redirect(url_for('update_mortgage', mortgage_id=mortgage_id))
+        finally:
+            cursor.close()
+            conn.close()
 
     cursor.close()
     conn.close()
@@ -424,48 +424,62 @@ def view_mortgage(mortgage_id):
     conn = connect_to_database()
     cursor = conn.cursor()
 
-    cursor.execute("SELECT * FROM mortgages WHERE mortgage_id = %s", (mortgage_id,))
-    mortgage_data = cursor.fetchone()
+    try:
+        cursor.execute("SELECT * FROM mortgages WHERE mortgage_id = %s", (mortgage_id,))
+        mortgage_data = cursor.fetchone()
 
-    cursor.execute("SELECT * FROM transactions WHERE mortgage_id = %s ORDER BY transaction_date DESC", (mortgage_id,))
-    transactions = cursor.fetchall()
+        if not mortgage_data:
+            flash("Mortgage not found.", "danger")
+            return redirect(url_for('index'))
 
-    cursor.close()
-    conn.close()
+        mortgage = mortgage_from_row(cursor, mortgage_data)
+        # the triggers drop stored rows when a rate change is written, rebuild them once the hash moved;
+        # the page does not depend on them, so a failed write is only logged
+        try:
+            with database.atomic(conn):
+                schedule_store.refresh_schedules(cursor, mortgage_id, mortgage)
+        except Exception as e:
+            logger.error("Error refreshing schedules for mortgage %s: %s", mortgage_id, e)
 
-    if not mortgage_data:
-        flash("Mortgage not found.", "danger")
-        return redirect(url_for('index'))
+        transactions, next_page = database.fetch_transaction_page(cursor, mortgage_id)
+    finally:
+        cursor.close()
+        conn.close()
 
-    mortgage = Mortgage(
-        mortgage_name=mortgage_data[2],
-        initial_interest=float(mortgage_data[4]),
-        initial_term=int(mortgage_data[5]),
-        initial_principal=float(mortgage_data[3]),
-        deposit=float(mortgage_data[7]),
-        extra_costs=float(mortgage_data[6]),
-        monthly_payment_override=float(mortgage_data[9]) if mortgage_data[9] is not None else None,
-        fortnightly_payment_override=float(mortgage_data[10]) if mortgage_data[10] is not None else None,
-        start_date=mortgage_data[11]
-    )
-    mortgage._mortgage_id = mortgage_id
+    return render_template('view_mortgage.html', mortgage=mortgage, transactions=transactions, next_page=next_page,
+                           username=session['username'])
+
+
+@app.route("/api/transactions/<int:mortgage_id>")
+def transaction_page(mortgage_id):
+    if 'username' not in session:
+        return jsonify({'message': 'Unauthorized'}), 401
+
+    conn = connect_to_database()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT 1 FROM mortgages m
+            JOIN users u ON u.user_id = m.user_id
+            WHERE m.mortgage_id = %s AND u.username = %s
+        """, (mortgage_id, session['username']))
+        if cursor.fetchone() is None:
+            return jsonify({'message': 'Mortgage not found.'}), 404
+        transactions, next_page = database.fetch_transaction_page(
+            cursor, mortgage_id, request.args.get("limit", database.TRANSACTION_PAGE_SIZE, type=int),
+            request.args.get("after"))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    finally:
+        cursor.close()
+        conn.close()
 
-    transaction_list = []
     for transaction in transactions:
-        transaction_list.append({
-            'transaction_date': transaction[2],
-            'transaction_type': transaction[3],
-            'amount': transaction[10],
-            'current_principal': transaction[4],
-            'new_interest_rate': transaction[5],
-            'new_monthly_payment': transaction[8],
-            'new_fortnightly_payment': transaction[9],
-            'remaining_term_months': transaction[6],
-            'extra_payment': transaction[7],
-            'description': transaction[11],
-        })
-
-    return render_template('view_mortgage.html', mortgage=mortgage, transactions=transaction_list, username=session['username'])
+        transaction['transaction_date'] = transaction['transaction_date'].isoformat()
+        for key, value in transaction.items():
+            if isinstance(value, Decimal):
+                transaction[key] = float(value)
+    return jsonify({'transactions': transactions, 'next_page': next_page})
 
 
 @app.route("/remove_mortgage/<int:mortgage_id>", methods=["POST"])
@@ -483,7 +497,7 @@ def remove_mortgage(mortgage_id):
 
         if mortgage_user_id is None:
             flash('Mortgage not found!', 'danger')
-            logging.error(f"Mortgage {mortgage_id} not found")
+            logger.error(f"Mortgage {mortgage_id} not found")
             return redirect(url_for('index'))
 
         user_id = session.get('user_id')
@@ -493,20 +507,21 @@ def remove_mortgage(mortgage_id):
 
         if mortgage_user_id[0] != user_id:
             flash('You do not have permission to delete this mortgage!', 'danger')
-            logging.error(f"User {user_id} does not have permission to delete mortgage {mortgage_id}")
+            logger.error(f"User {user_id} does not have permission to delete mortgage {mortgage_id}")
             return redirect(url_for('index'))
 
         # Delete related records first
         cursor.execute("DELETE FROM transactions WHERE mortgage_id = %s", (mortgage_id,))
+        schedule_store.invalidate_schedules(cursor, mortgage_id)
         cursor.execute("DELETE FROM mortgages WHERE mortgage_id = %s", (mortgage_id,))
         conn.commit()
         flash('Mortgage deleted successfully!', 'success')
-        logging.info(f"Mortgage {mortgage_id} deleted successfully")
+        logger.info(f"Mortgage {mortgage_id} deleted successfully")
 
     except Exception as e:
         conn.rollback()
         flash(f"An error occurred: {str(e)}", 'danger')
-        logging.error(f"Error deleting mortgage {mortgage_id}: {str(e)}")
+        logger.error(f"Error deleting mortgage {mortgage_id}: {str(e)}")
     finally:
         cursor.close()
         conn.close()
@@ -545,26 +560,21 @@ def get_mortgage_details(mortgage_id):
     try:
         conn = connect_to_database()
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT mortgage_id, mortgage_name, principal, interest, term, extra_costs, deposit, start_date, 
-                   payment_override_enabled, monthly_payment_override, fortnightly_payment_override 
-            FROM mortgages 
-            WHERE mortgage_id = %s
-        """, (mortgage_id,))
+        cursor.execute("SELECT * FROM mortgages WHERE mortgage_id = %s", (mortgage_id,))
         mortgage = cursor.fetchone()
 
         if mortgage:
-            mortgage_id, mortgage_name, principal, interest, term, extra_costs, deposit, start_date, payment_override_enabled, monthly_payment_override, fortnightly_payment_override = mortgage
-            mortgage_obj = Mortgage(mortgage_name, float(interest), term, float(principal), float(deposit),
-                                    float(extra_costs))
-            mortgage_obj.gather_inputs(
-                float(principal), float(interest), term, float(extra_costs), float(deposit),
-                payment_override_enabled,
-                float(monthly_payment_override) if monthly_payment_override else None,
-                float(fortnightly_payment_override) if fortnightly_payment_override else None
-            )
+            (mortgage_id, _, mortgage_name, principal, interest, term, extra_costs, deposit, payment_override_enabled,
+             monthly_payment_override, fortnightly_payment_override, start_date) = mortgage[:12]
+            # with its rate history, so the table and the export match the /index charts and the stored schedules
+            mortgage_obj = mortgage_from_row(cursor, mortgage)
             mortgage_obj.calculate_initial_payment_breakdown()
-            mortgage_obj.calculate_mortgage_maturity()
+            # a stored override that no longer amortizes still has a schedule to show, flagged like /index does
+            override_warning = None
+            try:
+                mortgage_maturity = mortgage_obj.mortgage_maturity
+            except ValueError as e:
+                mortgage_maturity, override_warning = {}, f"{e}."
             amortization_schedule = mortgage_obj.amortization_table()
 
             cursor.execute("SELECT comment FROM comments WHERE mortgage_id = %s", (mortgage_id,))
@@ -580,7 +590,8 @@ def get_mortgage_details(mortgage_id):
                 'extra_costs': extra_costs,
                 'deposit': deposit,
                 'initial_payment_breakdown': mortgage_obj.get_initial_payment_breakdown(),
-                'mortgage_maturity': mortgage_obj.mortgage_maturity,
+                'mortgage_maturity': mortgage_maturity,
+                'override_warning': override_warning,
                 'amortization_schedule': amortization_schedule,
                 'comments': comments,
                 'created_at': start_date,
@@ -592,7 +603,7 @@ def get_mortgage_details(mortgage_id):
             return mortgage_details
 
     except Exception as e:
-        logging.error(f"Error fetching mortgage details: {str(e)}")
+        logger.error(f"Error fetching mortgage details: {str(e)}")
         return None
     finally:
         if cursor:
@@ -612,36 +623,159 @@ def amortization_schedule(mortgage_id):
     return render_template('amortization_schedule.html', mortgage=mortgage)
 
 
+def load_owned_mortgage(mortgage_id):
+    # the mortgage with its overrides and rate history, only if it belongs to the logged in user
+    conn = connect_to_database()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT m.*
+            FROM mortgages m
+            JOIN users u ON u.user_id = m.user_id
+            WHERE m.mortgage_id = %s AND u.username = %s
+        """, (mortgage_id, session['username']))
+        mortgage_data = cursor.fetchone()
+        if mortgage_data is None:
+            return None
+        return mortgage_from_row(cursor, mortgage_data)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@app.route("/api/solve_override/<int:mortgage_id>")
+def solve_override(mortgage_id):
+    if 'username' not in session:
+        return jsonify({'message': 'Unauthorized'}), 401
+
+    target = request.args.get("target", "")
+    try:
+        if target == "payoff_date":
+            value = datetime.strptime(request.args.get("value", ""), "%Y-%m-%d")
+        else:
+            value = request.args.get("value", type=float)
+        annual_income = request.args.get("annual_income", type=float)
+    except ValueError:
+        return jsonify({'message': 'Target payoff date must be formatted as YYYY-MM-DD.'}), 400
+
+    mortgage = load_owned_mortgage(mortgage_id)
+    if mortgage is None:
+        return jsonify({'message': 'Mortgage not found.'}), 404
+
+    try:
+        solutions = mortgage.solve_payment_override(target, value, annual_income)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify({'mortgage_id': mortgage_id, 'target': target, 'solutions': solutions})
+
+
+@app.route("/api/sensitivities/<int:mortgage_id>")
+def mortgage_sensitivities(mortgage_id):
+    if 'username' not in session:
+        return jsonify({'message': 'Unauthorized'}), 401
+
+    mortgage = load_owned_mortgage(mortgage_id)
+    if mortgage is None:
+        return jsonify({'message': 'Mortgage not found.'}), 404
+
+    return jsonify({'mortgage_id': mortgage_id, 'sensitivities': mortgage.calculate_sensitivities()})
+
+
+@app.route("/api/instrumentation")
+def instrumentation_stats():
+    if 'username' not in session:
+        return jsonify({'message': 'Unauthorized'}), 401
+
+    return jsonify({'enabled': instrumentation.enabled, 'methods': instrumentation.stats(),
+                    'schedule_cache': schedule_cache.stats()})
+
+
+def backfill_schedules(conn, cursor, username: str) -> List[int]:
+    # stores the schedules of the user's mortgages that have none, each in its own transaction; returns the
+    # ids that still have none so a report can say what it left out
+    missing = []
+    for mortgage_data in schedule_store.unscheduled_mortgages(cursor, username):
+        try:
+            with database.atomic(conn):
+                schedule_store.store_schedules(cursor, mortgage_data[0], mortgage_from_row(cursor, mortgage_data))
+        except Exception as e:
+            logger.error("Error storing schedules for mortgage %s: %s", mortgage_data[0], e)
+            missing.append(mortgage_data[0])
+    return missing
+
+
+@app.route("/api/interest_due")
+def interest_due():
+    if 'username' not in session:
+        return jsonify({'message': 'Unauthorized'}), 401
+
+    try:
+        start = datetime.strptime(request.args.get("start", ""), "%Y-%m-%d").date()
+        end = datetime.strptime(request.args.get("end", ""), "%Y-%m-%d").date()
+    except ValueError:
+        return jsonify({'message': 'Start and end dates must be formatted as YYYY-MM-DD.'}), 400
+
+    conn = connect_to_database()
+    cursor = conn.cursor()
+    try:
+        missing = backfill_schedules(conn, cursor, session['username'])
+        mortgages = schedule_store.interest_due(cursor, session['username'], start, end,
+                                                request.args.get("frequency", "monthly"))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    finally:
+        cursor.close()
+        conn.close()
+    # the total leaves out any mortgage listed under missing_schedules
+    return jsonify({'start': start.isoformat(), 'end': end.isoformat(), 'mortgages': mortgages,
+                    'total_interest': sum(mortgage['interest'] for mortgage in mortgages),
+                    'missing_schedules': missing})
+
+
+@app.route("/api/rate_simulation/<int:mortgage_id>")
+def rate_simulation(mortgage_id):
+    if 'username' not in session:
+        return jsonify({'message': 'Unauthorized'}), 401
+
+    frequency = request.args.get("frequency", "monthly")
+    paths = request.args.get("paths", 10000, type=int)
+    seed = request.args.get("seed", type=int)
+    model = {key: request.args.get(key, type=float) for key in ("mean_rate", "reversion_speed", "volatility")}
+    # rates come in as percentages like the rest of the forms
+    model = {key: value if key == "reversion_speed" else value / 100
+             for key, value in model.items() if value is not None}
+
+    mortgage = load_owned_mortgage(mortgage_id)
+    if mortgage is None:
+        return jsonify({'message': 'Mortgage not found.'}), 404
+
+    try:
+        bands = mortgage.simulate_rate_paths(frequency, paths=paths, seed=seed, **model)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify({'mortgage_id': mortgage_id, **bands})
+
+
 @app.route('/export_amortization/<int:mortgage_id>')
 def export_amortization(mortgage_id):
     try:
-        logging.info("Retrieving mortgage details")
+        logger.info("Retrieving mortgage details")
         mortgage = get_mortgage_details(mortgage_id)
         if mortgage is None:
-            logging.warning(f"Mortgage with ID {mortgage_id} not found")
+            logger.warning(f"Mortgage with ID {mortgage_id} not found")
             return "Mortgage not found", 404
 
-        logging.info("Converting amortization schedule to data frames")
-        amortization_schedule = mortgage['amortization_schedule']
-
-        df_monthly = pd.DataFrame(amortization_schedule['monthly'])
-        df_fortnightly = pd.DataFrame(amortization_schedule['fortnightly'])
-
-        logging.info("creating excel writer")
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df_monthly.to_excel(writer, index=False, sheet_name='Monthly')
-            df_fortnightly.to_excel(writer, index=False, sheet_name='Fortnightly')
-
-        logging.info("export successful")
-        output.seek(0)
-
+        logger.info("Writing amortization schedule to excel")
+        output = export_schedules(mortgage['amortization_schedule'])
+        logger.info("export successful")
 
         return send_file(output, as_attachment=True, download_name='amortization_schedule.xlsx',
                          mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
     except Exception as e:
-        logging.error(f"Error exporting amortization schedule: {str(e)}")
+        logger.error(f"Error exporting amortization schedule: {str(e)}")
         return "Internal Server Error", 500
 
 
@@ -661,21 +795,14 @@ def view_projections(mortgage_id):
         cursor = conn.cursor()
 
         cursor.execute("""
-            SELECT mortgage_name, principal, interest, term, extra_costs, deposit, 
-                   payment_override_enabled, monthly_payment_override, fortnightly_payment_override
-            FROM mortgages 
+            SELECT * FROM mortgages
             WHERE mortgage_id = %s AND user_id = (SELECT user_id FROM users WHERE username = %s)
         """, (mortgage_id, username))
         mortgage = cursor.fetchone()
 
         if mortgage:
-            mortgage_name, principal, interest, term, extra_costs, deposit, payment_override_enabled, monthly_payment_override, fortnightly_payment_override = mortgage
-            mortgage_obj = Mortgage(mortgage_name, float(interest), term, float(principal), float(deposit),
-                                    float(extra_costs))
-            mortgage_obj.gather_inputs(float(principal), float(interest), term, float(extra_costs), float(deposit),
-                                       payment_override_enabled,
-                                       float(monthly_payment_override) if monthly_payment_override else None,
-                                       float(fortnightly_payment_override) if fortnightly_payment_override else None)
+            mortgage_name = mortgage[2]
+            mortgage_obj = mortgage_from_row(cursor, mortgage)
             scenarios = mortgage_obj.generate_planning_scenarios(
                 principal_increment=3000.00,
                 principal_increments=7,
@@ -705,7 +832,7 @@ def view_projections(mortgage_id):
             }
 
     except Exception as e:
-        logging.error(f"Error fetching mortgage details: {str(e)}")
+        logger.error(f"Error fetching mortgage details: {str(e)}")
         error_message = f"An error occurred: {str(e)}"
     finally:
         if cursor:
@@ -719,10 +846,10 @@ def view_projections(mortgage_id):
 @app.route('/export_projections/<int:mortgage_id>')
 def export_projections(mortgage_id):
     try:
-        logging.info("Retrieving mortgage details")
+        logger.info("Retrieving mortgage details")
         mortgage = get_mortgage_details(mortgage_id)
         if mortgage is None:
-            logging.warning(f"Mortgage with ID {mortgage_id} not found")
+            logger.warning(f"Mortgage with ID {mortgage_id} not found")
             return "Mortgage not found", 404
 
         # check
@@ -730,10 +857,10 @@ def export_projections(mortgage_id):
                          'payment_override_enabled', 'monthly_payment_override', 'fortnightly_payment_override']
         for key in required_keys:
             if key not in mortgage:
-                logging.error(f"Key '{key}' not found in mortgage details")
+                logger.error(f"Key '{key}' not found in mortgage details")
                 return f"Missing key: {key}", 500
 
-        logging.info("Generating projections")
+        logger.info("Generating projections")
         mortgage_obj = Mortgage(
             mortgage['mortgage_name'], float(mortgage['interest']), mortgage['term'],
             float(mortgage['principal']), float(mortgage['deposit']), float(mortgage['extra_costs'])
@@ -767,13 +894,13 @@ def export_projections(mortgage_id):
         df_projected_monthly = pd.DataFrame(projected_payments_monthly, columns=columns)
         df_projected_fortnightly = pd.DataFrame(projected_payments_fortnightly, columns=columns)
 
-        logging.info("Creating Excel writer")
+        logger.info("Creating Excel writer")
         output = BytesIO()
         with pd.ExcelWriter(output, engine='openpyxl') as writer:
             df_projected_monthly.to_excel(writer, index=False, sheet_name='Monthly Projections')
             df_projected_fortnightly.to_excel(writer, index=False, sheet_name='Fortnightly Projections')
 
-        logging.info("Export successful")
+        logger.info("Export successful")
         output.seek(0)
 
         # send the file
@@ -781,7 +908,7 @@ def export_projections(mortgage_id):
                          mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
     except Exception as e:
-        logging.error(f"Error exporting projections: {str(e)}")
+        logger.error(f"Error exporting projections: {str(e)}")
         return "Internal Server Error", 500
 
 
@@ -827,11 +954,11 @@ if __name__ == "__main__":
         try:
 
             user_manager = UserManager()
-            print("userManager initialized successfully.")
+            logger.info("userManager initialized successfully.")
 
-            print("start app...")
+            logger.info("start app...")
             app.run(debug=True)
         except Exception as e:
-            print(f"Error: {e}")
+            logger.error(f"Error: {e}")
     else:
-        print("failed to initialize database.")
\ No newline at end of file
+        logger.error("failed to initialize database.")
\ No newline at end of file
@@ -0,0 +1,124 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from graphing import create_amortization_charts, export_schedules
+from mortgage import Mortgage, schedule_cache
+
+# a case that got this much slower than the baseline median is a regression
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEAT = 5
+
+
+def realistic_mortgage(override: bool = True, rate_changes: int = 40) -> Mortgage:
+    # 30 year term with a high override ratio and a rate change every few quarters
+    mortgage = Mortgage("Benchmark Mortgage", 5.5, 30, 950000, 50000, 15000, start_date=datetime(2024, 1, 1),
+                        payment_override_enabled=override, monthly_payment_override=7500,
+                        fortnightly_payment_override=3700)
+    rates = 4.0 + 3.0 * np.abs(np.sin(np.arange(rate_changes)))
+    for i, rate in enumerate(rates):
+        months = 2 + 3 * i
+        mortgage.add_interest_rate_change(round(float(rate), 2), datetime(2024 + months // 12, months % 12 + 1, 1))
+    return mortgage
+
+
+def _cold_mortgage() -> Mortgage:
+    schedule_cache.clear()
+    return realistic_mortgage()
+
+
+def _warm_mortgage() -> Mortgage:
+    mortgage = realistic_mortgage()
+    mortgage.amortization_table()
+    return realistic_mortgage()
+
+
+def _schedules() -> Dict:
+    return realistic_mortgage(override=False).amortization_table()
+
+
+# name -> (setup run untimed before every repeat, the timed call on what setup returned)
+CASES: Dict[str, Tuple[Callable, Callable]] = {
+    "amortization_table": (_cold_mortgage, lambda mortgage: mortgage.amortization_table()),
+    "amortization_table_cached": (_warm_mortgage, lambda mortgage: mortgage.amortization_table()),
+    "calculate_mortgage_maturity": (realistic_mortgage, lambda mortgage: mortgage.calculate_mortgage_maturity()),
+    "generate_planning_scenarios": (realistic_mortgage,
+                                    lambda mortgage: mortgage.generate_planning_scenarios(3000.0, 150, 0.25, 150)),
+    "create_amortization_charts": (_schedules, create_amortization_charts),
+    "export_schedules": (_schedules, export_schedules)
+}
+
+
+def run_case(setup: Callable, call: Callable, repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        call(argument)
+        timings.append(time.perf_counter() - start)
+    return {"median": statistics.median(timings), "min": min(timings), "repeat": repeat}
+
+
+def run(names: List[str], repeat: int) -> Dict:
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "benchmarks": {name: run_case(*CASES[name], repeat) for name in names}
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> Dict[str, Dict]:
+    # median over baseline median per case both runs have, regressions are the ratios past 1 + threshold
+    report = {}
+    for name, result in results["benchmarks"].items():
+        reference = baseline["benchmarks"].get(name)
+        if reference is None:
+            continue
+        ratio = result["median"] / reference["median"]
+        report[name] = {"baseline": reference["median"], "median": result["median"], "ratio": ratio,
+                        "regression": ratio > 1 + threshold}
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the mortgage calculations")
+    parser.add_argument("cases", nargs="*", help=f"cases to run, all by default: {', '.join(CASES)}")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--save", metavar="FILE", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="flag regressions against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before a case counts as a regression, 0.25 is 25%%")
+    args = parser.parse_args(argv)
+    unknown = set(args.cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    results = run(args.cases or list(CASES), args.repeat)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if not args.compare:
+        for name, result in results["benchmarks"].items():
+            print(f"{name:32} {result['median'] * 1000:10.2f} ms")
+        return 0
+
+    with open(args.compare) as file:
+        report = compare(results, json.load(file), args.threshold)
+    for name, row in report.items():
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{name:32} {row['baseline'] * 1000:10.2f} ms {row['median'] * 1000:10.2f} ms "
+              f"{row['ratio']:6.2f}x {flag}")
+    return 1 if any(row["regression"] for row in report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
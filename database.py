@@ -1,20 +1,207 @@
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
 from decimal import Decimal
+from io import StringIO
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2.extras import execute_values
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, TRANSACTION_STATUS_IDLE
 import logging
 import time
 
+from migrations import run_migrations
+
+logger = logging.getLogger(__name__)
+
+# the one place connection settings live, overridable per deployment
+DATABASE_URI = {
+    'dbname': os.environ.get('DB_NAME', 'mortgage_calculator'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', 'admin123'),
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'port': os.environ.get('DB_PORT', '5432')
+}
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
+class PooledConnection:
+    # a checked out connection; close() and leaving a with block hand it back to the pool instead of
+    # closing it, everything else goes to the psycopg2 connection
+    __slots__ = ("_pool", "_conn")
+
+    def __init__(self, pool: "ConnectionPool", conn):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", conn)
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._pool.putconn(self._conn)
+            object.__setattr__(self, "_conn", None)
+
+    def __enter__(self) -> "PooledConnection":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        try:
+            if self._conn is not None and not self._conn.closed and not self._conn.autocommit:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+
+    def __del__(self):
+        # a checkout that was never closed still finds its way back
+        if getattr(self, "_conn", None) is not None:
+            self.close()
+
+
+class ConnectionPool:
+    def __init__(self, minconn: int = 1, maxconn: int = 10, timeout: float = 5.0,
+                 health_check_interval: float = 30.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Pool sizes must satisfy 0 <= minconn <= maxconn and maxconn >= 1")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        # connections idle for longer than this are pinged before they are handed out
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = connect_kwargs
+        self._idle: deque = deque()
+        self._size = 0
+        self._filled = False
+        self._condition = threading.Condition()
+
+    def _open(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        conn.autocommit = True
+        return conn
+
+    def _healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def fill(self) -> None:
+        # opens connections up to minconn, run on the first checkout so importing never needs a database
+        while True:
+            with self._condition:
+                if self._size >= self.minconn:
+                    self._filled = True
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except psycopg2.Error:
+                with self._condition:
+                    self._size -= 1
+                raise
+            with self._condition:
+                self._idle.append((conn, time.monotonic()))
+                self._condition.notify()
+
+    def getconn(self):
+        if not self._filled:
+            self.fill()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No database connection free within {self.timeout}s")
+                    self._condition.wait(remaining)
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    conn, last_used = None, None
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    return self._open()
+                except psycopg2.Error:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+            if self._healthy(conn, last_used):
+                return conn
+            logger.warning("Discarding a broken pooled database connection")
+            self._discard(conn)
+
+    def putconn(self, conn) -> None:
+        if not conn.closed:
+            try:
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                conn.autocommit = True
+            except psycopg2.Error:
+                conn.close()
+        if conn.closed:
+            self._discard(conn)
+            return
+        with self._condition:
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    def connection(self) -> PooledConnection:
+        return PooledConnection(self, self.getconn())
+
+    def closeall(self) -> None:
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._filled = False
+        for conn, _ in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {"size": self._size, "idle": len(self._idle), "in_use": self._size - len(self._idle),
+                    "max": self.maxconn}
+
+
+pool = ConnectionPool(minconn=int(os.environ.get('DB_POOL_MIN', '1')),
+                      maxconn=int(os.environ.get('DB_POOL_MAX', '10')),
+                      timeout=float(os.environ.get('DB_POOL_TIMEOUT', '5')), **DATABASE_URI)
+
 
 def create_database():
     try:
-        default_conn = psycopg2.connect(
-            dbname="postgres",
-            user="postgres",
-            password="admin123",
-            host="localhost",
-            port="5432"
-        )
+        default_conn = psycopg2.connect(**{**DATABASE_URI, 'dbname': 'postgres'})
         default_conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
         default_cursor = default_conn.cursor()
 
@@ -22,26 +209,19 @@ def create_database():
         database_exists = default_cursor.fetchone()
 
         if not database_exists:
-            print("Creating 'mortgage_calculator' database...")
+            logger.info("Creating 'mortgage_calculator' database...")
             default_cursor.execute("CREATE DATABASE mortgage_calculator")
         else:
-            print("'mortgage_calculator' database already exists.")
+            logger.info("'mortgage_calculator' database already exists.")
 
         default_cursor.close()
         default_conn.close()
     except Exception as e:
-        print(f"Error creating database: {e}")
+        logger.error(f"Error creating database: {e}")
         return
 
     try:
-        conn = psycopg2.connect(
-            dbname="mortgage_calculator",
-            user="postgres",
-            password="admin123",
-            host="localhost",
-            port="5432"
-        )
-        conn.autocommit = True
+        conn = connect_to_database()
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -135,58 +315,53 @@ def create_database():
         conn.commit()
         cursor.close()
         conn.close()
-        print("Database and tables created successfully.")
+        logger.info("Database and tables created successfully.")
     except Exception as e:
-        print(f"Error setting up database tables: {e}")
+        logger.error(f"Error setting up database tables: {e}")
 
 
 def initialize_database():
     if not check_database_connection():
-        print("Database not initialized. Creating database...")
+        logger.info("Database not initialized. Creating database...")
         create_database()
         time.sleep(5)
         if not check_database_connection():
-            print("Database creation failed.")
+            logger.error("Database creation failed.")
             return False
         else:
-            print("Database created successfully.")
-            return True
+            logger.info("Database created successfully.")
     else:
-        print("Database already initialized.")
-        return True
+        logger.info("Database already initialized.")
+    return migrate_database()
 
 
-def check_database_connection():
+def migrate_database():
     try:
-        conn = psycopg2.connect(
-            dbname="mortgage_calculator",
-            user="postgres",
-            password="admin123",
-            host="localhost",
-            port="5432"
-        )
-        conn.close()
+        with connect_to_database() as conn:
+            applied = run_migrations(conn)
+        logger.info(f"Applied {len(applied)} pending migrations." if applied else "Database schema is up to date.")
         return True
-    except psycopg2.OperationalError:
+    except Exception as e:
+        logger.error(f"Error applying migrations: {e}")
         return False
 
 
-def connect_to_database():
+def check_database_connection():
     try:
-        conn = psycopg2.connect(
-            dbname="mortgage_calculator",
-            user="postgres",
-            password="admin123",
-            host="localhost",
-            port="5432"
-        )
-        conn.autocommit = True
+        with connect_to_database():
+            return True
+    except psycopg2.OperationalError:
+        return False
 
-        logging.debug("Database connection established.")
 
+def connect_to_database() -> PooledConnection:
+    # hands out a pooled connection; close it or use it as a context manager to give it back
+    try:
+        conn = pool.connection()
+        logger.debug("Database connection checked out of the pool.")
         return conn
     except Exception as e:
-        logging.error(f"Failed to connect to the database: {str(e)}")
+        logger.error(f"Failed to connect to the database: {str(e)}")
         raise
 
 
@@ -201,5 +376,140 @@ def fetch_mortgage_data(cursor, mortgage_id):
     return mortgage_data
 
 
+def fetch_interest_rate_changes(cursor, mortgage_id: int) -> List[Dict]:
+    cursor.execute("""
+        SELECT new_interest_rate, effective_date FROM interest_rate_changes
+        WHERE mortgage_id = %s
+        ORDER BY effective_date, id
+    """, (mortgage_id,))
+    return [{"new_interest_rate": float(rate), "effective_date": effective_date}
+            for rate, effective_date in cursor.fetchall()]
+
+
+# rows per page of a mortgage's transaction history, and the most a client may ask for
+TRANSACTION_PAGE_SIZE = 50
+MAX_TRANSACTION_PAGE_SIZE = 200
+TRANSACTION_COLUMNS = ("transaction_id", "transaction_date", "transaction_type", "amount", "current_principal",
+                       "new_interest_rate", "new_monthly_payment", "new_fortnightly_payment", "remaining_term_months",
+                       "extra_payment", "description")
+
+
+def encode_page_cursor(transaction: Dict) -> str:
+    return f"{transaction['transaction_date'].isoformat()}_{transaction['transaction_id']}"
+
+
+def decode_page_cursor(token: str):
+    try:
+        transaction_date, _, transaction_id = token.rpartition("_")
+        return datetime.fromisoformat(transaction_date), int(transaction_id)
+    except ValueError:
+        raise ValueError("Invalid page cursor") from None
+
+
+def fetch_transaction_page(cursor, mortgage_id: int, page_size: int = TRANSACTION_PAGE_SIZE,
+                           after: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    # newest first, keyed on (transaction_date, transaction_id) so a page starts where the last one ended
+    # without counting the rows before it; one extra row tells whether another page follows
+    page_size = min(max(page_size, 1), MAX_TRANSACTION_PAGE_SIZE)
+    keyset, params = "", [mortgage_id]
+    if after:
+        keyset = "AND (transaction_date, transaction_id) < (%s, %s)"
+        params += decode_page_cursor(after)
+    cursor.execute(f"""
+        SELECT {", ".join(TRANSACTION_COLUMNS)}
+        FROM transactions
+        WHERE mortgage_id = %s {keyset}
+        ORDER BY transaction_date DESC, transaction_id DESC
+        LIMIT %s
+    """, (*params, page_size + 1))
+
+    transactions = [dict(zip(TRANSACTION_COLUMNS, row)) for row in cursor.fetchall()]
+    if len(transactions) <= page_size:
+        return transactions, None
+    transactions = transactions[:page_size]
+    return transactions, encode_page_cursor(transactions[-1])
+
+
+# log batches past this size are streamed with COPY instead of multi-row INSERTs
+COPY_THRESHOLD = 1000
+TRANSACTION_LOG_COLUMNS = ("mortgage_id", "transaction_date", "transaction_type", "amount", "current_principal",
+                           "new_monthly_payment", "new_fortnightly_payment", "extra_payment", "description")
+
+
+@contextmanager
+def atomic(conn):
+    # one explicit transaction on a pooled autocommit connection, committed on success and rolled back on error
+    conn.autocommit = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+
+def _copy_csv_field(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def insert_transaction_logs(cursor, mortgage_id: int, transaction_logs: Iterable[Dict],
+                            copy_threshold: int = COPY_THRESHOLD) -> int:
+    rows = [(mortgage_id, *(log[column] for column in TRANSACTION_LOG_COLUMNS[1:])) for log in transaction_logs]
+    if not rows:
+        return 0
+    columns = ", ".join(TRANSACTION_LOG_COLUMNS)
+    if len(rows) < copy_threshold:
+        execute_values(cursor, f"INSERT INTO transactions ({columns}) VALUES %s", rows, page_size=len(rows))
+        return len(rows)
+
+    # strings are always quoted and NULL is an unquoted \N, so COPY keeps None, an empty description and a
+    # description that reads \N apart; numbers and timestamps go in as their str()
+    buffer = StringIO()
+    buffer.writelines(",".join(map(_copy_csv_field, row)) + "\n" for row in rows)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY transactions ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+    return len(rows)
+
+
+PORTFOLIO_COLUMNS = ("mortgage_id", "mortgage_name", "principal", "interest", "term", "extra_costs", "deposit",
+                     "payment_override_enabled", "monthly_payment_override", "fortnightly_payment_override",
+                     "start_date", "comments", "created_at")
+
+
+def fetch_portfolio(cursor, username: str) -> List[Dict]:
+    # every mortgage of a user with its whole rate change history in one round trip, the lateral subquery
+    # aggregates each mortgage's changes in date order so the latest one is the last element
+    cursor.execute(f"""
+        SELECT {", ".join("m." + column for column in PORTFOLIO_COLUMNS)}, r.rates, r.effective_dates
+        FROM mortgages m
+        JOIN users u ON u.user_id = m.user_id
+        LEFT JOIN LATERAL (
+            SELECT array_agg(c.new_interest_rate ORDER BY c.effective_date, c.id) AS rates,
+                   array_agg(c.effective_date ORDER BY c.effective_date, c.id) AS effective_dates
+            FROM interest_rate_changes c
+            WHERE c.mortgage_id = m.mortgage_id
+        ) r ON TRUE
+        WHERE u.username = %s
+        ORDER BY m.mortgage_id
+    """, (username,))
+
+    portfolio = []
+    for row in cursor.fetchall():
+        mortgage = dict(zip(PORTFOLIO_COLUMNS, row))
+        rates, effective_dates = row[len(PORTFOLIO_COLUMNS):]
+        mortgage["interest_rate_changes"] = [
+            {"new_interest_rate": float(rate), "effective_date": effective_date}
+            for rate, effective_date in zip(rates or [], effective_dates or [])
+        ]
+        portfolio.append(mortgage)
+    return portfolio
+
+
 if __name__ == "__main__":
     initialize_database()
@@ -1,11 +1,34 @@
+from io import BytesIO
+
 import plotly.express as px
 import plotly.io as pio
 import pandas as pd
 
+from instrumentation import instrumentation
+
+
+def schedule_frame(schedule):
+    # columnar schedules skip the per-row dict conversion
+    if hasattr(schedule, "columns"):
+        return pd.DataFrame(schedule.columns)
+    return pd.DataFrame(schedule)
+
+
+@instrumentation.timed()
+def export_schedules(amortization_schedule) -> BytesIO:
+    # monthly and fortnightly schedules as sheets of one workbook
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        schedule_frame(amortization_schedule['monthly']).to_excel(writer, index=False, sheet_name='Monthly')
+        schedule_frame(amortization_schedule['fortnightly']).to_excel(writer, index=False, sheet_name='Fortnightly')
+    output.seek(0)
+    return output
+
 
+@instrumentation.timed()
 def create_amortization_charts(amortization_schedule):
-    df_monthly = pd.DataFrame(amortization_schedule["monthly"])
-    df_fortnightly = pd.DataFrame(amortization_schedule["fortnightly"])
+    df_monthly = schedule_frame(amortization_schedule["monthly"])
+    df_fortnightly = schedule_frame(amortization_schedule["fortnightly"])
 
     #   monthly schedule
     fig_monthly = px.line(df_monthly, x='Period', y=['Interest', 'Principal'],
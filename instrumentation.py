@@ -0,0 +1,86 @@
+import functools
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+# latencies kept per method for the percentiles, the counters cover every call
+LATENCY_WINDOW = 2048
+PERCENTILES = (50, 90, 99)
+
+
+class Instrumentation:
+    def __init__(self, enabled: bool = False, window: int = LATENCY_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self._methods: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def record(self, name: str, seconds: float, size: Optional[int] = None, failed: bool = False) -> None:
+        with self._lock:
+            method = self._methods.get(name)
+            if method is None:
+                method = self._methods[name] = {"calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                                                "output_size": 0, "latencies": deque(maxlen=self.window)}
+            method["calls"] += 1
+            method["errors"] += failed
+            method["total_seconds"] += seconds
+            method["max_seconds"] = max(method["max_seconds"], seconds)
+            method["output_size"] += size or 0
+            method["latencies"].append(seconds)
+
+    def timed(self, size: Optional[Callable] = None):
+        # times the wrapped function while enabled, size turns its result into an output size;
+        # switched off the only cost is one attribute check per call
+        def decorator(function):
+            name = function.__qualname__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    result = function(*args, **kwargs)
+                except Exception:
+                    self.record(name, time.perf_counter() - start, failed=True)
+                    raise
+                self.record(name, time.perf_counter() - start, None if size is None else size(result))
+                return result
+            return wrapper
+        return decorator
+
+    def reset(self) -> None:
+        with self._lock:
+            self._methods.clear()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            methods = {name: (dict(method), np.array(method["latencies"])) for name, method in self._methods.items()}
+
+        stats = {}
+        for name, (method, latencies) in methods.items():
+            percentiles = np.percentile(latencies, PERCENTILES) * 1000
+            stats[name] = {
+                "calls": method["calls"],
+                "errors": method["errors"],
+                "total_ms": method["total_seconds"] * 1000,
+                "mean_ms": method["total_seconds"] * 1000 / method["calls"],
+                "max_ms": method["max_seconds"] * 1000,
+                **{f"p{percentile}_ms": value for percentile, value in zip(PERCENTILES, percentiles.tolist())},
+                "output_size": method["output_size"],
+                "mean_output_size": method["output_size"] / method["calls"]
+            }
+        return stats
+
+
+instrumentation = Instrumentation(enabled=os.environ.get("MORTGAGE_INSTRUMENTATION") == "1")
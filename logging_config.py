@@ -0,0 +1,81 @@
+import atexit
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+class DebugSampler(logging.Filter):
+    # lets every n-th debug record of each call site through, other levels always pass;
+    # the counters are not locked, under contention a few extra or fewer lines get through
+    def __init__(self, every: int = 1):
+        super().__init__()
+        self.every = max(every, 1)
+        self._seen: Dict[tuple, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        seen = self._seen.get(site, 0)
+        self._seen[site] = seen + 1
+        return seen % self.every == 0
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    # "mortgage=DEBUG,werkzeug=WARNING" into logger names and level names
+    levels = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = entry.partition("=")
+        if not level:
+            raise ValueError(f"Invalid log level entry '{entry}', expected module=LEVEL")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level: Optional[str] = None, module_levels: Optional[Dict[str, str]] = None,
+                      debug_sample_every: Optional[int] = None,
+                      handlers: Optional[List[logging.Handler]] = None) -> QueueListener:
+    # callers only put records on a queue, a listener thread formats and writes them; levels and sampling
+    # come from LOG_LEVEL, LOG_LEVELS and LOG_DEBUG_SAMPLE unless passed in. Configures once per process
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    level = level or os.environ.get("LOG_LEVEL", "INFO")
+    module_levels = module_levels if module_levels is not None else parse_levels(os.environ.get("LOG_LEVELS", ""))
+    if debug_sample_every is None:
+        debug_sample_every = int(os.environ.get("LOG_DEBUG_SAMPLE", "1"))
+    if handlers is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers = [handler]
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = QueueHandler(log_queue)
+    _queue_handler.addFilter(DebugSampler(debug_sample_every))
+    root = logging.getLogger()
+    root.handlers[:] = [_queue_handler]
+    root.setLevel(level.upper())
+    for name, module_level in module_levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging() -> None:
+    # flushes what is still queued and detaches the queue from the root logger
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = _queue_handler = None
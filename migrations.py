@@ -0,0 +1,165 @@
+import logging
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# any constant works as long as every process migrating the same database uses it
+MIGRATION_LOCK_KEY = 720_391
+# seconds between attempts while another process holds the migration lock
+MIGRATION_LOCK_POLL_INTERVAL = 0.5
+
+SCHEMA_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def index_migration(version: int, table: str, columns: List[str]) -> Dict:
+    # built online so the table stays writable; CONCURRENTLY cannot run inside a transaction block
+    index = f"{table}_{'_'.join(columns)}_idx"
+    return {
+        "version": version,
+        "name": f"add {index}",
+        "transactional": False,
+        "index": index,
+        "statements": [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} ({', '.join(columns)})"]
+    }
+
+
+# applied in version order, a version is never reused or edited once shipped
+MIGRATIONS: List[Dict] = [
+    index_migration(1, "mortgages", ["user_id"]),
+    index_migration(2, "transactions", ["mortgage_id", "transaction_date", "transaction_id"]),
+    index_migration(3, "interest_rate_changes", ["mortgage_id", "effective_date"]),
+    index_migration(4, "comments", ["mortgage_id"]),
+    index_migration(5, "amortization_schedules", ["mortgage_id"]),
+    {
+        "version": 6,
+        "name": "store amortization schedules per frequency",
+        "transactional": True,
+        "statements": [
+            # nothing wrote the table before, any row in it predates the store
+            "DELETE FROM amortization_schedules",
+            """
+            ALTER TABLE amortization_schedules
+                ADD COLUMN frequency VARCHAR(16) NOT NULL,
+                ADD COLUMN period INTEGER NOT NULL,
+                ADD COLUMN extra_payment NUMERIC(15, 2) NOT NULL DEFAULT 0,
+                ADD COLUMN input_hash CHAR(32) NOT NULL
+            """,
+            """
+            CREATE OR REPLACE FUNCTION invalidate_amortization_schedules() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP <> 'INSERT' THEN
+                    DELETE FROM amortization_schedules WHERE mortgage_id = OLD.mortgage_id;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    DELETE FROM amortization_schedules WHERE mortgage_id = NEW.mortgage_id;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+            """
+            CREATE TRIGGER mortgages_invalidate_schedules
+                AFTER UPDATE OF principal, interest, term, extra_costs, deposit, payment_override_enabled,
+                    monthly_payment_override, fortnightly_payment_override, start_date ON mortgages
+                FOR EACH ROW EXECUTE FUNCTION invalidate_amortization_schedules()
+            """,
+            """
+            CREATE TRIGGER interest_rate_changes_invalidate_schedules
+                AFTER INSERT OR UPDATE OR DELETE ON interest_rate_changes
+                FOR EACH ROW EXECUTE FUNCTION invalidate_amortization_schedules()
+            """
+        ]
+    },
+    index_migration(7, "amortization_schedules", ["frequency", "payment_date"])
+]
+
+
+def applied_versions(cursor) -> set:
+    cursor.execute(SCHEMA_MIGRATIONS_TABLE)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _drop_invalid_index(cursor, index: str) -> None:
+    # a concurrent build that failed halfway leaves an invalid index behind which IF NOT EXISTS would keep
+    cursor.execute("""
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid
+    """, (index,))
+    if cursor.fetchone():
+        logger.warning("Dropping invalid index %s left by an interrupted migration", index)
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+
+
+def _apply(conn, migration: Dict) -> None:
+    record = ("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+              (migration["version"], migration["name"]))
+    if not migration["transactional"]:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            if migration.get("index"):
+                _drop_invalid_index(cursor, migration["index"])
+            for statement in migration["statements"]:
+                cursor.execute(statement)
+            cursor.execute(*record)
+        return
+
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cursor:
+            for statement in migration["statements"]:
+                cursor.execute(statement)
+            cursor.execute(*record)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+
+def _acquire_lock(conn, poll_interval: float) -> None:
+    # a waiting pg_advisory_lock keeps its statement's snapshot open, and CREATE INDEX CONCURRENTLY in the
+    # process holding the lock waits for every older snapshot to finish, so both would wait forever; each try
+    # here is its own autocommit statement and the sleep between tries holds no snapshot
+    waited = False
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+            if cursor.fetchone()[0]:
+                return
+        if not waited:
+            logger.info("Waiting for another process to finish migrating")
+            waited = True
+        time.sleep(poll_interval)
+
+
+def run_migrations(conn, migrations: Optional[List[Dict]] = None,
+                   poll_interval: float = MIGRATION_LOCK_POLL_INTERVAL) -> List[int]:
+    # applies the pending migrations in order and returns their versions; a session advisory lock keeps
+    # two processes from migrating at once and the second one finds everything already recorded
+    migrations = sorted(MIGRATIONS if migrations is None else migrations, key=lambda migration: migration["version"])
+    versions = [migration["version"] for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError("Migration versions must be unique")
+
+    conn.autocommit = True
+    _acquire_lock(conn, poll_interval)
+    try:
+        with conn.cursor() as cursor:
+            applied = applied_versions(cursor)
+        pending = [migration for migration in migrations if migration["version"] not in applied]
+        for migration in pending:
+            logger.info("Applying migration %s: %s", migration["version"], migration["name"])
+            _apply(conn, migration)
+        return [migration["version"] for migration in pending]
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
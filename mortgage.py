@@ -1,14 +1,150 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from decimal import Decimal
-from typing import List, Optional, Dict
+from itertools import islice
+from typing import List, Optional, Dict, Tuple
+
+import numpy as np
+
+from amortization import (BalanceCurve, RateTimeline, Schedule, amortize, amortize_cents, iter_schedule,
+                          lump_sums, maturity_summary, payment_factor, payment_for_interest, payoff_summary,
+                          period_offsets, recompute_from, repayment_breakdown, sensitivities, to_cents, to_rate_units,
+                          truncate)
+from instrumentation import instrumentation
+from serialization import pack, unpack
+from simulation import simulate_payoff_bands
+
+PAYMENT_FREQUENCIES = {"monthly": 12, "fortnightly": 26, "weekly": 52, "quarterly": 4}
+# periods per year along the frequency axis the kernels broadcast over, in PAYMENT_FREQUENCIES order
+FREQUENCY_AXIS = np.array(list(PAYMENT_FREQUENCIES.values()))
+# frequencies a payment override can be stored for
+OVERRIDE_FREQUENCIES = ("monthly", "fortnightly")
+# the schedules the views show, built unless a caller asks for other frequencies
+SCHEDULE_FREQUENCIES = ("monthly", "fortnightly")
+# what solve_payment_override can aim the override at
+GOAL_TARGETS = ("payoff_date", "total_interest", "payment_to_income")
+REPAY_PERIOD_KEYS = {"monthly": "months_to_repay", "fortnightly": "fortnights_to_repay", "weekly": "weeks_to_repay",
+                     "quarterly": "quarters_to_repay"}
+# planning grids come straight from form input, so their size is capped server side
+MAX_SCENARIO_INCREMENTS = 200
+SCENARIO_CHUNK_SIZE = 50
+SCHEDULE_CHUNK_SIZE = 60
+# derived results a Mortgage recomputes lazily once one of their inputs changed
+DERIVED_RESULTS = frozenset({"breakdown", "maturity", "schedule"})
+# the inputs to_bytes keeps, everything else is derived from them
+SERIALIZED_STATE = ("_mortgage_id", "_mortgage_name", "_initial_interest", "_initial_term", "_initial_principal",
+                    "_deposit", "_extra_costs", "_start_date", "_created_at", "_comments", "_payment_override_enabled",
+                    "_monthly_payment_override", "_fortnightly_payment_override", "_interest_rate_changes",
+                    "_fixed_point", "lump_sum_payments", "historical_transactions", "transaction_logs",
+                    "total_amount_borrowed")
+# the inputs update_mortgage writes, restored when it rejects the update
+UPDATE_STATE = ("_initial_principal", "_extra_costs", "_comments", "_payment_override_enabled",
+                "_monthly_payment_override", "total_amount_borrowed")
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduleCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(schedules: Dict[str, np.ndarray]) -> int:
+        return sum(rows.nbytes for rows in schedules.values())
+
+    def get(self, key: str, frequencies=()) -> Optional[Dict[str, np.ndarray]]:
+        # a hit only when the entry holds every requested frequency; a partial entry is still returned for the
+        # caller to extend but counts as a miss
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if all(frequency in entry[0] for frequency in frequencies):
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry[0]
+
+    def peek(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        # lookup that leaves the counters and the eviction order alone
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    def put(self, key: str, schedules: Dict[str, np.ndarray]) -> None:
+        size = self._size(schedules)
+        if size > self.max_bytes:
+            return
+        # cached arrays are shared between callers, so nobody may write to them
+        for rows in schedules.values():
+            rows.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (schedules, size)
+            self.current_bytes += size
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                self.current_bytes -= self._entries.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self.current_bytes}
+
+
+schedule_cache = ScheduleCache()
+
+
+def _periods_produced(schedules: Dict) -> int:
+    # rows across frequencies, from Schedules or from batched columns with their lengths
+    return sum(int(np.sum(schedule["lengths"])) if isinstance(schedule, dict) else len(schedule)
+               for schedule in schedules.values())
+
+
+def _scenario_cells(scenarios: List[Dict]) -> int:
+    return sum(len(values) for scenario in scenarios for key, values in scenario.items() if key.endswith("_payments"))
+
+
+def check_frequency(frequency: str) -> int:
+    if frequency not in PAYMENT_FREQUENCIES:
+        raise ValueError(f"Invalid frequency. Choose one of: {', '.join(PAYMENT_FREQUENCIES)}.")
+    return PAYMENT_FREQUENCIES[frequency]
 
 
 class Mortgage:
+    # batch jobs hold thousands of these, so instances carry no __dict__
+    __slots__ = ("_mortgage_id", "_mortgage_name", "_initial_interest", "_initial_term", "_initial_principal",
+                 "_deposit", "_extra_costs", "_start_date", "_created_at", "_comments", "_stale",
+                 "_payment_override_enabled", "_monthly_payment_override", "_fortnightly_payment_override",
+                 "_initial_payment_breakdown", "_mortgage_maturity", "_amortization_schedule", "_schedule_basis",
+                 "_interest_rate_changes", "_rate_timeline", "_fixed_point", "lump_sum_payments",
+                 "historical_transactions", "transaction_logs", "total_amount_borrowed")
+
     def __init__(self, mortgage_name: str, initial_interest: float, initial_term: int, initial_principal: float,
                  deposit: float, extra_costs: float, comments: Optional[str] = None,
                  payment_override_enabled: bool = False,
                  monthly_payment_override: Optional[float] = None, fortnightly_payment_override: Optional[float] = None,
-                 start_date: Optional[datetime] = None, created_at: Optional[datetime] = None):
+                 start_date: Optional[datetime] = None, created_at: Optional[datetime] = None,
+                 fixed_point: bool = False):
         self._mortgage_id: Optional[int] = None
         self._mortgage_name: str = mortgage_name
         self._initial_interest: float = initial_interest / 100
@@ -19,18 +155,121 @@ class Mortgage:
         self._start_date: datetime = start_date if start_date else datetime.now()
         self._created_at: Optional[datetime] = created_at
         self._comments: str = comments if comments else ""
-        self.payment_override_enabled: bool = payment_override_enabled
-        self.monthly_payment_override: Optional[float] = monthly_payment_override
-        self.fortnightly_payment_override: Optional[float] = fortnightly_payment_override
-        self.initial_payment_breakdown: Dict = {}
-        self.mortgage_maturity: Dict = {}
-        self.amortization_schedule: Dict[str, List[Dict[str, float]]] = {}
-        self.interest_rate_changes: List[Dict] = []
+        self._stale = set(DERIVED_RESULTS)
+        self._rate_timeline: Optional[Tuple[tuple, RateTimeline]] = None
+        # schedules in exact int64 cents instead of binary floats
+        self._fixed_point: bool = fixed_point
+        self._payment_override_enabled: bool = payment_override_enabled
+        self._monthly_payment_override: Optional[float] = monthly_payment_override
+        self._fortnightly_payment_override: Optional[float] = fortnightly_payment_override
+        self._initial_payment_breakdown: Dict = {}
+        self._mortgage_maturity: Dict = {}
+        self._amortization_schedule: Dict[str, Schedule] = {}
+        # inputs and rows of the last computed schedule per frequency, the base for incremental updates
+        self._schedule_basis: Dict[str, tuple] = {}
+        self._interest_rate_changes: List[Dict] = []
+        self.lump_sum_payments: List[Dict] = []
         self.historical_transactions: List[Dict] = []
         self.transaction_logs = []
         # calculate the total amount borrowed
         self.total_amount_borrowed: float = self._initial_principal - self._deposit + self._extra_costs
 
+    def _invalidate(self, *results: str) -> None:
+        results = results or DERIVED_RESULTS
+        if "schedule" in results:
+            self._rate_timeline = None
+        self._stale.update(results)
+
+    @property
+    def rate_timeline(self) -> RateTimeline:
+        # interest_rate_changes is a plain list callers append to directly, so the timeline is rebuilt
+        # whenever the changes it was built from no longer match, not only through the setters
+        key = (self._initial_interest, self._start_date,
+               tuple((change["new_interest_rate"], change["effective_date"]) for change in self._interest_rate_changes))
+        if self._rate_timeline is None or self._rate_timeline[0] != key:
+            self._rate_timeline = (key, RateTimeline(self._initial_interest, self._start_date,
+                                                     self._interest_rate_changes))
+        return self._rate_timeline[1]
+
+    @property
+    def initial_payment_breakdown(self) -> Dict:
+        if "breakdown" in self._stale:
+            self.calculate_initial_payment_breakdown()
+        return self._initial_payment_breakdown
+
+    @initial_payment_breakdown.setter
+    def initial_payment_breakdown(self, value: Dict) -> None:
+        self._initial_payment_breakdown = value
+        self._stale.discard("breakdown")
+
+    @property
+    def mortgage_maturity(self) -> Dict:
+        if "maturity" in self._stale:
+            self.calculate_mortgage_maturity()
+        return self._mortgage_maturity
+
+    @mortgage_maturity.setter
+    def mortgage_maturity(self, value: Dict) -> None:
+        self._mortgage_maturity = value
+        self._stale.discard("maturity")
+
+    @property
+    def amortization_schedule(self) -> Dict[str, Schedule]:
+        if "schedule" in self._stale:
+            self.amortization_table()
+        return self._amortization_schedule
+
+    @amortization_schedule.setter
+    def amortization_schedule(self, value: Dict[str, Schedule]) -> None:
+        self._amortization_schedule = value
+        self._stale.discard("schedule")
+
+    @property
+    def payment_override_enabled(self) -> bool:
+        return self._payment_override_enabled
+
+    @payment_override_enabled.setter
+    def payment_override_enabled(self, value: bool) -> None:
+        self._payment_override_enabled = value
+        self._invalidate()
+
+    @property
+    def monthly_payment_override(self) -> Optional[float]:
+        return self._monthly_payment_override
+
+    @monthly_payment_override.setter
+    def monthly_payment_override(self, value: Optional[float]) -> None:
+        self._monthly_payment_override = value
+        self._invalidate()
+
+    @property
+    def fortnightly_payment_override(self) -> Optional[float]:
+        return self._fortnightly_payment_override
+
+    @fortnightly_payment_override.setter
+    def fortnightly_payment_override(self, value: Optional[float]) -> None:
+        self._fortnightly_payment_override = value
+        self._invalidate()
+
+    @property
+    def fixed_point(self) -> bool:
+        return self._fixed_point
+
+    @fixed_point.setter
+    def fixed_point(self, value: bool) -> None:
+        self._fixed_point = value
+        self._invalidate("schedule")
+
+    @property
+    def interest_rate_changes(self) -> List[Dict]:
+        return self._interest_rate_changes
+
+    @interest_rate_changes.setter
+    def interest_rate_changes(self, value: List[Dict]) -> None:
+        # rate changes only move the schedule, the breakdown and maturity use the initial rate
+        self._interest_rate_changes = value
+        self._invalidate("schedule")
+
     @property
     def start_date(self) -> datetime:
         return self._start_date
@@ -40,6 +279,7 @@ class Mortgage:
         if value is None or not isinstance(value, datetime):
             raise ValueError("Start date must be a datetime.")
         self._start_date = value
+        self._invalidate("schedule")
 
     @property
     def mortgage_id(self) -> Optional[int]:
@@ -76,6 +316,7 @@ class Mortgage:
         if value < 0:
             raise ValueError("initial interest cannot be negative")
         self._initial_interest = float(value) / 100
+        self._invalidate()
 
     @property
     def initial_term(self) -> int:
@@ -90,6 +331,7 @@ class Mortgage:
         if value > 30:
             raise ValueError("maximum term is 30 years")
         self._initial_term = value
+        self._invalidate()
 
     @property
     def initial_principal(self) -> float:
@@ -102,6 +344,7 @@ class Mortgage:
         if value <= 0:
             raise ValueError("Initial principal must be greater than zero")
         self._initial_principal = value
+        self._invalidate()
 
     @property
     def deposit(self) -> float:
@@ -116,6 +359,7 @@ class Mortgage:
         if value > self._initial_principal:
             raise ValueError("Deposit cannot be greater than the initial principal")
         self._deposit = value
+        self._invalidate()
 
     @property
     def extra_costs(self) -> float:
@@ -128,6 +372,7 @@ class Mortgage:
         if value < 0:
             raise ValueError("Extra costs cannot be negative")
         self._extra_costs = value
+        self._invalidate()
 
     def gather_inputs(self, principal, interest, term, extra_costs, deposit, payment_override_enabled,
                       monthly_payment_override, fortnightly_payment_override):
@@ -140,15 +385,25 @@ class Mortgage:
         self.monthly_payment_override = monthly_payment_override
         self.fortnightly_payment_override = fortnightly_payment_override
         self.total_amount_borrowed = principal - deposit + extra_costs
+        self._invalidate()
 
-    def make_balloon_payment(self, lump_sum: float):
+    def make_balloon_payment(self, lump_sum: float, payment_date: Optional[datetime] = None):
         if lump_sum <= 0:
             raise ValueError("Lump sum payment must be greater than zero")
         if lump_sum > self.total_amount_borrowed:
             raise ValueError("Lump sum payment cannot be greater than the remaining principal")
 
-        self.total_amount_borrowed -= lump_sum
-        self._initial_principal -= lump_sum
+        if payment_date is None:
+            # an undated balloon re-amortizes the loan from the start
+            self.total_amount_borrowed -= lump_sum
+            self._initial_principal -= lump_sum
+            self._invalidate()
+        else:
+            # a dated balloon keeps the repayments and only moves the schedule from its period onward
+            if payment_date < self._start_date:
+                raise ValueError("Lump sum payment date cannot be before the mortgage start date")
+            self.lump_sum_payments.append({"amount": lump_sum, "payment_date": payment_date})
+            self._invalidate("schedule")
 
         transaction = {
             "transaction_date": datetime.now(),
@@ -159,277 +414,351 @@ class Mortgage:
         }
 
         self.historical_transactions.append(transaction)
-        self.calculate_initial_payment_breakdown()
-        self.calculate_mortgage_maturity()
-        self.amortization_table()
 
     def calculate_projected_payment(self, principal: float, interest_rate: float, term: int, frequency: str):
-        if frequency == "monthly":
-            rate = interest_rate / 12 / 100
-            payments = term * 12
-        elif frequency == "fortnightly":
-            rate = interest_rate / 26 / 100
-            payments = term * 26
-        else:
-            raise ValueError("Invalid frequency. Choose either 'monthly' or 'fortnightly'.")
-
-        payment = principal * (rate / (1 - (1 + rate) ** -payments))
-        return payment
-
+        periods_per_year = check_frequency(frequency)
+        return principal * payment_factor(interest_rate / 100, term, periods_per_year).item()
+
+    @staticmethod
+    def _check_scenario_size(principal_increments: int, interest_increments: int):
+        if not 0 <= principal_increments <= MAX_SCENARIO_INCREMENTS:
+            raise ValueError(f"Number of principal increments must be between 0 and {MAX_SCENARIO_INCREMENTS}")
+        if not 0 <= interest_increments <= MAX_SCENARIO_INCREMENTS:
+            raise ValueError(f"Number of interest rate increments must be between 0 and {MAX_SCENARIO_INCREMENTS}")
+
+    def _scenario_axes(self, principal_increment: float, principal_increments: int,
+                       interest_increment: float, interest_increments: int):
+        self._check_scenario_size(principal_increments, interest_increments)
+        total_amount_borrowed = float(self._initial_principal) - float(self._deposit) + float(self._extra_costs)
+        principals = total_amount_borrowed + principal_increment * np.arange(principal_increments + 1)
+        interest_rates = self._initial_interest * 100 + interest_increment * np.arange(interest_increments + 1)
+        # rates by frequency in one pass over the frequency axis
+        factors = payment_factor(interest_rates[:, np.newaxis] / 100, self._initial_term, FREQUENCY_AXIS)
+        return principals, interest_rates, factors
+
+    @staticmethod
+    def _scenario_payments(principals: np.ndarray, factors: np.ndarray) -> Dict[str, np.ndarray]:
+        # payments are linear in principal, so every cell is one product
+        payments = principals[:, np.newaxis, np.newaxis] * factors
+        return {f"{frequency}_payments": payments[..., i] for i, frequency in enumerate(PAYMENT_FREQUENCIES)}
+
+    def planning_scenario_grid(self, principal_increment: float, principal_increments: int,
+                               interest_increment: float, interest_increments: int) -> Dict[str, np.ndarray]:
+        principals, interest_rates, factors = self._scenario_axes(principal_increment, principal_increments,
+                                                                  interest_increment, interest_increments)
+        grid = {"principals": principals, "interest_rates": interest_rates}
+        grid.update(self._scenario_payments(principals, factors))
+        return grid
+
+    def iter_planning_scenarios(self, principal_increment: float, principal_increments: int,
+                                interest_increment: float, interest_increments: int,
+                                chunk_size: int = SCENARIO_CHUNK_SIZE):
+        if chunk_size <= 0:
+            raise ValueError("Chunk size must be greater than zero")
+        principals, interest_rates, factors = self._scenario_axes(principal_increment, principal_increments,
+                                                                  interest_increment, interest_increments)
+        for start in range(0, len(principals), chunk_size):
+            chunk = {"principals": principals[start:start + chunk_size], "interest_rates": interest_rates}
+            chunk.update(self._scenario_payments(chunk["principals"], factors))
+            yield chunk
+
+    @instrumentation.timed(size=_scenario_cells)
     def generate_planning_scenarios(self, principal_increment: float, principal_increments: int,
                                     interest_increment: float, interest_increments: int):
+        grid = self.planning_scenario_grid(principal_increment, principal_increments,
+                                           interest_increment, interest_increments)
+        keys = [f"{frequency}_payments" for frequency in PAYMENT_FREQUENCIES]
+        return [
+            {"principal": principal, **dict(zip(keys, payments))}
+            for principal, *payments in zip(grid["principals"].tolist(), *(grid[key].tolist() for key in keys))
+        ]
+
+    def _override_payments(self, missing: float) -> np.ndarray:
+        # override payment along the frequency axis, nan where no override applies
+        # and missing where the override is enabled without an amount
+        payments = []
+        for frequency in PAYMENT_FREQUENCIES:
+            if not self.payment_override_enabled or frequency not in OVERRIDE_FREQUENCIES:
+                payments.append(np.nan)
+                continue
+            amount = getattr(self, f"{frequency}_payment_override")
+            payments.append(missing if amount is None else float(amount))
+        return np.array(payments)
+
+    def _check_overrides_amortize(self) -> None:
+        # the maturity check on its own, so a write path can reject an override without recomputing maturity
+        overrides = self._override_payments(missing=np.nan)
+        overridden = ~np.isnan(overrides)
+        if not overridden.any():
+            return
+        borrowed = self.initial_payment_breakdown["total_amount_borrowed"]
+        amortizing = payoff_summary(borrowed, self._initial_interest / FREQUENCY_AXIS, overrides)["amortizing"]
+        for i in np.flatnonzero(overridden & ~amortizing):
+            raise ValueError(f"{list(PAYMENT_FREQUENCIES)[i].capitalize()} payment override must be greater than "
+                             f"the interest charged per period")
+
+    @instrumentation.timed()
+    def calculate_initial_payment_breakdown(self):
         total_amount_borrowed = float(self._initial_principal) - float(self._deposit) + float(self._extra_costs)
-        scenarios = []
+        breakdown = repayment_breakdown(total_amount_borrowed, float(self._initial_interest), float(self._initial_term),
+                                        FREQUENCY_AXIS, self._override_payments(missing=0.0))
 
-        for i in range(principal_increments + 1):
-            principal = total_amount_borrowed + (i * principal_increment)
-            monthly_payments = []
-            fortnightly_payments = []
-
-            for j in range(interest_increments + 1):
-                interest_rate = (self._initial_interest * 100) + (j * interest_increment)
-
-                monthly_payment = self.calculate_projected_payment(principal, interest_rate, self._initial_term,
-                                                                   "monthly")
-                fortnightly_payment = self.calculate_projected_payment(principal, interest_rate, self._initial_term,
-                                                                       "fortnightly")
-
-                monthly_payments.append(monthly_payment)
-                fortnightly_payments.append(fortnightly_payment)
-
-            scenarios.append({
-                "principal": principal,
-                "monthly_payments": monthly_payments,
-                "fortnightly_payments": fortnightly_payments
-            })
-
-        return scenarios
-
-    def calculate_initial_payment_breakdown(self):
-        principal = float(self._initial_principal)
-        interest = float(self._initial_interest)
-        term = float(self._initial_term)
-        extra_costs = float(self._extra_costs)
-        deposit = float(self._deposit)
-        payment_override_enabled = self.payment_override_enabled
-        monthly_payment_override = float(self.monthly_payment_override) if self.monthly_payment_override is not None else 0
-        fortnightly_payment_override = float(self.fortnightly_payment_override) if self.fortnightly_payment_override is not None else 0
-        total_amount_borrowed = principal - deposit + extra_costs
-
-        # annual interest rate to monthly interest rate
-        monthly_rate = interest / 12
-        estimated_repayment_monthly = total_amount_borrowed * (monthly_rate / (1 - (1 + monthly_rate) ** -(term * 12)))
-        initial_interest_monthly = total_amount_borrowed * monthly_rate
-        initial_principal_monthly = estimated_repayment_monthly - initial_interest_monthly
-        initial_extra_monthly = monthly_payment_override - estimated_repayment_monthly if payment_override_enabled else 0
-        total_repayment_monthly = initial_interest_monthly + initial_principal_monthly + initial_extra_monthly
-
-        # fortnightly
-        fortnightly_rate = interest / 26
-        estimated_repayment_fortnightly = total_amount_borrowed * (
-                fortnightly_rate / (1 - (1 + fortnightly_rate) ** -(term * 26)))
-        initial_interest_fortnightly = total_amount_borrowed * fortnightly_rate
-        initial_principal_fortnightly = estimated_repayment_fortnightly - initial_interest_fortnightly
-        initial_extra_fortnightly = fortnightly_payment_override - estimated_repayment_fortnightly \
-            if payment_override_enabled else 0
-        total_repayment_fortnightly = initial_interest_fortnightly + initial_principal_fortnightly + initial_extra_fortnightly
-
-        self.initial_payment_breakdown = {
-            "total_amount_borrowed": total_amount_borrowed,
-            "estimated_repayment_monthly": estimated_repayment_monthly,
-            "estimated_repayment_fortnightly": estimated_repayment_fortnightly,
-            "initial_interest_monthly": initial_interest_monthly,
-            "initial_principal_monthly": initial_principal_monthly,
-            "initial_extra_monthly": initial_extra_monthly,
-            "total_repayment_monthly": total_repayment_monthly,
-            "initial_interest_fortnightly": initial_interest_fortnightly,
-            "initial_principal_fortnightly": initial_principal_fortnightly,
-            "initial_extra_fortnightly": initial_extra_fortnightly,
-            "total_repayment_fortnightly": total_repayment_fortnightly
-        }
+        self.initial_payment_breakdown = {"total_amount_borrowed": total_amount_borrowed}
+        for i, frequency in enumerate(PAYMENT_FREQUENCIES):
+            self.initial_payment_breakdown.update({f"{key}_{frequency}": values[i].item()
+                                                   for key, values in breakdown.items()})
 
+    @instrumentation.timed()
     def calculate_mortgage_maturity(self):
         details = self.initial_payment_breakdown
-        term = self._initial_term
-        interest = self._initial_interest
-        principal = details["total_amount_borrowed"]
-        override = self.payment_override_enabled
-        monthly_override_amount = self.monthly_payment_override
-        fortnightly_override_amount = self.fortnightly_payment_override
-
-        full_term_payments_fortnightly = term * 26
-        interest_over_full_term_fortnightly = details['estimated_repayment_fortnightly'] * 26 * term - principal
-        principal_plus_interest_full_term_fortnightly = interest_over_full_term_fortnightly + principal
-
-        full_term_payments_monthly = term * 12
-        interest_over_full_term_monthly = details['estimated_repayment_monthly'] * 12 * term - principal
-        principal_plus_interest_full_term_monthly = interest_over_full_term_monthly + principal
-
-        # override
-        remaining_principal_monthly = principal
-        total_interest_paid_monthly = 0
-        total_repayment_monthly = 0
-        total_interest_saved_monthly = 0
-        months_to_repay = 0
-
-        if override and monthly_override_amount is not None:
-            while remaining_principal_monthly > 0:
-                months_to_repay += 1
-                interest_paid_this_month = remaining_principal_monthly * (interest / 12)
-                principal_paid_this_month = monthly_override_amount - interest_paid_this_month
-                remaining_principal_monthly -= principal_paid_this_month
-                total_interest_paid_monthly += interest_paid_this_month
-                total_repayment_monthly += monthly_override_amount
-
-            total_interest_saved_monthly = interest_over_full_term_monthly - total_interest_paid_monthly
-
-        remaining_principal_fortnightly = principal
-        total_interest_paid_fortnightly = 0
-        total_repayment_fortnightly = 0
-        total_interest_saved_fortnightly = 0
-        fortnights_to_repay = 0
-
-        if override and fortnightly_override_amount is not None:
-            while remaining_principal_fortnightly > 0:
-                fortnights_to_repay += 1
-                interest_paid_this_fortnight = remaining_principal_fortnightly * (interest / 26)
-                principal_paid_this_fortnight = fortnightly_override_amount - interest_paid_this_fortnight
-                remaining_principal_fortnightly -= principal_paid_this_fortnight
-                total_interest_paid_fortnightly += interest_paid_this_fortnight
-                total_repayment_fortnightly += fortnightly_override_amount
-
-            total_interest_saved_fortnightly = interest_over_full_term_fortnightly - total_interest_paid_fortnightly
-
-        self.mortgage_maturity = {
-            "monthly": {
-                "full_term_payments": full_term_payments_monthly,
-                "interest_over_full_term": interest_over_full_term_monthly,
-                "principal_plus_interest_full_term": principal_plus_interest_full_term_monthly,
-                "total_interest_paid": total_interest_paid_monthly,
-                "total_repayment": total_repayment_monthly,
-                "total_interest_saved": total_interest_saved_monthly,
-                "months_to_repay": months_to_repay
-            },
-            "fortnightly": {
-                "full_term_payments": full_term_payments_fortnightly,
-                "interest_over_full_term": interest_over_full_term_fortnightly,
-                "principal_plus_interest_full_term": principal_plus_interest_full_term_fortnightly,
-                "total_interest_paid": total_interest_paid_fortnightly,
-                "total_repayment": total_repayment_fortnightly,
-                "total_interest_saved": total_interest_saved_fortnightly,
-                "fortnights_to_repay": fortnights_to_repay
+        estimated_repayment = np.array([details[f"estimated_repayment_{frequency}"]
+                                        for frequency in PAYMENT_FREQUENCIES])
+        summary = maturity_summary(details["total_amount_borrowed"], self._initial_interest, self._initial_term,
+                                   FREQUENCY_AXIS, estimated_repayment, self._override_payments(missing=np.nan))
+
+        maturity = {}
+        for i, frequency in enumerate(PAYMENT_FREQUENCIES):
+            if not summary["amortizing"][i]:
+                raise ValueError(f"{frequency.capitalize()} payment override must be greater than the interest "
+                                 f"charged per period")
+            maturity[frequency] = {key: values[i].item() for key, values in summary.items()
+                                   if key not in ("periods_to_repay", "amortizing")}
+            maturity[frequency][REPAY_PERIOD_KEYS[frequency]] = summary["periods_to_repay"][i].item()
+        self.mortgage_maturity = maturity
+
+    def solve_payment_override(self, target: str, value, annual_income: Optional[float] = None) -> Dict[str, Dict]:
+        # the override per frequency that pays off by a date, accrues a total interest budget or takes a share
+        # of income, solved on the closed form instead of stepping through schedules
+        borrowed = self.initial_payment_breakdown["total_amount_borrowed"]
+        periods_per_year = np.array([PAYMENT_FREQUENCIES[frequency] for frequency in OVERRIDE_FREQUENCIES])
+        rate = self._initial_interest / periods_per_year
+
+        if target == "payoff_date":
+            if not isinstance(value, datetime):
+                raise ValueError("Target payoff date must be a datetime")
+            periods = np.array([period_offsets(value, self._start_date, frequency)
+                                for frequency in periods_per_year])
+            if np.any(periods < 1):
+                raise ValueError("Target payoff date must be at least one payment after the start date")
+            payment = borrowed * payment_factor(rate, periods, 1)
+        elif target == "total_interest":
+            if value is None or value < 0:
+                raise ValueError("Target total interest cannot be negative")
+            payment = payment_for_interest(borrowed, rate, value)
+            if np.isnan(payment).any():
+                raise ValueError("Target total interest must be at least the interest of the first period")
+        elif target == "payment_to_income":
+            if annual_income is None or annual_income <= 0:
+                raise ValueError("Annual income must be greater than zero")
+            if value is None or not 0 < value <= 1:
+                raise ValueError("Payment to income ratio must be between 0 and 1")
+            payment = value * annual_income / periods_per_year
+        else:
+            raise ValueError(f"Invalid target. Choose one of: {', '.join(GOAL_TARGETS)}.")
+
+        # whole cents, rounded up so a date or interest target is still met and down so income is not exceeded
+        cents = payment * 100
+        payment = (np.floor(cents) if target == "payment_to_income" else np.ceil(np.round(cents, 6))) / 100
+        payoff = payoff_summary(borrowed, rate, payment)
+        if not payoff["amortizing"].all():
+            raise ValueError("That payment override would never repay the mortgage")
+        return {
+            frequency: {
+                "payment_override": payment[i].item(),
+                REPAY_PERIOD_KEYS[frequency]: int(payoff["periods"][i]),
+                "total_interest": payoff["total_interest"][i].item()
             }
+            for i, frequency in enumerate(OVERRIDE_FREQUENCIES)
         }
 
-    def amortization_table(self):
-        total_amount_borrowed = self.initial_payment_breakdown["total_amount_borrowed"]
-        term = self._initial_term
-        initial_interest = self._initial_interest
-        override = self.payment_override_enabled
-        monthly_override_amount = self.monthly_payment_override
-        fortnightly_override_amount = self.fortnightly_payment_override
-
-        amortization_table_monthly = []
-        amortization_table_fortnightly = []
-
-        balance_monthly = total_amount_borrowed
-        balance_fortnightly = total_amount_borrowed
-
-        accumulated_interest_monthly = 0
-        accumulated_principal_payment_monthly = 0
-        accumulated_interest_fortnightly = 0
-        accumulated_principal_payment_fortnightly = 0
-
-        # changes
-        current_interest = initial_interest
-        change_idx = 0
-        changes = self.interest_rate_changes
-        next_change = changes[change_idx] if changes else None
-
-        # monthly
-        for period in range(1, term * 12 + 1):
-            # Check for interest rate change
-            if (next_change and period > (next_change["effective_date"].year - self._start_date.year) * 12 +
-                    next_change["effective_date"].month - self._start_date.month):
-                current_interest = next_change["new_interest_rate"] / 100
-                change_idx += 1
-                next_change = changes[change_idx] if change_idx < len(changes) else None
-
-            interest_payment = balance_monthly * (current_interest / 12) if balance_monthly > 0 else 0
-            principal_payment = self.initial_payment_breakdown[
-                                    "estimated_repayment_monthly"] - interest_payment if interest_payment > 0 else 0
-            extra_payment = (monthly_override_amount - self.initial_payment_breakdown
-            ["estimated_repayment_monthly"]) if override and interest_payment > 0 else 0
-            total_payment = interest_payment + principal_payment + extra_payment
-            new_balance = balance_monthly - principal_payment - extra_payment if balance_monthly > 0 else 0
-            accumulated_interest_monthly += interest_payment if balance_monthly > 0 else 0
-            accumulated_principal_payment_monthly += principal_payment + extra_payment if interest_payment > 0 else 0
-
-            amortization_table_monthly.append({
-                "Period": period,
-                "Balance": balance_monthly,
-                "Interest": interest_payment,
-                "Principal": principal_payment,
-                "Extra": extra_payment,
-                "Total Payment": total_payment,
-                "New Balance": new_balance,
-                "Accumulated Interest": accumulated_interest_monthly,
-                "Accumulated Principal Payment": accumulated_principal_payment_monthly
-            })
-
-            balance_monthly = new_balance
-            if balance_monthly <= 0:
-                break
-
-        # fortnightly
-        current_interest = initial_interest
-        change_idx = 0
-        next_change = changes[change_idx] if changes else None
-
-        for period in range(1, term * 26 + 1):
-            #  rate change
-            if next_change and period > (next_change["effective_date"].year - self._start_date.year) * 26 + (
-                    next_change["effective_date"].month - self._start_date.month) * 2:
-                current_interest = next_change["new_interest_rate"] / 100
-                change_idx += 1
-                next_change = changes[change_idx] if change_idx < len(changes) else None
-
-            interest_payment = balance_fortnightly * (current_interest / 26) if balance_fortnightly > 0 else 0
-            principal_payment = self.initial_payment_breakdown[
-                                    "estimated_repayment_fortnightly"] - interest_payment if interest_payment > 0 else 0
-            extra_payment = (fortnightly_override_amount - self.initial_payment_breakdown[
-                "estimated_repayment_fortnightly"]) if override and interest_payment > 0 else 0
-            total_payment = interest_payment + principal_payment + extra_payment
-            new_balance = balance_fortnightly - principal_payment - extra_payment if balance_fortnightly > 0 else 0
-            accumulated_interest_fortnightly += interest_payment if balance_fortnightly > 0 else 0
-            accumulated_principal_payment_fortnightly += principal_payment + extra_payment if interest_payment > 0 else 0
-
-            amortization_table_fortnightly.append({
-                "Period": period,
-                "Balance": balance_fortnightly,
-                "Interest": interest_payment,
-                "Principal": principal_payment,
-                "Extra": extra_payment,
-                "Total Payment": total_payment,
-                "New Balance": new_balance,
-                "Accumulated Interest": accumulated_interest_fortnightly,
-                "Accumulated Principal Payment": accumulated_principal_payment_fortnightly
-            })
-
-            balance_fortnightly = new_balance
-            if balance_fortnightly <= 0:
-                break
-
-        self.amortization_schedule = {
-            "monthly": amortization_table_monthly,
-            "fortnightly": amortization_table_fortnightly
-        }
+    def calculate_sensitivities(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        # closed form first and second order sensitivities per frequency, per percentage point of rate and per
+        # year of term; the payoff holds the override, or the estimated repayment where none applies
+        values = sensitivities(self.initial_payment_breakdown["total_amount_borrowed"], self._initial_interest,
+                               self._initial_term, FREQUENCY_AXIS, self._override_payments(missing=np.nan),
+                               rate_unit=0.01)
+        return {frequency: {quantity: {key: column[i].item() for key, column in partials.items()}
+                            for quantity, partials in values.items()}
+                for i, frequency in enumerate(PAYMENT_FREQUENCIES)}
+
+    def simulate_rate_paths(self, frequency: str = "monthly", paths: int = 10000, seed=None,
+                            max_workers: Optional[int] = None, **model) -> Dict:
+        # percentile bands of the payoff under simulated rate paths, with the scheduled payment, override and
+        # dated lump sums held as they are; recorded rate changes are kept and the paths start from the last one
+        check_frequency(frequency)
+        balance, rates, estimated_repayment, extra_payment, lumps = self._schedule_inputs(frequency)
+        periods_per_year = PAYMENT_FREQUENCIES[frequency]
+        payments = np.full(self._initial_term * periods_per_year, estimated_repayment + extra_payment)
+        if lumps is not None:
+            payments += lumps
+        starts, _ = self.rate_timeline.segments(periods_per_year, len(rates))
+        known_rates = rates[:starts[-1] + 1] * periods_per_year
+        bands = simulate_payoff_bands(balance, payments, known_rates, periods_per_year,
+                                      paths=paths, seed=seed, max_workers=max_workers, **model)
+        bands[REPAY_PERIOD_KEYS[frequency]] = {key: round(period)
+                                              for key, period in bands.pop("periods_to_repay").items()}
+        return {"frequency": frequency, **bands}
+
+    def input_hash(self) -> str:
+        # content address of everything the schedule math reads, including the repayments it amortizes with
+        breakdown = self.initial_payment_breakdown
+        inputs = [
+            float(self._initial_principal), float(self._deposit), float(self._extra_costs),
+            float(self._initial_interest), int(self._initial_term), bool(self.payment_override_enabled),
+            None if self.monthly_payment_override is None else float(self.monthly_payment_override),
+            None if self.fortnightly_payment_override is None else float(self.fortnightly_payment_override),
+            self._start_date.isoformat(), bool(self._fixed_point),
+            [[float(change["new_interest_rate"]), change["effective_date"].isoformat()]
+             for change in self.interest_rate_changes],
+            [[float(payment["amount"]), payment["payment_date"].isoformat()] for payment in self.lump_sum_payments],
+            [breakdown.get("total_amount_borrowed")] +
+            [breakdown.get(f"estimated_repayment_{frequency}") for frequency in PAYMENT_FREQUENCIES]
+        ]
+        return hashlib.blake2b(json.dumps(inputs).encode(), digest_size=16).hexdigest()
+
+    def _schedule_inputs(self, frequency: str):
+        periods_per_year = PAYMENT_FREQUENCIES[frequency]
+        estimated_repayment = self.initial_payment_breakdown[f"estimated_repayment_{frequency}"]
+        override_amount = self._override_payments(missing=np.nan)[list(PAYMENT_FREQUENCIES).index(frequency)]
+        extra_payment = 0 if np.isnan(override_amount) else override_amount.item() - estimated_repayment
+        rates = self.rate_timeline.period_rates(periods_per_year, self._initial_term * periods_per_year)
+        lumps = lump_sums(self._initial_term, periods_per_year, self._start_date, self.lump_sum_payments) \
+            if self.lump_sum_payments else None
+        return (self.initial_payment_breakdown["total_amount_borrowed"], rates, estimated_repayment, extra_payment,
+                lumps)
+
+    @staticmethod
+    def _first_changed_period(inputs, previous_inputs) -> Optional[int]:
+        # the first period whose rate or lump sum moved, None when the schedule has to be rebuilt from scratch
+        if inputs[0] != previous_inputs[0] or inputs[2] != previous_inputs[2] or inputs[3] != previous_inputs[3] \
+                or len(inputs[1]) != len(previous_inputs[1]):
+            return None
+        horizon = len(inputs[1])
+        lumps, previous_lumps = (np.zeros(horizon) if values is None else values
+                                 for values in (inputs[4], previous_inputs[4]))
+        changed = np.flatnonzero((inputs[1] != previous_inputs[1]) | (lumps != previous_lumps))
+        return int(changed[0]) if changed.size else horizon
+
+    @staticmethod
+    def _padded_inputs(inputs: Dict[str, tuple], frequencies: List[str]):
+        # stacks per frequency inputs along a frequency axis, padding rates and lump sums to the longest horizon
+        horizons = np.array([len(inputs[frequency][1]) for frequency in frequencies])
+        rates = np.zeros((len(frequencies), horizons.max()))
+        lumps = np.zeros_like(rates)
+        for i, frequency in enumerate(frequencies):
+            balance, frequency_rates, estimated_repayment, extra_payment, frequency_lumps = inputs[frequency]
+            rates[i, :horizons[i]] = frequency_rates
+            if frequency_lumps is not None:
+                lumps[i, :horizons[i]] = frequency_lumps
+        estimated_repayment = np.array([inputs[frequency][2] for frequency in frequencies])
+        extra_payment = np.array([inputs[frequency][3] for frequency in frequencies])
+        return inputs[frequencies[0]][0], rates, estimated_repayment, extra_payment, horizons, lumps
+
+    def _amortize_cents(self, frequencies) -> Dict[str, np.ndarray]:
+        schedules = {}
+        for frequency in frequencies:
+            balance, rates, estimated_repayment, extra_payment, lumps = self._schedule_inputs(frequency)
+            periods_per_year = PAYMENT_FREQUENCIES[frequency]
+            schedules[frequency] = amortize_cents(
+                int(to_cents(balance)), to_rate_units(rates * periods_per_year), periods_per_year,
+                int(to_cents(estimated_repayment)), int(to_cents(extra_payment)),
+                lump_sums=None if lumps is None else to_cents(lumps))
+        return schedules
+
+    def _amortize(self, frequencies=SCHEDULE_FREQUENCIES) -> Dict[str, np.ndarray]:
+        if self._fixed_point:
+            return self._amortize_cents(frequencies)
+        inputs = {frequency: self._schedule_inputs(frequency) for frequency in frequencies}
+        schedules = {}
+        rebuild = []
+        for frequency, frequency_inputs in inputs.items():
+            basis = self._schedule_basis.get(frequency)
+            start = None if basis is None else self._first_changed_period(frequency_inputs, basis[0])
+            if start is None:
+                rebuild.append(frequency)
+            else:
+                schedules[frequency] = recompute_from(basis[1], start, *frequency_inputs[1:])
+
+        if rebuild:
+            # every frequency rebuilt from scratch shares one kernel pass over a padded frequency axis
+            balance, rates, estimated_repayment, extra_payment, horizons, lumps = self._padded_inputs(inputs, rebuild)
+            columns = amortize(balance, rates, estimated_repayment, extra_payment, periods=horizons, lump_sums=lumps)
+            for i, frequency in enumerate(rebuild):
+                schedules[frequency] = truncate(columns, i)
+
+        for frequency in frequencies:
+            self._schedule_basis[frequency] = (inputs[frequency], schedules[frequency])
+        return {frequency: schedules[frequency] for frequency in frequencies}
+
+    def iter_amortization(self, frequency: str = "monthly", chunk_size: int = SCHEDULE_CHUNK_SIZE):
+        check_frequency(frequency)
+        cached = schedule_cache.peek(self.input_hash())
+        if cached is not None and frequency in cached:
+            return iter(Schedule(cached[frequency]))
+        if self._fixed_point:
+            return iter(Schedule(self._amortize_cents([frequency])[frequency]))
+        balance, rates, estimated_repayment, extra_payment, lumps = self._schedule_inputs(frequency)
+        return iter_schedule(balance, rates, estimated_repayment, extra_payment, lumps, chunk_size=chunk_size)
+
+    @instrumentation.timed(size=_periods_produced)
+    def amortization_table(self, frequencies=SCHEDULE_FREQUENCIES):
+        # only the requested frequencies are built, a cache entry grows by the ones it was missing
+        for frequency in frequencies:
+            check_frequency(frequency)
+        key = self.input_hash()
+        schedules = schedule_cache.get(key, frequencies) or {}
+        missing = tuple(frequency for frequency in frequencies if frequency not in schedules)
+        if missing:
+            schedules = {**schedules, **self._amortize(missing)}
+            schedule_cache.put(key, schedules)
+        self.amortization_schedule = {frequency: Schedule(schedules[frequency]) for frequency in frequencies}
         return self.amortization_schedule
 
+    def _balance_curve(self, frequency: str) -> BalanceCurve:
+        # the schedule's recurrence per rate segment, built from the segments and lump dates alone
+        periods_per_year = check_frequency(frequency)
+        horizon = self._initial_term * periods_per_year
+        starts, rates = self.rate_timeline.segments(periods_per_year, horizon)
+        payment = self._override_payments(missing=np.nan)[list(PAYMENT_FREQUENCIES).index(frequency)]
+        if np.isnan(payment):
+            payment = self.initial_payment_breakdown[f"estimated_repayment_{frequency}"]
+        lump_periods = period_offsets([lump["payment_date"] for lump in self.lump_sum_payments], self._start_date,
+                                      periods_per_year)
+        return BalanceCurve(self.initial_payment_breakdown["total_amount_borrowed"], starts, rates, float(payment),
+                            horizon, lump_periods, [lump["amount"] for lump in self.lump_sum_payments])
+
+    def _elapsed_periods(self, dates, frequency: str) -> np.ndarray:
+        # payments made by each date, the period the date falls into
+        return period_offsets(dates, self._start_date, check_frequency(frequency))
+
+    @staticmethod
+    def _scalar_or_array(values: np.ndarray):
+        return values.item() if values.ndim == 0 else values
+
+    def balance_at(self, date, frequency: str = "monthly"):
+        # balance on a date or an array of dates without building the schedule
+        curve = self._balance_curve(frequency)
+        return self._scalar_or_array(curve.balance(self._elapsed_periods(date, frequency)))
+
+    def interest_paid_between(self, start_date, end_date, frequency: str = "monthly"):
+        start_periods = self._elapsed_periods(start_date, frequency)
+        end_periods = self._elapsed_periods(end_date, frequency)
+        if np.any(end_periods < start_periods):
+            raise ValueError("End date cannot be before the start date")
+        curve = self._balance_curve(frequency)
+        return self._scalar_or_array(curve.accumulated_interest(end_periods) -
+                                     curve.accumulated_interest(start_periods))
+
+    def periods_remaining(self, date, frequency: str = "monthly"):
+        # payments left until the mortgage is repaid, or until the end of the term when it never is
+        curve = self._balance_curve(frequency)
+        return self._scalar_or_array(curve.periods_remaining(self._elapsed_periods(date, frequency)))
+
     def apply_extra_costs(self, extra_costs: float):
         if extra_costs <= 0:
             raise ValueError("Extra costs must be greater than zero")
         self._initial_principal += extra_costs
+        self._invalidate()
         transaction = {
             "transaction_date": datetime.now(),
             "transaction_type": "Extra Costs",
@@ -438,9 +767,6 @@ class Mortgage:
             "description": "Added extra costs to principal"
         }
         self.historical_transactions.append(transaction)
-        self.calculate_initial_payment_breakdown()
-        self.calculate_mortgage_maturity()
-        self.amortization_table()
 
     def add_comments(self, comments: str):
         self.historical_transactions.append({
@@ -454,37 +780,43 @@ class Mortgage:
                         comments: Optional[str] = None):
         transaction_date = datetime.now()
 
-        print(f"Before update: principal={self._initial_principal}, extra_costs={self._extra_costs}")
-
-        if monthly_payment_override is not None:
-            self.monthly_payment_override = monthly_payment_override
-            self.payment_override_enabled = True
-
-        if balloon_payment is not None:
-            print(f"Making balloon payment: {balloon_payment}")
-            self.make_balloon_payment(balloon_payment)
-
-        if extra_costs is not None:
-            print(f"Adding extra costs: {extra_costs}")
-            self._initial_principal += extra_costs
-            self._extra_costs += extra_costs
-            self.total_amount_borrowed += extra_costs
-
-        if comments is not None:
-            print(f"Updating comments: {comments}")
-            self._comments = comments
-        else:
-            comments = "updated mortgage details with "
-
-        print(
-            f"After applying extra costs and balloon payment: principal={self._initial_principal}, extra_costs={self._extra_costs}")
-
-        # Recalculate mortgage
-        self.calculate_initial_payment_breakdown()
-        self.calculate_mortgage_maturity()
-        self.amortization_table()
-
-        print(f"After update: principal={self._initial_principal}, extra_costs={self._extra_costs}")
+        logger.debug("Updating mortgage %s: principal=%s, extra_costs=%s", self._mortgage_id,
+                     self._initial_principal, self._extra_costs)
+
+        # a rejected update leaves the mortgage as it was, the checks need the new values applied first
+        saved = {name: getattr(self, name) for name in UPDATE_STATE}
+        history = len(self.historical_transactions)
+        try:
+            if monthly_payment_override is not None:
+                self.monthly_payment_override = monthly_payment_override
+                self.payment_override_enabled = True
+
+            if balloon_payment is not None:
+                logger.debug("Making balloon payment: %s", balloon_payment)
+                self.make_balloon_payment(balloon_payment)
+
+            if extra_costs is not None:
+                logger.debug("Adding extra costs: %s", extra_costs)
+                self._initial_principal += extra_costs
+                self._extra_costs += extra_costs
+                self.total_amount_borrowed += extra_costs
+                self._invalidate()
+
+            if comments is not None:
+                self._comments = comments
+            else:
+                comments = "updated mortgage details with "
+
+            self._check_overrides_amortize()
+        except ValueError:
+            for name, value in saved.items():
+                setattr(self, name, value)
+            del self.historical_transactions[history:]
+            self._invalidate()
+            raise
+
+        logger.debug("Updated mortgage %s: principal=%s, extra_costs=%s", self._mortgage_id,
+                     self._initial_principal, self._extra_costs)
 
         self.log_transaction(
             transaction_type="Update",
@@ -510,7 +842,7 @@ class Mortgage:
             "description": description
         }
         self.transaction_logs.append(transaction)
-        print(f"Logged transaction: {transaction}")
+        logger.debug("Logged %s transaction of %s", transaction_type, amount)
 
     def get_comments(self) -> List[str]:
         return [t["description"] for t in self.historical_transactions if t["transaction_type"] == "Comments"]
@@ -537,13 +869,185 @@ class Mortgage:
             "historical_transactions": self.historical_transactions
         }
 
+    def to_bytes(self, frequencies=SCHEDULE_FREQUENCIES) -> bytes:
+        # inputs, breakdown and maturity in the header, every requested schedule as one raw record buffer
+        meta = {
+            "state": {name: getattr(self, name) for name in SERIALIZED_STATE},
+            "initial_payment_breakdown": self.initial_payment_breakdown,
+            "mortgage_maturity": self.mortgage_maturity
+        }
+        return pack(meta, {frequency: schedule.rows for frequency, schedule
+                                 in self.amortization_table(frequencies).items()})
+
+    @classmethod
+    def from_bytes(cls, data) -> "Mortgage":
+        # schedules are views on data rather than copies, so data has to outlive the mortgage's schedules
+        meta, schedules = unpack(data)
+        state = meta["state"]
+        mortgage = cls(state["_mortgage_name"], 0, state["_initial_term"], 0, 0, 0)
+        for name in SERIALIZED_STATE:
+            setattr(mortgage, name, state[name])
+        mortgage.initial_payment_breakdown = meta["initial_payment_breakdown"]
+        mortgage.mortgage_maturity = meta["mortgage_maturity"]
+        mortgage.amortization_schedule = {frequency: Schedule(rows) for frequency, rows in schedules.items()}
+        return mortgage
+
     def add_interest_rate_change(self, new_interest_rate: float, effective_date: datetime):
         self.interest_rate_changes.append({"new_interest_rate": new_interest_rate, "effective_date": effective_date})
+        self._invalidate("schedule")
 
     def get_amortization_schedules(self):
         return self.amortization_table()
 
 
+class MortgageBatch:
+    def __init__(self, principal, interest, term, extra_costs, deposit, payment_override_enabled=None,
+                 monthly_payment_override=None, fortnightly_payment_override=None,
+                 start_dates: Optional[List[datetime]] = None,
+                 interest_rate_changes: Optional[List[List[Dict]]] = None,
+                 lump_sum_payments: Optional[List[List[Dict]]] = None):
+        self.principal: np.ndarray = np.asarray(principal, dtype=float)
+        size = len(self.principal)
+        self.interest: np.ndarray = np.asarray(interest, dtype=float) / 100
+        self.term: np.ndarray = np.asarray(term, dtype=int)
+        self.extra_costs: np.ndarray = np.asarray(extra_costs, dtype=float)
+        self.deposit: np.ndarray = np.asarray(deposit, dtype=float)
+        self.payment_override_enabled: np.ndarray = np.zeros(size, dtype=bool) \
+            if payment_override_enabled is None else np.asarray(payment_override_enabled, dtype=bool)
+        # missing overrides are stored as nan
+        self.monthly_payment_override: np.ndarray = np.full(size, np.nan) \
+            if monthly_payment_override is None else np.asarray(monthly_payment_override, dtype=float)
+        self.fortnightly_payment_override: np.ndarray = np.full(size, np.nan) \
+            if fortnightly_payment_override is None else np.asarray(fortnightly_payment_override, dtype=float)
+        self.start_dates: List[datetime] = start_dates if start_dates is not None else [datetime.now()] * size
+        self.interest_rate_changes: List[List[Dict]] = interest_rate_changes \
+            if interest_rate_changes is not None else [[] for _ in range(size)]
+        self.lump_sum_payments: List[List[Dict]] = lump_sum_payments \
+            if lump_sum_payments is not None else [[] for _ in range(size)]
+        self.total_amount_borrowed: np.ndarray = self.principal - self.deposit + self.extra_costs
+        self.initial_payment_breakdown: Dict[str, np.ndarray] = {}
+        self.mortgage_maturity: Dict[str, Dict[str, np.ndarray]] = {}
+        self.amortization_schedule: Dict[str, Dict[str, np.ndarray]] = {}
+
+    @classmethod
+    def from_mortgages(cls, mortgages: List[Mortgage]) -> "MortgageBatch":
+        return cls(
+            principal=[m.initial_principal for m in mortgages],
+            interest=[m.initial_interest * 100 for m in mortgages],
+            term=[m.initial_term for m in mortgages],
+            extra_costs=[m.extra_costs for m in mortgages],
+            deposit=[m.deposit for m in mortgages],
+            payment_override_enabled=[m.payment_override_enabled for m in mortgages],
+            monthly_payment_override=[m.monthly_payment_override for m in mortgages],
+            fortnightly_payment_override=[m.fortnightly_payment_override for m in mortgages],
+            start_dates=[m.start_date for m in mortgages],
+            interest_rate_changes=[m.interest_rate_changes for m in mortgages],
+            lump_sum_payments=[m.lump_sum_payments for m in mortgages]
+        )
+
+    def __len__(self):
+        return len(self.principal)
+
+    def _override_payments(self, missing: float) -> np.ndarray:
+        # (mortgages, frequencies) overrides, nan where no override applies
+        # and missing where the override is enabled without an amount
+        columns = []
+        for frequency in PAYMENT_FREQUENCIES:
+            if frequency not in OVERRIDE_FREQUENCIES:
+                columns.append(np.full(len(self), np.nan))
+                continue
+            override = getattr(self, f"{frequency}_payment_override")
+            columns.append(np.where(self.payment_override_enabled,
+                                    np.where(np.isnan(override), missing, override), np.nan))
+        return np.stack(columns, axis=-1) if columns else np.empty((len(self), 0))
+
+    @instrumentation.timed(size=lambda breakdown: len(breakdown["total_amount_borrowed"]))
+    def calculate_initial_payment_breakdown(self):
+        borrowed = self.total_amount_borrowed
+        values = repayment_breakdown(borrowed[:, np.newaxis], self.interest[:, np.newaxis], self.term[:, np.newaxis],
+                                     FREQUENCY_AXIS, self._override_payments(missing=0.0))
+
+        breakdown = {"total_amount_borrowed": borrowed}
+        for i, frequency in enumerate(PAYMENT_FREQUENCIES):
+            breakdown.update({f"{key}_{frequency}": column[:, i] for key, column in values.items()})
+
+        self.initial_payment_breakdown = breakdown
+        return breakdown
+
+    @instrumentation.timed(size=lambda maturity: len(maturity["monthly"]["full_term_payments"]))
+    def calculate_mortgage_maturity(self):
+        details = self.initial_payment_breakdown
+        estimated_repayment = np.stack([details[f"estimated_repayment_{frequency}"]
+                                        for frequency in PAYMENT_FREQUENCIES], axis=-1)
+        summary = maturity_summary(details["total_amount_borrowed"][:, np.newaxis], self.interest[:, np.newaxis],
+                                   self.term[:, np.newaxis], FREQUENCY_AXIS, estimated_repayment,
+                                   self._override_payments(missing=np.nan))
+
+        # one mortgage whose override does not amortize must not fail the whole book, it is flagged in its
+        # amortizing column with infinite payoff totals and 0 periods to repay instead
+        maturity = {}
+        for i, frequency in enumerate(PAYMENT_FREQUENCIES):
+            maturity[frequency] = {key: values[:, i] for key, values in summary.items() if key != "periods_to_repay"}
+            maturity[frequency][REPAY_PERIOD_KEYS[frequency]] = summary["periods_to_repay"][:, i]
+
+        self.mortgage_maturity = maturity
+        return maturity
+
+    def calculate_sensitivities(self) -> Dict[str, Dict[str, Dict[str, np.ndarray]]]:
+        # Mortgage.calculate_sensitivities for the whole book in one broadcast
+        values = sensitivities(self.total_amount_borrowed[:, np.newaxis], self.interest[:, np.newaxis],
+                               self.term[:, np.newaxis], FREQUENCY_AXIS, self._override_payments(missing=np.nan),
+                               rate_unit=0.01)
+        return {frequency: {quantity: {key: column[:, i] for key, column in partials.items()}
+                            for quantity, partials in values.items()}
+                for i, frequency in enumerate(PAYMENT_FREQUENCIES)}
+
+    @instrumentation.timed(size=_periods_produced)
+    def amortization_table(self, frequencies=tuple(PAYMENT_FREQUENCIES)):
+        # one kernel pass per frequency, the mortgage axis is already batched and stacking frequencies
+        # on top would pad every mortgage out to the longest weekly horizon
+        details = self.initial_payment_breakdown
+        overrides = self._override_payments(missing=np.nan)
+        schedules = {}
+
+        for frequency in frequencies:
+            periods_per_year = check_frequency(frequency)
+            horizon = int(self.term.max()) * periods_per_year if len(self) else 0
+            rates = np.repeat((self.interest / periods_per_year)[:, np.newaxis], horizon, axis=1)
+            # only mortgages with rate changes need their own rate row
+            for i, changes in enumerate(self.interest_rate_changes):
+                if changes:
+                    timeline = RateTimeline(self.interest[i], self.start_dates[i], changes)
+                    row = timeline.period_rates(periods_per_year, int(self.term[i]) * periods_per_year)
+                    rates[i, :len(row)] = row
+            lumps = None
+            if any(self.lump_sum_payments):
+                lumps = np.zeros_like(rates)
+                for i, payments in enumerate(self.lump_sum_payments):
+                    if payments:
+                        row = lump_sums(int(self.term[i]), periods_per_year, self.start_dates[i], payments)
+                        lumps[i, :len(row)] = row
+
+            estimated_repayment = details[f"estimated_repayment_{frequency}"]
+            override = overrides[:, list(PAYMENT_FREQUENCIES).index(frequency)]
+            extra_payment = np.where(np.isnan(override), 0, override - estimated_repayment)
+            schedules[frequency] = amortize(details["total_amount_borrowed"], rates, estimated_repayment,
+                                            extra_payment, periods=self.term * periods_per_year, lump_sums=lumps)
+
+        self.amortization_schedule = schedules
+        return schedules
+
+    def get_initial_payment_breakdown(self, index: int) -> Dict[str, float]:
+        return {key: float(values[index]) for key, values in self.initial_payment_breakdown.items()}
+
+    def get_mortgage_maturity(self, index: int) -> Dict[str, Dict]:
+        return {frequency: {key: values[index].item() for key, values in details.items()}
+                for frequency, details in self.mortgage_maturity.items()}
+
+    def get_amortization_schedules(self, index: int) -> Dict[str, Schedule]:
+        return {frequency: Schedule(truncate(columns, index)) for frequency, columns in self.amortization_schedule.items()}
+
+
 if __name__ == "__main__":
     M = Mortgage("Test Mortgage", 5, 20, 810000, 50000, 10000, "initial setup")
     try:
@@ -573,9 +1077,8 @@ if __name__ == "__main__":
         print()
 
         # amortization table
-        amortization_schedule = M.amortization_table()
         print("Amortization Table (Monthly - first 5 periods):")
-        for row in amortization_schedule["monthly"][:5]:
+        for row in islice(M.iter_amortization("monthly"), 5):
             print(row)
 
         # balloon
@@ -584,9 +1087,8 @@ if __name__ == "__main__":
         M.calculate_mortgage_maturity()
         for key, value in M.mortgage_maturity.items():
             print(f"{key}: {value}")
-        amortization_schedule = M.amortization_table()
         print("Amortization Table (Monthly - first 5 periods):")
-        for row in amortization_schedule["monthly"][:5]:
+        for row in islice(M.iter_amortization("monthly"), 5):
             print(row)
 
         # Update mortgage with new parameters
@@ -602,9 +1104,8 @@ if __name__ == "__main__":
             print(f"{key}: {value}")
         print()
 
-        amortization_schedule = M.amortization_table()
         print("Amortization Table (Monthly - first 5 periods):")
-        for row in amortization_schedule["monthly"][:5]:
+        for row in islice(M.iter_amortization("monthly"), 5):
             print(row)
 
         # scenarios for the increment
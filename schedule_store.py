@@ -0,0 +1,106 @@
+import logging
+from datetime import date
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from amortization import CENTS_SCHEDULE_DTYPE, from_cents, period_dates
+from mortgage import PAYMENT_FREQUENCIES, SCHEDULE_FREQUENCIES, Mortgage
+
+logger = logging.getLogger(__name__)
+
+STORED_COLUMNS = ("mortgage_id", "frequency", "period", "payment_date", "principal_payment", "interest_payment",
+                  "extra_payment", "remaining_balance", "input_hash")
+# the frequencies the views read back, weekly and quarterly are never stored
+STORED_FREQUENCIES = SCHEDULE_FREQUENCIES
+# tab separated COPY text, amounts written with exactly two decimals so NUMERIC(15, 2) stores them as shown
+COPY_FORMAT = "%d\t%s\t%d\t%s\t%.2f\t%.2f\t%.2f\t%.2f\t%s"
+
+
+def schedule_records(mortgage_id: int, mortgage: Mortgage) -> np.ndarray:
+    # every stored frequency's schedule as one record array in the table's column order
+    input_hash = mortgage.input_hash()
+    dtype = np.dtype([("mortgage_id", np.int64), ("frequency", "U16"), ("period", np.int32),
+                      ("payment_date", "U10"), ("principal_payment", np.float64), ("interest_payment", np.float64),
+                      ("extra_payment", np.float64), ("remaining_balance", np.float64), ("input_hash", "U32")])
+    parts = []
+    for frequency, schedule in mortgage.amortization_table(STORED_FREQUENCIES).items():
+        rows = from_cents(schedule.rows) if schedule.rows.dtype == CENTS_SCHEDULE_DTYPE else schedule.rows
+        records = np.empty(len(rows), dtype=dtype)
+        records["mortgage_id"] = mortgage_id
+        records["frequency"] = frequency
+        records["period"] = rows["Period"]
+        records["payment_date"] = period_dates(mortgage.start_date, rows["Period"],
+                                               PAYMENT_FREQUENCIES[frequency]).astype(str)
+        records["principal_payment"] = rows["Principal"]
+        records["interest_payment"] = rows["Interest"]
+        records["extra_payment"] = rows["Extra"]
+        records["remaining_balance"] = rows["New Balance"]
+        records["input_hash"] = input_hash
+        parts.append(records)
+    return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+
+def stored_input_hash(cursor, mortgage_id: int) -> Optional[str]:
+    cursor.execute("SELECT input_hash FROM amortization_schedules WHERE mortgage_id = %s LIMIT 1", (mortgage_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def invalidate_schedules(cursor, mortgage_id: int) -> None:
+    # the triggers from migration 6 already do this for mortgage and rate change writes
+    cursor.execute("DELETE FROM amortization_schedules WHERE mortgage_id = %s", (mortgage_id,))
+
+
+def store_schedules(cursor, mortgage_id: int, mortgage: Mortgage) -> int:
+    # replaces the mortgage's stored rows with one COPY; run it inside a transaction so readers never
+    # see the mortgage without rows
+    records = schedule_records(mortgage_id, mortgage)
+    buffer = BytesIO()
+    np.savetxt(buffer, records, fmt=COPY_FORMAT)
+    buffer.seek(0)
+    invalidate_schedules(cursor, mortgage_id)
+    cursor.copy_expert(f"COPY amortization_schedules ({', '.join(STORED_COLUMNS)}) FROM STDIN", buffer)
+    logger.debug("Stored %s schedule rows for mortgage %s", len(records), mortgage_id)
+    return len(records)
+
+
+def refresh_schedules(cursor, mortgage_id: int, mortgage: Mortgage) -> bool:
+    # rewrites the stored schedules only when the mortgage's inputs no longer match them
+    if stored_input_hash(cursor, mortgage_id) == mortgage.input_hash():
+        return False
+    store_schedules(cursor, mortgage_id, mortgage)
+    return True
+
+
+def unscheduled_mortgages(cursor, username: str) -> List[tuple]:
+    # the user's mortgages without stored rows, either written since (the triggers drop their rows) or older
+    # than the store, as SELECT * FROM mortgages rows
+    cursor.execute("""
+        SELECT m.*
+        FROM mortgages m
+        JOIN users u ON u.user_id = m.user_id
+        WHERE u.username = %s
+          AND NOT EXISTS (SELECT 1 FROM amortization_schedules s WHERE s.mortgage_id = m.mortgage_id)
+        ORDER BY m.mortgage_id
+    """, (username,))
+    return cursor.fetchall()
+
+
+def interest_due(cursor, username: str, start: date, end: date, frequency: str = "monthly") -> List[Dict]:
+    # interest per mortgage on payments due from start up to but excluding end, summed in SQL over the
+    # stored rows; mortgages without stored schedules are left out, store them first (unscheduled_mortgages)
+    if frequency not in STORED_FREQUENCIES:
+        raise ValueError(f"Unsupported frequency '{frequency}'")
+    cursor.execute("""
+        SELECT s.mortgage_id, m.mortgage_name, SUM(s.interest_payment), COUNT(*)
+        FROM amortization_schedules s
+        JOIN mortgages m ON m.mortgage_id = s.mortgage_id
+        JOIN users u ON u.user_id = m.user_id
+        WHERE u.username = %s AND s.frequency = %s AND s.payment_date >= %s AND s.payment_date < %s
+        GROUP BY s.mortgage_id, m.mortgage_name
+        ORDER BY s.mortgage_id
+    """, (username, frequency, start, end))
+    return [{"mortgage_id": mortgage_id, "mortgage_name": name, "interest": float(interest), "payments": payments}
+            for mortgage_id, name, interest, payments in cursor.fetchall()]
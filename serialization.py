@@ -0,0 +1,80 @@
+import json
+import struct
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Tuple
+
+import numpy as np
+
+MAGIC = b"MMBF"
+FORMAT_VERSION = 1
+# magic, format version, reserved, length of the JSON header that follows
+PREAMBLE = struct.Struct("<4sHHI")
+# every buffer starts on an 8 byte boundary so views on it are aligned
+ALIGNMENT = 8
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _decode(obj: Dict):
+    if len(obj) == 1:
+        if "$datetime" in obj:
+            return datetime.fromisoformat(obj["$datetime"])
+        if "$date" in obj:
+            return date.fromisoformat(obj["$date"])
+    return obj
+
+
+def _padding(size: int) -> bytes:
+    return b"\0" * (-size % ALIGNMENT)
+
+
+def pack(meta: Dict, arrays: Dict[str, np.ndarray]) -> bytes:
+    # preamble, JSON header with the metadata and a table of the arrays, then each array's raw
+    # little-endian buffer
+    table = []
+    buffers = []
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+        table.append({"name": name, "dtype": array.dtype.descr if array.dtype.names else array.dtype.str,
+                      "shape": array.shape, "offset": offset})
+        buffers += [array.tobytes(), _padding(array.nbytes)]
+        offset += array.nbytes + len(buffers[-1])
+
+    header = json.dumps({"meta": meta, "arrays": table}, default=_encode, separators=(",", ":")).encode()
+    header += _padding(PREAMBLE.size + len(header)).replace(b"\0", b" ")
+    return b"".join([PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, len(header)), header, *buffers])
+
+
+def unpack(data) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    # arrays come back as views on data, bytes give read-only views and bytearray or mmap writable ones
+    view = memoryview(data)
+    if view.nbytes < PREAMBLE.size:
+        raise ValueError("Serialized data is truncated")
+    magic, version, _, header_length = PREAMBLE.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("Serialized data does not start with the expected marker")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unsupported serialization format version {version}")
+
+    start = PREAMBLE.size + header_length
+    header = json.loads(bytes(view[PREAMBLE.size:start]), object_hook=_decode)
+    arrays = {}
+    for entry in header["arrays"]:
+        dtype = np.dtype([tuple(field) for field in entry["dtype"]]) if isinstance(entry["dtype"], list) \
+            else np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        arrays[entry["name"]] = np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)),
+                                              offset=start + entry["offset"]).reshape(shape)
+    return header["meta"], arrays
@@ -0,0 +1,114 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+
+from amortization import amortize_summary
+
+BAND_PERCENTILES = (5, 50, 95)
+MAX_SIMULATION_PATHS = 20000
+SIMULATION_CHUNK_SIZE = 1000
+# worker processes shared by every simulation in this process
+SIMULATION_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    # created on first use and kept for the process; workers are spawned, forking a threaded web worker would
+    # copy its pooled database sockets and logging thread into every child
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=SIMULATION_MAX_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(shutdown_executor)
+        return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+def simulate_rate_paths(initial_rate: float, periods: int, periods_per_year: int, paths: int,
+                        mean_rate: Optional[float] = None, reversion_speed: float = 0.15, volatility: float = 0.01,
+                        floor: float = 0.0, seed=None) -> np.ndarray:
+    # (paths, periods) annual rates from a mean-reverting Vasicek short rate, stepped with its exact
+    # transition so any payment frequency gives the same distribution; the floor only clips the output
+    rng = np.random.default_rng(seed)
+    mean_rate = initial_rate if mean_rate is None else mean_rate
+    dt = 1 / periods_per_year
+    decay = np.exp(-reversion_speed * dt)
+    if reversion_speed > 0:
+        step_volatility = volatility * np.sqrt((1 - decay ** 2) / (2 * reversion_speed))
+    else:
+        step_volatility = volatility * np.sqrt(dt)
+
+    shocks = rng.standard_normal((paths, periods)) * step_volatility
+    rates = np.empty((paths, periods))
+    rates[:, 0] = initial_rate
+    for k in range(1, periods):
+        rates[:, k] = mean_rate + (rates[:, k - 1] - mean_rate) * decay + shocks[:, k]
+    return np.maximum(rates, floor)
+
+
+def _simulate_chunk(balance: float, payments: np.ndarray, known_rates: np.ndarray, periods_per_year: int,
+                    paths: int, model: Dict, seed) -> Dict[str, np.ndarray]:
+    # one worker's share of the paths, module level so the process pool can pickle it; every path shares
+    # the known rates and is simulated on from the last of them
+    simulated = simulate_rate_paths(known_rates[-1], len(payments) - len(known_rates) + 1, periods_per_year, paths,
+                                    seed=seed, **model)
+    rates = np.concatenate([np.broadcast_to(known_rates[:-1], (paths, len(known_rates) - 1)), simulated], axis=1)
+    checkpoints = np.arange(periods_per_year - 1, len(payments), periods_per_year)
+    summary = amortize_summary(balance, rates / periods_per_year, payments, checkpoints=checkpoints)
+    summary["rates"] = rates[:, checkpoints - periods_per_year + 1]
+    return summary
+
+
+def _bands(values: np.ndarray) -> Dict[str, list]:
+    bands = np.percentile(values, BAND_PERCENTILES, axis=0)
+    return {f"p{percentile}": band.tolist() for percentile, band in zip(BAND_PERCENTILES, bands)}
+
+
+def simulate_payoff_bands(balance: float, payments: np.ndarray, initial_rate: float, periods_per_year: int,
+                          paths: int = 10000, seed=None, chunk_size: int = SIMULATION_CHUNK_SIZE,
+                          max_workers: Optional[int] = None, **model) -> Dict:
+    # P5/P50/P95 of payoff period, total interest and repayment across simulated rate paths, plus yearly
+    # balance and rate bands for charts. Chunks get independent child seeds, so a seed reproduces the
+    # same bands however many workers run them; max_workers=1 runs them in this process, anything else on
+    # the shared pool. initial_rate is the annual rate the paths start from, or the annual rates already
+    # known for the first periods, with the paths continuing from the last one
+    if not 0 < paths <= MAX_SIMULATION_PATHS:
+        raise ValueError(f"Number of simulated paths must be between 1 and {MAX_SIMULATION_PATHS}")
+    if chunk_size <= 0:
+        raise ValueError("Chunk size must be greater than zero")
+
+    known_rates = np.atleast_1d(np.asarray(initial_rate, dtype=float))[:len(payments)]
+    sizes = [min(chunk_size, paths - start) for start in range(0, paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    arguments = [(balance, payments, known_rates, periods_per_year, size, model, chunk_seed)
+                 for size, chunk_seed in zip(sizes, seeds)]
+    if max_workers == 1 or len(arguments) == 1:
+        chunks = [_simulate_chunk(*chunk) for chunk in arguments]
+    else:
+        chunks = list(_get_executor().map(_simulate_chunk, *zip(*arguments)))
+
+    results = {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+    return {
+        "paths": paths,
+        "periods_to_repay": _bands(results["periods"]),
+        "total_interest": _bands(results["total_interest"]),
+        "total_repayment": _bands(results["total_repayment"]),
+        "remaining_balance": _bands(results["remaining_balance"]),
+        "yearly_balance": _bands(results["balances"]),
+        "yearly_rate": _bands(results["rates"])
+    }
@@ -0,0 +1,165 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from amortization import (CENTS_SCHEDULE_DTYPE, SCHEDULE_DTYPE, RateTimeline, Schedule, amortize, amortize_cents,
+                          amortize_summary, balance_after, payment_factor, payoff_summary,
+                          period_dates, period_offsets, sensitivities, to_cents, to_rate_units, truncate)
+
+
+def test_amortize_pays_off_loan():
+    rate = 0.06 / 12
+    payment = 100000 * rate / (1 - (1 + rate) ** -360)
+    columns = amortize(100000, np.full(360, rate), payment, 0)
+
+    assert columns["lengths"] == 360
+    assert columns["New Balance"][-1] == pytest.approx(0, abs=1e-6)
+    assert columns["Accumulated Principal Payment"][-1] == pytest.approx(100000)
+    assert columns["Accumulated Interest"][-1] == pytest.approx(payment * 360 - 100000)
+
+
+def test_amortize_batch_pads_after_payoff():
+    rates = np.full(120, 0.05 / 12)
+    columns = amortize(np.array([50000.0, 100000.0]), rates, np.array([2000.0, 1500.0]), np.array([0.0, 500.0]))
+
+    assert columns["Balance"].shape == (2, 120)
+    lengths = columns["lengths"]
+    assert lengths[0] < lengths[1] < 120
+    assert np.all(columns["Interest"][0, lengths[0]:] == 0)
+    assert np.all(columns["Accumulated Interest"][0, lengths[0]:] == columns["Accumulated Interest"][0, lengths[0] - 1])
+    single = amortize(50000.0, rates, 2000.0, 0.0)
+    assert np.allclose(single["Balance"], columns["Balance"][0])
+
+
+def test_amortize_summary_matches_schedule_columns():
+    rates = np.array([np.full(120, 0.004), np.linspace(0.002, 0.01, 120)])
+    columns = amortize(100000, rates, 1100, 0)
+    summary = amortize_summary(100000, rates, 1100, checkpoints=[11, 59])
+
+    assert summary["periods"].tolist() == columns["lengths"].tolist()
+    for i, length in enumerate(columns["lengths"]):
+        assert summary["total_interest"][i] == pytest.approx(columns["Accumulated Interest"][i, length - 1])
+        assert summary["balances"][i].tolist() == pytest.approx(columns["New Balance"][i, [11, 59]].clip(0))
+    assert summary["remaining_balance"][0] == 0
+    assert summary["remaining_balance"][1] == pytest.approx(columns["New Balance"][1, -1])
+
+
+def test_sensitivities_match_finite_differences():
+    def payment(rate, principal, term):
+        return principal * payment_factor(rate, term, 12)
+
+    step = {"rate": 1e-6, "principal": 1.0, "term": 1e-3}
+    for rate in (0.05, 0.0):
+        point = {"rate": rate, "principal": 770000.0, "term": 20.0}
+        values = sensitivities(point["principal"], rate, point["term"], 12)["payment"]
+        for key in ("rate", "principal", "term"):
+            up, down = dict(point), dict(point)
+            up[key] += step[key]
+            down[key] -= step[key]
+            assert values[key] == pytest.approx((payment(**up) - payment(**down)) / (2 * step[key]), rel=1e-5)
+        up, down = dict(point), dict(point)
+        up["rate"] += 1e-4
+        down["rate"] -= 1e-4
+        second = (payment(**up) - 2 * payment(**point) + payment(**down)) / 1e-8
+        assert values["rate_rate"] == pytest.approx(second, rel=1e-3)
+
+    payoff = sensitivities(100000, 0.06, 30, 12, payment=[800, 1000, 400])["payoff_periods"]
+    periods = payoff_summary(100000, [0.06 / 12, 0.06001 / 12], 800)["periods"]
+    assert payoff["rate"][0] * 1e-5 == pytest.approx(periods[1] - periods[0], abs=1)
+    assert payoff["rate"][1] < payoff["rate"][0]
+    assert np.isnan(payoff["rate"][2])
+
+
+def test_schedule_rows():
+    schedule = Schedule(truncate(amortize(1000, np.full(12, 0.01), 100, 0)))
+
+    assert len(schedule) == len(list(schedule))
+    assert schedule[0] == list(schedule)[0]
+    assert schedule[-1]["Period"] == len(schedule)
+    assert schedule[1:3] == list(schedule)[1:3]
+    with pytest.raises(IndexError):
+        schedule[len(schedule)]
+
+
+def test_schedule_rows_are_read_only_views():
+    schedule = Schedule(truncate(amortize(1000, np.full(12, 0.01), 100, 0)))
+    row = schedule[0]
+
+    assert schedule.rows.dtype == SCHEDULE_DTYPE
+    assert dict(row) == {name: schedule.columns[name][0].item() for name in SCHEDULE_DTYPE.names}
+    assert isinstance(row["Period"], int)
+    with pytest.raises(KeyError):
+        row["Missing"]
+    with pytest.raises(TypeError):
+        row["Balance"] = 0
+    assert not hasattr(row, "__dict__")
+
+
+def test_payoff_summary_vectorized():
+    payoff = payoff_summary(np.array([100000.0, 100000.0, 0.0]), 0.005, np.array([1000.0, 400.0, 1000.0]))
+
+    assert not payoff["amortizing"][1]
+    assert np.isinf(payoff["periods"][1])
+    assert payoff["periods"][2] == 0
+    assert payoff["total_interest"][2] == 0
+    assert balance_after(100000.0, 0.005, 1000.0, payoff["periods"][0]) <= 0
+    assert balance_after(100000.0, 0.005, 1000.0, payoff["periods"][0] - 1) > 0
+
+
+def test_period_offsets_are_exact_per_frequency():
+    start = datetime(2024, 1, 31)
+    dates = [datetime(2024, 2, 1), datetime(2024, 2, 13), datetime(2024, 2, 14), datetime(2025, 1, 30)]
+
+    assert period_offsets(dates, start, 12).tolist() == [1, 1, 1, 12]
+    assert period_offsets(dates, start, 26).tolist() == [0, 0, 1, 26]
+
+
+def test_period_dates_invert_period_offsets():
+    start = datetime(2024, 1, 31)
+    periods = np.arange(120)
+
+    assert period_dates(start, [1, 2, 13], 12).astype(str).tolist() == ["2024-02-29", "2024-03-31", "2025-02-28"]
+    for periods_per_year in (4, 12, 26, 52):
+        dates = period_dates(start, periods, periods_per_year)
+        assert period_offsets(dates, start, periods_per_year).tolist() == periods.tolist()
+
+
+def test_rate_timeline_sorts_changes_into_segments():
+    start = datetime(2024, 1, 1)
+    timeline = RateTimeline(0.05, start, [
+        {"new_interest_rate": 7.0, "effective_date": datetime(2026, 1, 1)},
+        {"new_interest_rate": 6.0, "effective_date": datetime(2025, 1, 1)},
+        {"new_interest_rate": 6.5, "effective_date": datetime(2025, 1, 20)},
+        {"new_interest_rate": 9.0, "effective_date": datetime(2060, 1, 1)}
+    ])
+    starts, rates = timeline.segments(12, 60)
+
+    assert starts.tolist() == [0, 12, 13, 24]
+    assert rates * 12 == pytest.approx([0.05, 0.06, 0.065, 0.07])
+    period_rates = timeline.period_rates(12, 60)
+    assert len(period_rates) == 60
+    assert timeline.rate_at(np.arange(60), 12, 60) == pytest.approx(period_rates)
+    assert timeline.rate_at(12, 12, 60) * 12 == pytest.approx(0.06)
+
+
+def test_cents_round_half_up():
+    assert to_cents([1.005, 2.675, 0.004, 10]).tolist() == [101, 268, 0, 1000]
+    assert to_rate_units(0.0525) == 52500
+
+
+def test_amortize_cents_reconciles_to_the_cent():
+    monthly = amortize_cents(100000, np.full(24, 60000), 12, 5000, 0)
+    fortnightly = amortize_cents(100000, np.full(24, 60000), 26, 2300, 0, periods=20)
+
+    assert monthly.dtype == CENTS_SCHEDULE_DTYPE
+    assert monthly["Interest"][0] == 500 and fortnightly["Interest"][0] == 231
+    assert (len(monthly), len(fortnightly)) == (22, 20)
+    assert monthly["New Balance"][-1] <= 0 < monthly["New Balance"][-2]
+    np.testing.assert_array_equal(monthly["Balance"] - monthly["Principal"] - monthly["Extra"],
+                                  monthly["New Balance"])
+
+    lumps = np.zeros(24, dtype=np.int64)
+    lumps[5] = 20000
+    paid_down = amortize_cents(100000, np.full(24, 60000), 12, 5000, 100, lump_sums=lumps)
+    assert paid_down["Extra"][5] == 20100 and len(paid_down) < len(monthly)
@@ -0,0 +1,179 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from logging_config import stop_logging
+from mortgage import Mortgage
+
+
+class FakeCursor:
+    def __init__(self, row, rate_changes=()):
+        self.row = row
+        self.rate_changes = list(rate_changes)
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((" ".join(query.split()), params))
+
+    def fetchone(self):
+        return self.row
+
+    def fetchall(self):
+        return self.rate_changes
+
+    def close(self):
+        pass
+
+
+class ReportCursor(FakeCursor):
+    # answers the backfill and interest report queries, a COPY can be made to fail
+    def __init__(self, unscheduled, fail_copy=False):
+        super().__init__(None)
+        self.unscheduled = unscheduled
+        self.fail_copy = fail_copy
+        self.result = []
+        self.copies = 0
+
+    def execute(self, query, params=None):
+        super().execute(query, params)
+        if "NOT EXISTS" in query:
+            self.result = self.unscheduled
+        elif "SUM(s.interest_payment)" in query:
+            self.result = [(3, "Test Mortgage", Decimal("3375.00"), 1)]
+        else:
+            self.result = []
+
+    def fetchall(self):
+        return self.result
+
+    def copy_expert(self, sql, file):
+        if self.fail_copy:
+            raise RuntimeError("copy failed")
+        self.copies += 1
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.autocommit = True
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+def mortgage_row(payment_override_enabled=True, monthly_payment_override=Decimal("6000.00")):
+    # the column order of SELECT * FROM mortgages
+    return (3, 1, "Test Mortgage", Decimal("810000.00"), Decimal("5.00"), 20, Decimal("10000.00"),
+            Decimal("50000.00"), payment_override_enabled, monthly_payment_override, None, date(2024, 1, 1),
+            None, datetime(2024, 1, 1), None, None, None, None)
+
+
+@pytest.fixture(scope="module")
+def app_module():
+    # importing app configures logging for the whole process, so it happens here and is released for the
+    # other test modules afterwards
+    import app
+    yield app
+    stop_logging()
+
+
+@pytest.fixture
+def client(app_module, monkeypatch):
+    cursor = FakeCursor(mortgage_row())
+    monkeypatch.setattr(app_module, "connect_to_database", lambda: FakeConnection(cursor))
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session["username"] = "tester"
+    client.cursor = cursor
+    return client
+
+
+def test_sensitivities_use_the_stored_override(client):
+    response = client.get("/api/sensitivities/3")
+    assert response.status_code == 200
+    monthly = response.get_json()["sensitivities"]["monthly"]
+
+    query, params = client.cursor.executed[0]
+    assert query.startswith("SELECT m.* FROM mortgages m JOIN users u") and params == (3, "tester")
+    overridden = Mortgage("Test Mortgage", 5.0, 20, 810000, 50000, 10000, payment_override_enabled=True,
+                          monthly_payment_override=6000, start_date=date(2024, 1, 1))
+    level = Mortgage("Test Mortgage", 5.0, 20, 810000, 50000, 10000, start_date=date(2024, 1, 1))
+    expected = overridden.calculate_sensitivities()["monthly"]
+    assert monthly["payoff_periods"] == pytest.approx(expected["payoff_periods"])
+    assert monthly["total_interest"] == pytest.approx(expected["total_interest"])
+    assert monthly["payoff_periods"]["rate"] != pytest.approx(
+        level.calculate_sensitivities()["monthly"]["payoff_periods"]["rate"])
+
+
+def test_solve_override_loads_the_full_row(client):
+    response = client.get("/api/solve_override/3?target=total_interest&value=200000")
+    assert response.status_code == 200
+    assert response.get_json()["solutions"]["monthly"]["total_interest"] <= 200000
+    assert any(query.startswith("SELECT new_interest_rate, effective_date FROM interest_rate_changes")
+               for query, _ in client.cursor.executed)
+
+    client.cursor.row = None
+    assert client.get("/api/solve_override/3?target=total_interest&value=200000").status_code == 404
+
+
+def test_mortgage_details_follow_the_rate_history(app_module, client):
+    client.cursor.rate_changes = [(Decimal("6.50"), date(2026, 1, 1))]
+    details = app_module.get_mortgage_details(3)
+
+    mortgage = Mortgage("Test Mortgage", 5.0, 20, 810000, 50000, 10000, payment_override_enabled=True,
+                        monthly_payment_override=6000, start_date=date(2024, 1, 1))
+    mortgage.add_interest_rate_change(6.5, date(2026, 1, 1))
+    expected = mortgage.amortization_table()["monthly"]
+    schedule = details["amortization_schedule"]["monthly"]
+    assert len(schedule) == len(expected)
+    assert schedule[30]["Interest"] == pytest.approx(expected[30]["Interest"])
+    assert schedule[30]["Interest"] > schedule[20]["Interest"]
+    assert details["monthly_payment_override"] == Decimal("6000.00")
+
+
+def test_amortization_schedule_flags_a_non_amortizing_override(client):
+    client.cursor.row = mortgage_row(monthly_payment_override=Decimal("100.00"))
+    response = client.get("/amortization_schedule/3")
+    assert response.status_code == 200
+    assert b"Monthly payment override must be greater than the interest charged per period." in response.data
+
+    client.cursor.row = None
+    assert client.get("/amortization_schedule/3").status_code == 404
+
+
+def test_interest_due_backfills_missing_schedules_and_reports_the_rest(app_module, client, monkeypatch):
+    cursor = ReportCursor([mortgage_row()])
+    monkeypatch.setattr(app_module, "connect_to_database", lambda: FakeConnection(cursor))
+    response = client.get("/api/interest_due?start=2025-01-01&end=2025-02-01")
+    body = response.get_json()
+    assert response.status_code == 200
+    assert cursor.copies == 1 and body["missing_schedules"] == []
+    assert body["total_interest"] == 3375.0
+
+    cursor = ReportCursor([mortgage_row()], fail_copy=True)
+    response = client.get("/api/interest_due?start=2025-01-01&end=2025-02-01")
+    assert response.status_code == 200 and response.get_json()["missing_schedules"] == [3]
+
+
+def test_view_mortgage_survives_a_failed_schedule_refresh(app_module, client, monkeypatch):
+    cursor = ReportCursor([], fail_copy=True)
+    cursor.row = mortgage_row()
+    conn = FakeConnection(cursor)
+    monkeypatch.setattr(app_module, "connect_to_database", lambda: conn)
+    monkeypatch.setattr(app_module.database, "fetch_transaction_page", lambda cursor, mortgage_id: ([], None))
+
+    response = client.get("/view_mortgage/3")
+    assert response.status_code == 200
+    assert conn.rollbacks == 1 and conn.autocommit
@@ -0,0 +1,25 @@
+import pytest
+
+from benchmark import compare, main, run
+
+
+def test_compare_flags_cases_past_the_threshold():
+    baseline = {"benchmarks": {"fast": {"median": 0.010}, "slow": {"median": 0.010}, "gone": {"median": 1.0}}}
+    results = {"benchmarks": {"fast": {"median": 0.011}, "slow": {"median": 0.013}, "new": {"median": 0.5}}}
+
+    report = compare(results, baseline, threshold=0.25)
+
+    assert set(report) == {"fast", "slow"}
+    assert not report["fast"]["regression"]
+    assert report["slow"]["regression"]
+    assert report["slow"]["ratio"] == pytest.approx(1.3)
+
+
+def test_baseline_round_trip(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    assert main(["calculate_mortgage_maturity", "--repeat", "1", "--save", str(baseline)]) == 0
+    assert main(["calculate_mortgage_maturity", "--repeat", "1", "--compare", str(baseline),
+                 "--threshold", "100"]) == 0
+
+    results = run(["amortization_table"], repeat=2)
+    assert results["benchmarks"]["amortization_table"]["repeat"] == 2
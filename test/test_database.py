@@ -0,0 +1,208 @@
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+import psycopg2
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+
+import database
+from database import (MAX_TRANSACTION_PAGE_SIZE, ConnectionPool, PoolTimeout, atomic, fetch_portfolio,
+                      fetch_transaction_page, insert_transaction_logs)
+from mortgage import MortgageBatch
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.status = TRANSACTION_STATUS_IDLE
+        self.commits = 0
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def commit(self):
+        self.commits += 1
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    connections = []
+
+    def connect(**kwargs):
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    monkeypatch.setattr(database.psycopg2, "connect", connect)
+    return connections
+
+
+def test_pool_reuses_connections_and_caps_its_size(opened):
+    pool = ConnectionPool(minconn=1, maxconn=2, timeout=0.05)
+
+    first = pool.connection()
+    assert len(opened) == 1 and first.autocommit
+    first.close()
+    with pool.connection() as again:
+        assert again._conn is opened[0]
+
+    held = [pool.connection(), pool.connection()]
+    assert pool.stats() == {"size": 2, "idle": 0, "in_use": 2, "max": 2}
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+
+    released = threading.Timer(0.01, held[0].close)
+    released.start()
+    pool.timeout = 1.0
+    assert pool.getconn() is opened[0]
+    released.join()
+    assert len(opened) == 2
+
+
+def test_pool_resets_and_discards_connections_on_return(opened):
+    pool = ConnectionPool(minconn=0, maxconn=2, health_check_interval=3600)
+
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            conn.autocommit = False
+            opened[0].status = TRANSACTION_STATUS_INTRANS
+            raise ValueError("failed")
+    assert opened[0].rollbacks == 1 and opened[0].autocommit
+
+    opened[0].close()
+    with pool.connection():
+        assert len(opened) == 2
+    assert pool.stats()["size"] == 1
+
+    with pool.connection() as conn:
+        conn.close()
+        with pytest.raises(psycopg2.InterfaceError):
+            conn.cursor()
+
+
+def test_pool_rejects_invalid_sizes():
+    with pytest.raises(ValueError):
+        ConnectionPool(minconn=3, maxconn=2)
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchall(self):
+        return self.rows
+
+    def copy_expert(self, sql, file):
+        self.executed.append((sql, file.read()))
+
+
+def test_fetch_portfolio_hydrates_rate_changes_in_one_query():
+    created = datetime(2024, 1, 1)
+    cursor = FakeCursor([
+        (1, "Test Mortgage", Decimal("810000"), Decimal("5.00"), 20, Decimal("10000"), Decimal("50000"),
+         False, None, None, date(2024, 1, 1), None, created,
+         [Decimal("5.50"), Decimal("6.25")], [date(2025, 1, 1), date(2026, 1, 1)]),
+        (2, "Other Mortgage", Decimal("500000"), Decimal("4.00"), 25, Decimal("0"), Decimal("0"),
+         False, None, None, date(2024, 1, 1), None, created, None, None)
+    ])
+
+    portfolio = fetch_portfolio(cursor, "tester")
+    assert len(cursor.executed) == 1 and cursor.executed[0][1] == ("tester",)
+    assert portfolio[0]["interest_rate_changes"] == [
+        {"new_interest_rate": 5.5, "effective_date": date(2025, 1, 1)},
+        {"new_interest_rate": 6.25, "effective_date": date(2026, 1, 1)}
+    ]
+    assert portfolio[1]["interest_rate_changes"] == []
+
+    batch = MortgageBatch([row["principal"] for row in portfolio], [row["interest"] for row in portfolio],
+                          [row["term"] for row in portfolio], [row["extra_costs"] for row in portfolio],
+                          [row["deposit"] for row in portfolio],
+                          start_dates=[row["start_date"] for row in portfolio],
+                          interest_rate_changes=[row["interest_rate_changes"] for row in portfolio])
+    batch.calculate_initial_payment_breakdown()
+    schedules = batch.amortization_table(frequencies=("monthly",))
+    flat = MortgageBatch([810000], [5.0], [20], [10000], [50000], start_dates=[date(2024, 1, 1)])
+    flat.calculate_initial_payment_breakdown()
+    # the later, higher rates leave more to repay than the initial rate alone would
+    assert schedules["monthly"]["Interest"][0].sum() > \
+        flat.amortization_table(frequencies=("monthly",))["monthly"]["Interest"][0].sum()
+
+
+def test_insert_transaction_logs_batches_rows(monkeypatch):
+    logs = [{"transaction_date": datetime(2024, 1, i + 1), "transaction_type": "Payment", "amount": 100.0 + i,
+             "current_principal": 5000.0, "new_monthly_payment": None, "new_fortnightly_payment": None,
+             "extra_payment": None, "description": ""} for i in range(3)]
+    batches = []
+    monkeypatch.setattr(database, "execute_values",
+                        lambda cursor, sql, rows, page_size: batches.append((sql, rows, page_size)))
+
+    cursor = FakeCursor([])
+    assert insert_transaction_logs(cursor, 7, []) == 0
+    assert insert_transaction_logs(cursor, 7, logs) == 3
+    assert len(batches) == 1 and batches[0][2] == 3
+    assert batches[0][1][0] == (7, datetime(2024, 1, 1), "Payment", 100.0, 5000.0, None, None, None, "")
+
+    logs[1]["description"] = None
+    logs[2]["description"] = 'say "\\N"'
+    assert insert_transaction_logs(cursor, 7, logs, copy_threshold=2) == 3
+    sql, text = cursor.executed[-1]
+    assert sql.startswith("COPY transactions (mortgage_id, transaction_date")
+    assert sql.endswith("WITH (FORMAT csv, NULL '\\N')")
+    assert text.splitlines() == [
+        '7,2024-01-01 00:00:00,"Payment",100.0,5000.0,\\N,\\N,\\N,""',
+        '7,2024-01-02 00:00:00,"Payment",101.0,5000.0,\\N,\\N,\\N,\\N',
+        '7,2024-01-03 00:00:00,"Payment",102.0,5000.0,\\N,\\N,\\N,"say ""\\N"""'
+    ]
+    assert len(batches) == 1
+
+
+def test_atomic_commits_or_rolls_back():
+    conn = FakeConnection()
+    conn.autocommit = True
+    with atomic(conn):
+        assert not conn.autocommit
+    assert conn.commits == 1 and conn.autocommit
+
+    with pytest.raises(ValueError):
+        with atomic(conn):
+            raise ValueError("failed")
+    assert conn.rollbacks == 1 and conn.commits == 1 and conn.autocommit
+
+
+def test_fetch_transaction_page_continues_from_the_last_key():
+    rows = [(10 - i, datetime(2024, 6, 1, 12, 0, 30 - i), "Payment", Decimal("100"), Decimal("5000"),
+             None, None, None, None, None, "") for i in range(3)]
+    cursor = FakeCursor(rows)
+
+    transactions, next_page = fetch_transaction_page(cursor, 7, page_size=2)
+    assert [transaction["transaction_id"] for transaction in transactions] == [10, 9]
+    assert next_page == "2024-06-01T12:00:29_9"
+    query, params = cursor.executed[-1]
+    assert "SELECT transaction_id, transaction_date" in query and "SELECT *" not in query
+    assert params == (7, 3)
+
+    cursor.rows = rows[2:]
+    transactions, next_page = fetch_transaction_page(cursor, 7, page_size=2, after=next_page)
+    assert next_page is None and transactions[0]["transaction_id"] == 8
+    query, params = cursor.executed[-1]
+    assert "(transaction_date, transaction_id) < (%s, %s)" in query
+    assert params == (7, datetime(2024, 6, 1, 12, 0, 29), 9, 3)
+
+    fetch_transaction_page(cursor, 7, page_size=10 ** 6)
+    assert cursor.executed[-1][1][-1] == MAX_TRANSACTION_PAGE_SIZE + 1
+    with pytest.raises(ValueError):
+        fetch_transaction_page(cursor, 7, after="not-a-cursor")
@@ -0,0 +1,56 @@
+import pytest
+
+from instrumentation import Instrumentation, instrumentation
+from mortgage import Mortgage, schedule_cache
+
+
+def test_timed_records_only_while_enabled():
+    recorder = Instrumentation(window=3)
+
+    @recorder.timed(size=len)
+    def produce(count):
+        if count < 0:
+            raise ValueError("negative")
+        return [0] * count
+
+    produce(5)
+    assert recorder.stats() == {}
+
+    recorder.enable()
+    for count in (1, 2, 3, 4):
+        produce(count)
+    with pytest.raises(ValueError):
+        produce(-1)
+
+    stats = recorder.stats()[produce.__qualname__]
+    assert stats["calls"] == 5
+    assert stats["errors"] == 1
+    assert stats["output_size"] == 10
+    assert stats["p50_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+
+    recorder.reset()
+    assert recorder.stats() == {}
+
+
+def test_mortgage_methods_report_periods_produced():
+    instrumentation.reset()
+    instrumentation.enable()
+    try:
+        schedule_cache.clear()
+        mortgage = Mortgage(
+            mortgage_name="Test Mortgage",
+            initial_interest=5.0,
+            initial_term=20,
+            initial_principal=810000,
+            deposit=50000,
+            extra_costs=10000
+        )
+        schedules = mortgage.amortization_table()
+        stats = instrumentation.stats()
+    finally:
+        instrumentation.disable()
+        instrumentation.reset()
+
+    assert stats["Mortgage.amortization_table"]["calls"] == 1
+    assert stats["Mortgage.amortization_table"]["output_size"] == sum(len(rows) for rows in schedules.values())
+    assert stats["Mortgage.calculate_initial_payment_breakdown"]["calls"] >= 1
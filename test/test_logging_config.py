@@ -0,0 +1,50 @@
+import logging
+
+import pytest
+
+from logging_config import DebugSampler, configure_logging, parse_levels, stop_logging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_parse_levels():
+    assert parse_levels("mortgage=debug, werkzeug=WARNING") == {"mortgage": "DEBUG", "werkzeug": "WARNING"}
+    assert parse_levels("") == {}
+    with pytest.raises(ValueError):
+        parse_levels("mortgage")
+
+
+def test_debug_sampler_keeps_every_nth_debug_line_per_call_site():
+    sampler = DebugSampler(every=3)
+    debug = logging.LogRecord("mortgage", logging.DEBUG, "mortgage.py", 10, "tick", None, None)
+    info = logging.LogRecord("mortgage", logging.INFO, "mortgage.py", 10, "tick", None, None)
+
+    assert [sampler.filter(debug) for _ in range(7)] == [True, False, False, True, False, False, True]
+    assert all(sampler.filter(info) for _ in range(3))
+
+
+def test_records_flow_through_the_queue_with_module_levels():
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    handler = ListHandler()
+    try:
+        configure_logging("INFO", {"test.quiet": "WARNING", "test.verbose": "DEBUG"}, debug_sample_every=2,
+                          handlers=[handler])
+        logging.getLogger("test.quiet").info("dropped by the module level")
+        logging.getLogger("test.quiet").warning("kept")
+        for i in range(4):
+            logging.getLogger("test.verbose").debug("sampled %s", i)
+        stop_logging()
+    finally:
+        root.handlers[:], root.level = saved_handlers, saved_level
+        for name in ("test.quiet", "test.verbose"):
+            logging.getLogger(name).setLevel(logging.NOTSET)
+
+    assert [record.getMessage() for record in handler.records] == ["kept", "sampled 0", "sampled 2"]
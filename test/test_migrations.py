@@ -0,0 +1,104 @@
+import pytest
+
+from migrations import MIGRATIONS, run_migrations
+
+
+class RecordingConnection:
+    def __init__(self, applied=(), invalid=(), busy=0):
+        self.autocommit = True
+        # lock attempts that find the migration lock held by another process
+        self.busy = busy
+        self.applied = list(applied)
+        self.invalid = set(invalid)
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return RecordingCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class RecordingCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        statement = " ".join(statement.split())
+        if statement.startswith("CREATE INDEX CONCURRENTLY") and not self.conn.autocommit:
+            raise AssertionError("CONCURRENTLY inside a transaction block")
+        if statement == "FAIL":
+            raise RuntimeError("migration failed")
+        self.conn.executed.append((statement, params, self.conn.autocommit))
+        if statement.startswith("SELECT pg_try_advisory_lock"):
+            self.result = [(self.conn.busy == 0,)]
+            self.conn.busy = max(self.conn.busy - 1, 0)
+        elif statement.startswith("SELECT version"):
+            self.result = [(version,) for version in self.conn.applied]
+        elif statement.startswith("SELECT 1 FROM pg_index"):
+            self.result = [(1,)] if params[0] in self.conn.invalid else []
+        elif statement.startswith("INSERT INTO schema_migrations"):
+            self.conn.applied.append(params[0])
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+
+def test_run_migrations_applies_pending_indexes_once_and_online():
+    conn = RecordingConnection(applied=[1], invalid={"comments_mortgage_id_idx"})
+    assert run_migrations(conn) == [2, 3, 4, 5, 6, 7]
+
+    statements = [statement for statement, _, _ in conn.executed]
+    assert statements[0] == "SELECT pg_try_advisory_lock(%s)"
+    assert statements[-1] == "SELECT pg_advisory_unlock(%s)"
+    created = [statement for statement in statements if statement.startswith("CREATE INDEX")]
+    assert created == [migration["statements"][0] for migration in MIGRATIONS[1:] if migration.get("index")]
+    assert "DROP INDEX CONCURRENTLY IF EXISTS comments_mortgage_id_idx" in statements
+    assert "ON transactions (mortgage_id, transaction_date, transaction_id)" in created[0]
+
+    assert run_migrations(conn) == []
+
+
+def test_transactional_migration_rolls_back_and_stays_pending():
+    migrations = [
+        {"version": 1, "name": "ok", "transactional": True, "statements": ["ALTER TABLE a ADD COLUMN b INTEGER"]},
+        {"version": 2, "name": "broken", "transactional": True, "statements": ["FAIL"]}
+    ]
+    conn = RecordingConnection()
+    with pytest.raises(RuntimeError):
+        run_migrations(conn, migrations)
+    assert conn.applied == [1]
+    assert conn.commits == 1 and conn.rollbacks == 1 and conn.autocommit
+    assert conn.executed[-1][0] == "SELECT pg_advisory_unlock(%s)"
+
+    with pytest.raises(ValueError):
+        run_migrations(conn, migrations + [dict(migrations[0])])
+
+
+def test_run_migrations_polls_for_the_lock_without_blocking(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("migrations.time.sleep", sleeps.append)
+    conn = RecordingConnection(applied=[migration["version"] for migration in MIGRATIONS], busy=2)
+    assert run_migrations(conn, poll_interval=0.25) == []
+
+    statements = [statement for statement, _, _ in conn.executed]
+    assert statements[:3] == ["SELECT pg_try_advisory_lock(%s)"] * 3
+    assert sleeps == [0.25, 0.25]
+    # every attempt runs on its own in autocommit, nothing stays open between them
+    assert all(autocommit for _, _, autocommit in conn.executed[:3])
+    assert "SELECT pg_advisory_lock(%s)" not in statements
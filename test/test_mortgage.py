@@ -1,6 +1,11 @@
+import json
+from collections.abc import Mapping
+
+import numpy as np
 import pytest
 from datetime import datetime, timedelta
-from mortgage import Mortgage
+from itertools import islice
+from mortgage import Mortgage, MortgageBatch, ScheduleCache, schedule_cache
 
 
 def test_mortgage_initialization():
@@ -171,6 +176,33 @@ def test_add_interest_rate_change():
     assert mortgage.interest_rate_changes[0]["effective_date"] == effective_date
 
 
+def test_appending_rate_changes_directly_rebuilds_the_timeline():
+    def make_mortgage():
+        return Mortgage(
+            mortgage_name="Test Mortgage",
+            initial_interest=5.0,
+            initial_term=30,
+            initial_principal=810000,
+            deposit=50000,
+            extra_costs=10000,
+            start_date=datetime(2024, 1, 1),
+            payment_override_enabled=True,
+            monthly_payment_override=5500
+        )
+
+    mortgage = make_mortgage()
+    mortgage.amortization_table()
+    mortgage.interest_rate_changes.append({"new_interest_rate": 9.0, "effective_date": datetime(2025, 1, 1)})
+    schedule = mortgage.amortization_table()["monthly"]
+
+    # computed without the cache, which a stale timeline would have filled under the new input hash
+    schedule_cache.clear()
+    expected = make_mortgage()
+    expected.add_interest_rate_change(9.0, datetime(2025, 1, 1))
+    assert len(schedule) == len(expected.amortization_table()["monthly"]) == 360
+    assert schedule[-1] == pytest.approx(expected.amortization_table()["monthly"][-1])
+
+
 def test_invalid_start_date():
     mortgage = Mortgage(
         mortgage_name="Test Mortgage",
@@ -307,3 +339,645 @@ def test_mortgage_id_property():
     mortgage.mortgage_id = 123
 
     assert mortgage.mortgage_id == 123
+
+
+def test_amortization_table_matches_period_loop():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        comments="initial setup",
+        payment_override_enabled=True,
+        monthly_payment_override=6000,
+        fortnightly_payment_override=3000
+    )
+    mortgage.calculate_initial_payment_breakdown()
+    schedule = mortgage.amortization_table()["monthly"]
+
+    balance = 770000
+    payment = mortgage.initial_payment_breakdown["estimated_repayment_monthly"]
+    for row in schedule:
+        interest = balance * 0.05 / 12
+        assert row["Interest"] == pytest.approx(interest)
+        assert row["Principal"] == pytest.approx(payment - interest)
+        assert row["Extra"] == pytest.approx(6000 - payment)
+        balance = balance + interest - 6000
+        assert row["New Balance"] == pytest.approx(balance, abs=1e-6)
+
+    assert balance <= 0
+    assert schedule[-2]["New Balance"] > 0
+    assert schedule[-1]["Accumulated Principal Payment"] == pytest.approx(770000 - balance)
+
+
+def test_amortization_table_rows_are_read_only_mappings():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        comments="initial setup"
+    )
+    mortgage.calculate_initial_payment_breakdown()
+    schedule = mortgage.amortization_table()
+
+    assert len(schedule["monthly"]) == 240
+    assert len(schedule["fortnightly"]) == 520
+    first = schedule["monthly"][0]
+    assert first["Period"] == 1
+    assert first["Balance"] == 770000
+    assert list(first) == ["Period", "Balance", "Interest", "Principal", "Extra", "Total Payment", "New Balance",
+                           "Accumulated Interest", "Accumulated Principal Payment"]
+    assert schedule["monthly"][-1]["New Balance"] == pytest.approx(0, abs=1e-6)
+    assert not hasattr(mortgage, "__dict__")
+
+    # rows are views, to_dict gives the plain dict jsonify and dict checks expect
+    assert isinstance(first, Mapping) and not isinstance(first, dict)
+    with pytest.raises(TypeError):
+        first["Balance"] = 0
+    assert type(first.to_dict()) is dict and first.to_dict() == dict(first)
+    assert json.loads(json.dumps(schedule["monthly"].to_dicts()))[0] == first.to_dict()
+
+
+def test_amortization_table_applies_interest_rate_change():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        comments="initial setup",
+        start_date=datetime(2024, 1, 1)
+    )
+    mortgage.calculate_initial_payment_breakdown()
+    mortgage.add_interest_rate_change(6.0, datetime(2025, 1, 1))
+    monthly = mortgage.amortization_table()["monthly"]
+
+    assert monthly[11]["Interest"] == pytest.approx(monthly[11]["Balance"] * 0.05 / 12)
+    assert monthly[12]["Interest"] == pytest.approx(monthly[12]["Balance"] * 0.06 / 12)
+
+
+def test_calculate_mortgage_maturity_with_override_matches_period_loop():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        comments="initial setup",
+        payment_override_enabled=True,
+        monthly_payment_override=6000,
+        fortnightly_payment_override=3000
+    )
+    mortgage.calculate_initial_payment_breakdown()
+    mortgage.calculate_mortgage_maturity()
+
+    remaining, months, total_interest = 770000, 0, 0
+    while remaining > 0:
+        months += 1
+        interest = remaining * 0.05 / 12
+        remaining -= 6000 - interest
+        total_interest += interest
+
+    monthly = mortgage.mortgage_maturity["monthly"]
+    assert monthly["months_to_repay"] == months
+    assert monthly["total_interest_paid"] == pytest.approx(total_interest)
+    assert monthly["total_repayment"] == pytest.approx(6000 * months)
+    assert mortgage.mortgage_maturity["fortnightly"]["fortnights_to_repay"] > 0
+
+
+def test_calculate_mortgage_maturity_rejects_non_amortizing_override():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        comments="initial setup",
+        payment_override_enabled=True,
+        monthly_payment_override=3000,
+        fortnightly_payment_override=3000
+    )
+    mortgage.calculate_initial_payment_breakdown()
+
+    with pytest.raises(ValueError):
+        mortgage.calculate_mortgage_maturity()
+
+
+def test_update_mortgage_rejects_non_amortizing_override_before_logging():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000
+    )
+
+    with pytest.raises(ValueError, match="Monthly payment override"):
+        mortgage.update_mortgage(monthly_payment_override=100)
+    assert mortgage.transaction_logs == []
+
+    mortgage.update_mortgage(monthly_payment_override=6000)
+    assert len(mortgage.transaction_logs) == 1
+
+
+def test_rejected_update_leaves_the_mortgage_unchanged():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        comments="original",
+        payment_override_enabled=True,
+        monthly_payment_override=6000
+    )
+    before = {name: getattr(mortgage, name) for name in ("_initial_principal", "_extra_costs", "_comments",
+                                                         "monthly_payment_override", "total_amount_borrowed")}
+    breakdown = dict(mortgage.initial_payment_breakdown)
+    schedule = mortgage.amortization_schedule["monthly"].rows.copy()
+
+    with pytest.raises(ValueError, match="Monthly payment override"):
+        mortgage.update_mortgage(monthly_payment_override=100, extra_costs=5000, balloon_payment=50000,
+                                 comments="rejected")
+    with pytest.raises(ValueError, match="Lump sum"):
+        mortgage.update_mortgage(monthly_payment_override=7000, balloon_payment=10 ** 9)
+
+    assert {name: getattr(mortgage, name) for name in before} == before
+    assert mortgage.historical_transactions == [] and mortgage.transaction_logs == []
+    assert mortgage.initial_payment_breakdown == breakdown
+    assert mortgage.amortization_schedule["monthly"].rows.tolist() == schedule.tolist()
+
+
+def test_mortgage_batch_matches_single_mortgages():
+    mortgages = [
+        Mortgage("First", 5.0, 20, 810000, 50000, 10000),
+        Mortgage("Second", 6.5, 30, 500000, 100000, 0, payment_override_enabled=True,
+                 monthly_payment_override=4000, fortnightly_payment_override=2000),
+        Mortgage("Third", 4.0, 10, 300000, 0, 5000, start_date=datetime(2024, 1, 1))
+    ]
+    mortgages[2].add_interest_rate_change(5.5, datetime(2026, 1, 1))
+
+    batch = MortgageBatch.from_mortgages(mortgages)
+    batch.calculate_initial_payment_breakdown()
+    batch.calculate_mortgage_maturity()
+    schedules = batch.amortization_table()
+
+    assert schedules["monthly"]["Balance"].shape == (3, 360)
+    assert schedules["fortnightly"]["Balance"].shape == (3, 780)
+    for index, mortgage in enumerate(mortgages):
+        mortgage.calculate_initial_payment_breakdown()
+        mortgage.calculate_mortgage_maturity()
+        expected = mortgage.amortization_table()
+        actual = batch.get_amortization_schedules(index)
+
+        assert batch.get_initial_payment_breakdown(index) == pytest.approx(mortgage.initial_payment_breakdown)
+        for frequency in ("monthly", "fortnightly"):
+            batch_maturity = batch.get_mortgage_maturity(index)[frequency]
+            assert batch_maturity.pop("amortizing")
+            assert batch_maturity == pytest.approx(mortgage.mortgage_maturity[frequency])
+            assert len(actual[frequency]) == len(expected[frequency])
+            assert actual[frequency][-1] == pytest.approx(expected[frequency][-1])
+
+
+def test_mortgage_batch_flags_non_amortizing_override_per_mortgage():
+    batch = MortgageBatch([810000, 500000], [5.0, 5.0], [20, 20], [10000, 0], [50000, 0],
+                          payment_override_enabled=[False, True], monthly_payment_override=[None, 1000])
+    batch.calculate_initial_payment_breakdown()
+    maturity = batch.calculate_mortgage_maturity()
+
+    assert maturity["monthly"]["amortizing"].tolist() == [True, False]
+    assert maturity["fortnightly"]["amortizing"].tolist() == [True, True]
+    assert batch.get_mortgage_maturity(1)["monthly"]["total_interest_paid"] == np.inf
+    assert batch.get_mortgage_maturity(1)["monthly"]["months_to_repay"] == 0
+    assert batch.get_mortgage_maturity(0)["monthly"]["total_interest_paid"] == 0
+
+
+def test_planning_scenario_grid_matches_projected_payment():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        comments="initial setup"
+    )
+    grid = mortgage.planning_scenario_grid(3000.00, 7, 0.5, 15)
+
+    assert grid["monthly_payments"].shape == (8, 16)
+    assert grid["fortnightly_payments"].shape == (8, 16)
+    assert grid["principals"][-1] == 770000 + 7 * 3000
+    assert grid["interest_rates"][-1] == pytest.approx(12.5)
+    assert grid["monthly_payments"][3, 4] == pytest.approx(
+        mortgage.calculate_projected_payment(779000, 7.0, 20, "monthly"))
+    assert grid["fortnightly_payments"][7, 15] == pytest.approx(
+        mortgage.calculate_projected_payment(791000, 12.5, 20, "fortnightly"))
+
+    chunks = list(mortgage.iter_planning_scenarios(3000.00, 7, 0.5, 15, chunk_size=3))
+    assert [len(chunk["principals"]) for chunk in chunks] == [3, 3, 2]
+    assert np.allclose(np.vstack([chunk["monthly_payments"] for chunk in chunks]), grid["monthly_payments"])
+
+
+def test_generate_planning_scenarios_rejects_oversized_grid():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        comments="initial setup"
+    )
+
+    with pytest.raises(ValueError):
+        mortgage.generate_planning_scenarios(3000.00, 5000, 0.25, 5000)
+
+    with pytest.raises(ValueError):
+        mortgage.generate_planning_scenarios(3000.00, -1, 0.25, 15)
+
+
+def test_amortization_table_is_served_from_cache():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        comments="initial setup"
+    )
+    mortgage.calculate_initial_payment_breakdown()
+    schedule_cache.clear()
+    hits = schedule_cache.hits
+
+    first = mortgage.amortization_table()
+    key = mortgage.input_hash()
+    second = mortgage.amortization_table()
+
+    assert schedule_cache.hits == hits + 1
+    assert second["monthly"].rows is first["monthly"].rows
+
+    # an entry missing a requested frequency is extended and counted as a miss, the lazy iterator only peeks
+    stats = schedule_cache.stats()
+    mortgage.amortization_table(frequencies=("monthly", "weekly"))
+    list(mortgage.iter_amortization("quarterly"))
+    assert schedule_cache.stats()["hits"] == stats["hits"]
+    assert schedule_cache.stats()["misses"] == stats["misses"] + 1
+    mortgage.amortization_table(frequencies=("weekly",))
+    assert schedule_cache.stats()["hits"] == stats["hits"] + 1
+    assert not second["monthly"].rows.flags.writeable
+
+    mortgage.add_interest_rate_change(6.0, datetime.now() + timedelta(days=365))
+    assert mortgage.input_hash() != key
+
+
+def test_schedule_cache_evicts_least_recently_used():
+    cache = ScheduleCache(max_entries=2, max_bytes=1000)
+    entry = {"monthly": np.zeros(10)}
+
+    cache.put("a", entry)
+    cache.put("b", {"monthly": np.zeros(10)})
+    cache.get("a")
+    cache.put("c", {"monthly": np.zeros(10)})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is entry
+    assert cache.stats()["evictions"] == 1
+
+    cache.put("d", {"monthly": np.zeros(120)})
+    assert cache.stats()["bytes"] <= 1000
+    assert cache.get("c") is None
+    cache.put("e", {"monthly": np.zeros(1000)})
+    assert cache.get("e") is None
+
+
+def test_iter_amortization_matches_table_and_stops_early():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        comments="initial setup",
+        payment_override_enabled=True,
+        monthly_payment_override=6000,
+        fortnightly_payment_override=3000,
+        start_date=datetime(2024, 1, 1)
+    )
+    mortgage.add_interest_rate_change(6.0, datetime(2030, 6, 1))
+    mortgage.calculate_initial_payment_breakdown()
+    schedule_cache.clear()
+
+    first_rows = list(islice(mortgage.iter_amortization("fortnightly", chunk_size=7), 3))
+    assert [row["Period"] for row in first_rows] == [1, 2, 3]
+
+    lazy_rows = list(mortgage.iter_amortization("monthly", chunk_size=25))
+    schedule_cache.clear()
+    table = mortgage.amortization_table()["monthly"]
+    assert len(lazy_rows) == len(table)
+    for lazy_row, row in zip(lazy_rows, table):
+        assert lazy_row == pytest.approx(row)
+
+    with pytest.raises(ValueError):
+        mortgage.iter_amortization("daily")
+
+
+def test_mutations_recompute_lazily():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        comments="initial setup"
+    )
+    borrowed = mortgage.initial_payment_breakdown["total_amount_borrowed"]
+
+    mortgage.make_balloon_payment(100000)
+    mortgage.apply_extra_costs(5000)
+    assert "breakdown" in mortgage._stale
+    assert mortgage.initial_payment_breakdown["total_amount_borrowed"] == pytest.approx(borrowed - 95000)
+
+    mortgage.add_interest_rate_change(6.0, mortgage.start_date + timedelta(days=365))
+    assert mortgage._stale == {"maturity", "schedule"}
+
+
+def test_rate_change_and_dated_balloon_reuse_schedule_prefix():
+    start_date = datetime(2024, 1, 15)
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        start_date=start_date
+    )
+    before = mortgage.amortization_schedule["monthly"].columns
+
+    mortgage.add_interest_rate_change(6.0, datetime(2030, 1, 15))
+    mortgage.make_balloon_payment(50000, datetime(2035, 1, 15))
+    after = mortgage.amortization_schedule["monthly"].columns
+
+    fresh = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        start_date=start_date
+    )
+    fresh.interest_rate_changes = list(mortgage.interest_rate_changes)
+    fresh.lump_sum_payments = list(mortgage.lump_sum_payments)
+    fresh._schedule_basis.clear()
+    expected = fresh._amortize(("monthly",))["monthly"]
+
+    np.testing.assert_array_equal(after["Balance"][:72], before["Balance"][:72])
+    assert after["Extra"][132] == pytest.approx(50000)
+    assert len(after["Period"]) == len(expected["Period"])
+    for name in ("Balance", "Interest", "New Balance", "Accumulated Interest"):
+        np.testing.assert_allclose(after[name], expected[name], rtol=1e-9, atol=1e-6)
+
+
+def test_weekly_and_quarterly_frequencies():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        payment_override_enabled=True,
+        monthly_payment_override=6000
+    )
+    breakdown = mortgage.initial_payment_breakdown
+    assert set(mortgage.amortization_table()) == {"monthly", "fortnightly"}
+    schedules = mortgage.amortization_table(frequencies=("weekly", "quarterly"))
+
+    assert set(schedules) == {"weekly", "quarterly"}
+    assert breakdown["estimated_repayment_weekly"] == pytest.approx(
+        mortgage.calculate_projected_payment(770000, 5.0, 20, "weekly"))
+    assert breakdown["initial_extra_weekly"] == 0
+    assert len(schedules["weekly"]) == 1040
+    assert len(schedules["quarterly"]) == 80
+    assert schedules["quarterly"][-1]["New Balance"] == pytest.approx(0, abs=1e-6)
+    assert mortgage.mortgage_maturity["weekly"]["weeks_to_repay"] == 0
+    assert mortgage.mortgage_maturity["monthly"]["months_to_repay"] < 240
+    with pytest.raises(ValueError):
+        mortgage.calculate_projected_payment(770000, 5.0, 20, "daily")
+
+
+def test_fixed_point_schedule_reconciles_to_the_cent():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        payment_override_enabled=True,
+        monthly_payment_override=6000,
+        start_date=datetime(2024, 1, 1),
+        fixed_point=True
+    )
+    mortgage.add_interest_rate_change(6.25, datetime(2030, 1, 1))
+    schedule = mortgage.amortization_schedule["monthly"]
+    rows = schedule.rows
+
+    assert rows.dtype.fields["Balance"][0] == np.int64
+    assert rows["Balance"][0] == 77000000
+    np.testing.assert_array_equal(rows["Balance"] - rows["Principal"] - rows["Extra"], rows["New Balance"])
+    np.testing.assert_array_equal(rows["Balance"][1:], rows["New Balance"][:-1])
+    assert rows["Accumulated Interest"][-1] == rows["Interest"].sum()
+    assert schedule[0]["Balance"] == 770000.0
+    assert schedule[0]["Interest"] == 3208.33
+
+    mortgage.fixed_point = False
+    floats = mortgage.amortization_schedule["monthly"]
+    assert len(floats) == len(schedule)
+    assert floats[-1]["Accumulated Interest"] == pytest.approx(schedule[-1]["Accumulated Interest"], abs=5)
+
+
+def test_solve_payment_override_meets_targets():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        start_date=datetime(2024, 1, 1)
+    )
+
+    by_date = mortgage.solve_payment_override("payoff_date", datetime(2039, 1, 1))
+    assert by_date["monthly"]["months_to_repay"] == 180
+    monthly = by_date["monthly"]["payment_override"]
+    mortgage.gather_inputs(810000, 5.0, 20, 10000, 50000, True, monthly - 0.01, None)
+    assert mortgage.mortgage_maturity["monthly"]["months_to_repay"] == 181
+
+    budget = mortgage.solve_payment_override("total_interest", 300000)
+    assert budget["monthly"]["total_interest"] <= 300000
+    assert budget["fortnightly"]["total_interest"] <= 300000
+    mortgage.gather_inputs(810000, 5.0, 20, 10000, 50000, True, budget["monthly"]["payment_override"] - 0.01,
+                           budget["fortnightly"]["payment_override"] - 0.01)
+    assert mortgage.mortgage_maturity["monthly"]["total_interest_paid"] > 300000
+    assert mortgage.mortgage_maturity["fortnightly"]["total_interest_paid"] > 300000
+
+    by_income = mortgage.solve_payment_override("payment_to_income", 0.35, 200000)
+    assert by_income["fortnightly"]["payment_override"] == 2692.3
+
+    with pytest.raises(ValueError):
+        mortgage.solve_payment_override("total_interest", 100)
+    with pytest.raises(ValueError):
+        mortgage.solve_payment_override("payment_to_income", 0.01, 50000)
+    with pytest.raises(ValueError):
+        mortgage.solve_payment_override("payoff_date", datetime(2023, 1, 1))
+    with pytest.raises(ValueError):
+        mortgage.solve_payment_override("balance", 1)
+
+
+def test_sensitivities_for_mortgage_and_batch():
+    mortgages = [
+        Mortgage("First", 5.0, 20, 810000, 50000, 10000),
+        Mortgage("Second", 6.5, 30, 500000, 100000, 0, payment_override_enabled=True,
+                 monthly_payment_override=4000, fortnightly_payment_override=2000)
+    ]
+    batch = MortgageBatch.from_mortgages(mortgages)
+    batch.calculate_initial_payment_breakdown()
+    book = batch.calculate_sensitivities()
+
+    first = mortgages[0].calculate_sensitivities()["monthly"]
+    payment = mortgages[0].calculate_projected_payment
+    # rate partials are per percentage point, so a quadratic step of one point tracks the exact payment
+    step = first["payment"]["rate"] + first["payment"]["rate_rate"] / 2
+    assert step == pytest.approx(payment(770000, 6.0, 20, "monthly") - payment(770000, 5.0, 20, "monthly"), rel=1e-3)
+    assert first["payment"]["principal"] == pytest.approx(payment(1, 5.0, 20, "monthly"))
+    assert first["payoff_periods"]["term"] == 0
+
+    for index, mortgage in enumerate(mortgages):
+        for frequency, quantities in mortgage.calculate_sensitivities().items():
+            for quantity, partials in quantities.items():
+                assert {key: values[index] for key, values in book[frequency][quantity].items()} == \
+                    pytest.approx(partials)
+    # with the override held, a higher rate stretches the payoff
+    assert book["monthly"]["payoff_periods"]["rate"][1] > 0
+
+
+def test_point_in_time_queries_match_schedule():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        payment_override_enabled=True,
+        monthly_payment_override=6500,
+        start_date=datetime(2024, 1, 15)
+    )
+    mortgage.add_interest_rate_change(6.5, datetime(2026, 3, 1))
+    mortgage.make_balloon_payment(50000, datetime(2027, 5, 20))
+
+    rows = mortgage.amortization_table()["monthly"].columns
+    dates = np.array(["2024-01-15", "2026-03-01", "2027-06-15", "2031-01-01", "2050-01-01"], dtype="datetime64[D]")
+    periods = np.array([0, 26, 41, 84, len(rows)])
+    new_balance = np.concatenate([[rows["Balance"][0]], rows["New Balance"].clip(0)])
+    accumulated = np.concatenate([[0], rows["Accumulated Interest"]])
+
+    assert mortgage.balance_at(dates) == pytest.approx(new_balance[periods])
+    assert mortgage.balance_at(datetime(2031, 1, 1)) == pytest.approx(new_balance[84])
+    assert mortgage.periods_remaining(dates).tolist() == (len(rows) - periods).tolist()
+    assert mortgage.interest_paid_between(dates[0], dates) == pytest.approx(accumulated[periods])
+    assert mortgage.interest_paid_between(datetime(2026, 3, 1), datetime(2031, 1, 1)) == \
+        pytest.approx(accumulated[84] - accumulated[26])
+
+    with pytest.raises(ValueError):
+        mortgage.interest_paid_between(datetime(2031, 1, 1), datetime(2026, 3, 1))
+
+
+def test_to_bytes_round_trip():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        payment_override_enabled=True,
+        monthly_payment_override=6000,
+        start_date=datetime(2024, 1, 15)
+    )
+    mortgage.add_interest_rate_change(6.5, datetime(2026, 3, 1))
+    mortgage.make_balloon_payment(5000, datetime(2027, 1, 1))
+
+    data = mortgage.to_bytes()
+    loaded = Mortgage.from_bytes(data)
+
+    assert loaded.input_hash() == mortgage.input_hash()
+    assert loaded.interest_rate_changes == mortgage.interest_rate_changes
+    assert loaded.mortgage_maturity == mortgage.mortgage_maturity
+    for frequency, schedule in mortgage.amortization_schedule.items():
+        rows = loaded.amortization_schedule[frequency].rows
+        assert not rows.flags.owndata
+        assert rows.tolist() == schedule.rows.tolist()
+
+
+def test_simulate_rate_paths_bands():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000
+    )
+
+    bands = mortgage.simulate_rate_paths(paths=300, seed=7, max_workers=1, volatility=0.02)
+    assert bands == mortgage.simulate_rate_paths(paths=300, seed=7, max_workers=2, volatility=0.02)
+    assert bands["total_interest"]["p5"] <= bands["total_interest"]["p50"] <= bands["total_interest"]["p95"]
+    assert len(bands["yearly_balance"]["p50"]) == 20
+
+    # without volatility every path stays on the initial rate and lands on the deterministic maturity
+    flat = mortgage.simulate_rate_paths(paths=10, seed=7, volatility=0)
+    maturity = mortgage.mortgage_maturity["monthly"]
+    assert flat["months_to_repay"]["p50"] == maturity["full_term_payments"]
+    assert flat["total_interest"]["p95"] == pytest.approx(maturity["interest_over_full_term"])
+
+    with pytest.raises(ValueError):
+        mortgage.simulate_rate_paths(paths=0)
+
+
+def test_simulate_rate_paths_holds_the_override_and_rate_changes():
+    mortgage = Mortgage(
+        mortgage_name="Test Mortgage",
+        initial_interest=5.0,
+        initial_term=20,
+        initial_principal=810000,
+        deposit=50000,
+        extra_costs=10000,
+        payment_override_enabled=True,
+        monthly_payment_override=6000,
+        start_date=datetime(2024, 1, 1)
+    )
+    mortgage.interest_rate_changes = [{"new_interest_rate": 6.5, "effective_date": datetime(2026, 1, 1)}]
+
+    # without volatility every path follows the recorded rates and the override, like the schedule does
+    flat = mortgage.simulate_rate_paths(paths=10, seed=7, volatility=0)
+    schedule = mortgage.amortization_table(frequencies=("monthly",))["monthly"]
+    assert flat["months_to_repay"]["p50"] == len(schedule)
+    assert flat["total_interest"]["p50"] == pytest.approx(schedule[-1]["Accumulated Interest"])
+    assert flat["yearly_rate"]["p50"][0] == pytest.approx(0.05)
+    assert flat["yearly_rate"]["p50"][-1] == pytest.approx(0.065)
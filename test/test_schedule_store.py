@@ -0,0 +1,69 @@
+from datetime import date, datetime
+
+import pytest
+
+from mortgage import Mortgage
+from schedule_store import interest_due, refresh_schedules, schedule_records, store_schedules
+
+
+class FakeCursor:
+    def __init__(self, stored_hash=None):
+        self.stored_hash = stored_hash
+        self.executed = []
+        self.copied = None
+
+    def execute(self, query, params=None):
+        self.executed.append((" ".join(query.split()), params))
+
+    def fetchone(self):
+        return (self.stored_hash,) if self.stored_hash else None
+
+    def fetchall(self):
+        return []
+
+    def copy_expert(self, sql, file):
+        self.executed.append((sql, None))
+        self.copied = [line.split("\t") for line in file.read().decode().splitlines()]
+
+
+def make_mortgage():
+    mortgage = Mortgage(mortgage_name="Test Mortgage", initial_interest=5.0, initial_term=20,
+                        initial_principal=810000, deposit=50000, extra_costs=10000, start_date=datetime(2024, 1, 31))
+    mortgage.add_interest_rate_change(6.0, datetime(2026, 1, 1))
+    return mortgage
+
+
+def test_schedule_records_cover_every_frequency_with_due_dates():
+    mortgage = make_mortgage()
+    records = schedule_records(7, mortgage)
+    schedules = mortgage.amortization_table()
+
+    assert len(records) == sum(len(schedule) for schedule in schedules.values())
+    monthly = records[records["frequency"] == "monthly"]
+    assert monthly["payment_date"][:2].tolist() == ["2024-02-29", "2024-03-31"]
+    assert monthly["interest_payment"].tolist() == schedules["monthly"].columns["Interest"].tolist()
+    assert set(records["input_hash"]) == {mortgage.input_hash()}
+
+
+def test_store_schedules_replaces_rows_with_one_copy_and_skips_current_ones():
+    mortgage = make_mortgage()
+    cursor = FakeCursor()
+    assert refresh_schedules(cursor, 7, mortgage)
+
+    delete, copy = cursor.executed[-2:]
+    assert delete == ("DELETE FROM amortization_schedules WHERE mortgage_id = %s", (7,))
+    assert copy[0].startswith("COPY amortization_schedules (mortgage_id, frequency, period, payment_date")
+    assert cursor.copied[0][:4] == ["7", "monthly", "1", "2024-02-29"]
+    assert cursor.copied[0][4].count(".") == 1 and len(cursor.copied[0][4].split(".")[1]) == 2
+    assert len(cursor.copied) == store_schedules(FakeCursor(), 7, mortgage)
+
+    current = FakeCursor(stored_hash=mortgage.input_hash())
+    assert not refresh_schedules(current, 7, mortgage)
+    assert current.copied is None
+
+
+def test_interest_due_rejects_unknown_frequencies():
+    with pytest.raises(ValueError):
+        interest_due(FakeCursor(), "tester", date(2025, 1, 1), date(2025, 4, 1), frequency="daily")
+    with pytest.raises(ValueError):
+        interest_due(FakeCursor(), "tester", date(2025, 1, 1), date(2025, 4, 1), frequency="weekly")
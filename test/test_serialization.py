@@ -0,0 +1,37 @@
+import struct
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from amortization import SCHEDULE_DTYPE
+from serialization import FORMAT_VERSION, MAGIC, PREAMBLE, pack, unpack
+
+
+def test_round_trip_is_zero_copy():
+    rows = np.zeros(5, dtype=SCHEDULE_DTYPE)
+    rows["Period"] = np.arange(1, 6)
+    rows["Balance"] = np.linspace(1000, 200, 5)
+    meta = {"name": "Test", "start": datetime(2024, 1, 15), "day": date(2024, 2, 1), "amount": np.float64(2.5)}
+
+    data = bytearray(pack(meta, {"monthly": rows, "rates": np.array([0.05, 0.06])}))
+    loaded_meta, arrays = unpack(data)
+
+    assert loaded_meta == {"name": "Test", "start": datetime(2024, 1, 15), "day": date(2024, 2, 1), "amount": 2.5}
+    assert arrays["monthly"].tolist() == rows.tolist()
+    assert arrays["rates"].tolist() == [0.05, 0.06]
+    assert all(array.ctypes.data % 8 == 0 for array in arrays.values())
+    # views share the buffer, so writing the buffer shows through
+    arrays["rates"][0] = 0.07
+    assert unpack(data)[1]["rates"][0] == 0.07
+
+
+def test_rejects_foreign_and_newer_data():
+    data = pack({}, {})
+    with pytest.raises(ValueError):
+        unpack(b"XXXX" + data[4:])
+    with pytest.raises(ValueError):
+        unpack(PREAMBLE.pack(MAGIC, FORMAT_VERSION + 1, 0, 0))
+    with pytest.raises(ValueError):
+        unpack(data[:3])
+    assert struct.unpack_from("<4s", data)[0] == MAGIC
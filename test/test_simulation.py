@@ -0,0 +1,21 @@
+import numpy as np
+
+import simulation
+from simulation import shutdown_executor, simulate_payoff_bands
+
+
+def test_simulations_share_one_spawned_pool():
+    payments = np.full(240, 5000.0)
+    try:
+        bands = simulate_payoff_bands(760000, payments, 0.05, 12, paths=300, seed=7, chunk_size=100)
+        executor = simulation._executor
+        assert executor is not None and executor._max_workers <= simulation.SIMULATION_MAX_WORKERS
+        assert executor._mp_context.get_start_method() == "spawn"
+
+        assert simulate_payoff_bands(760000, payments, 0.05, 12, paths=300, seed=7, chunk_size=100) == bands
+        assert simulation._executor is executor
+        assert simulate_payoff_bands(760000, payments, 0.05, 12, paths=300, seed=7, chunk_size=100,
+                                     max_workers=1) == bands
+    finally:
+        shutdown_executor()
+    assert simulation._executor is None
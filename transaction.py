@@ -1,42 +1,32 @@
-import psycopg2
+import logging
 from datetime import datetime
 
-DATABASE_URI = {
-    'dbname': 'mortgage_calculator',
-    'user': 'postgres',
-    'password': 'admin123',
-    'host': 'localhost',
-    'port': '5432'
-}
+from database import connect_to_database
+
+logger = logging.getLogger(__name__)
 
 
 def log_transaction(mortgage_id, transaction_type, amount, current_principal, new_interest_rate=None,
                     new_monthly_payment=None, new_fortnightly_payment=None, remaining_term_months=None,
                     extra_payment=None, description=None):
     try:
-        conn = psycopg2.connect(**DATABASE_URI)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            INSERT INTO transactions (
-                mortgage_id, transaction_date, transaction_type, amount, current_principal, 
-                new_interest_rate, new_monthly_payment, new_fortnightly_payment, 
+        with connect_to_database() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO transactions (
+                    mortgage_id, transaction_date, transaction_type, amount, current_principal,
+                    new_interest_rate, new_monthly_payment, new_fortnightly_payment,
+                    remaining_term_months, extra_payment, description
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (
+                mortgage_id, datetime.utcnow(), transaction_type, amount, current_principal,
+                new_interest_rate, new_monthly_payment, new_fortnightly_payment,
                 remaining_term_months, extra_payment, description
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            mortgage_id, datetime.utcnow(), transaction_type, amount, current_principal,
-            new_interest_rate, new_monthly_payment, new_fortnightly_payment,
-            remaining_term_months, extra_payment, description
-        ))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+            ))
 
-        print("Transaction logged successfully.")
+        logger.debug("Logged %s transaction for mortgage %s", transaction_type, mortgage_id)
 
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.error(f"Error logging transaction: {e}")
 
 
 if __name__ == "__main__":
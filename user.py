@@ -2,28 +2,12 @@ import psycopg2
 import logging
 import re
 
-logging.basicConfig(level=logging.DEBUG)
+from database import connect_to_database
 
+logger = logging.getLogger(__name__)
 
-class UserManager:
-    def __init__(self):
-        self.conn = self.connect_to_database()
-
-    @staticmethod
-    def connect_to_database():
-        try:
-            conn = psycopg2.connect(
-                dbname="mortgage_calculator",
-                user="postgres",
-                password="admin123",
-                host="localhost",
-                port="5432"
-            )
-            return conn
-        except psycopg2.OperationalError as e:
-            logging.error(f"Error connecting to the database: {e}")
-            raise
 
+class UserManager:
     @staticmethod
     def validate_password(password):
         if len(password) <= 5:
@@ -38,60 +22,41 @@ class UserManager:
 
     def create_user(self, username, password):
         if not self.validate_password(password):
-            logging.error("Password must be more than 5 characters long and include letters, numbers, and symbols.")
+            logger.error("Password must be more than 5 characters long and include letters, numbers, and symbols.")
             return
 
-        cursor = None
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, password))
-            self.conn.commit()
+            with connect_to_database() as conn, conn.cursor() as cursor:
+                cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, password))
         except psycopg2.IntegrityError:
-            logging.warning("User already exists.")
+            logger.warning("User already exists.")
         except psycopg2.Error as e:
-            logging.error(f"Error adding user: {e}")
-        finally:
-            if cursor:
-                cursor.close()
+            logger.error(f"Error adding user: {e}")
 
     def retrieve_user_by_username(self, username):
         user = None
-        cursor = None
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-            user = cursor.fetchone()
+            with connect_to_database() as conn, conn.cursor() as cursor:
+                cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
+                user = cursor.fetchone()
         except psycopg2.Error as e:
-            logging.error(f"Error retrieving user: {e}")
-        finally:
-            if cursor:
-                cursor.close()
+            logger.error(f"Error retrieving user: {e}")
         return user
 
     def update_user_password(self, username, new_password):
         if not self.validate_password(new_password):
-            logging.error("Password must be more than 5 characters long and include letters, numbers, and symbols.")
+            logger.error("Password must be more than 5 characters long and include letters, numbers, and symbols.")
             return
 
-        cursor = None
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("UPDATE users SET password = %s WHERE username = %s", (new_password, username))
-            self.conn.commit()
+            with connect_to_database() as conn, conn.cursor() as cursor:
+                cursor.execute("UPDATE users SET password = %s WHERE username = %s", (new_password, username))
         except psycopg2.Error as e:
-            logging.error(f"Error updating user password: {e}")
-        finally:
-            if cursor:
-                cursor.close()
+            logger.error(f"Error updating user password: {e}")
 
     def delete_user(self, username):
-        cursor = None
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("DELETE FROM users WHERE username = %s", (username,))
-            self.conn.commit()
+            with connect_to_database() as conn, conn.cursor() as cursor:
+                cursor.execute("DELETE FROM users WHERE username = %s", (username,))
         except psycopg2.Error as e:
-            logging.error(f"Error deleting user: {e}")
-        finally:
-            if cursor:
-                cursor.close()
+            logger.error(f"Error deleting user: {e}")